@@ -214,6 +214,25 @@ class AuthorityClient(object):
             params=query_params)
         return AuthorityDataCollection.from_json(response.json())
 
+    @pki.handle_exceptions()
+    def _list_cas(self):
+        headers = {'Content-type': 'application/json',
+                   'Accept': 'application/json'}
+        response = self.connection.get(path=self.ca_url, headers=headers)
+        return response.json()
+
+    def iter_cas(self):
+        """ Return a generator of AuthorityData objects of subordinate CAs.
+
+        The server returns all the authorities in a single response, so
+        only the decoding is done one authority at a time.
+        """
+        cas = self._list_cas()
+        if not isinstance(cas, list):
+            cas = [cas]
+        for ca in cas:
+            yield AuthorityData.from_json(ca)
+
     @pki.handle_exceptions()
     def create_ca(self, ca_data):
         """ Create authority (subCA)
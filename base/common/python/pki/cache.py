@@ -0,0 +1,237 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+from __future__ import absolute_import
+import collections
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore(object):
+    """
+    Thread-safe in-memory store that evicts the least recently used
+    entries when it is full.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteStore(object):
+    """
+    Thread-safe store that keeps the entries as JSON in an SQLite
+    database so they can be reused by later processes.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def open(self):
+        if self.connection:
+            return self.connection
+
+        logger.debug('Opening cache database %s', self.filename)
+        self.connection = sqlite3.connect(
+            self.filename, check_same_thread=False, isolation_level=None)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT)')
+
+        return self.connection
+
+    def close(self):
+        with self.lock:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+
+    def get(self, key):
+        with self.lock:
+            row = self.open().execute(
+                'SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, entry):
+        value = json.dumps(entry)
+        with self.lock:
+            self.open().execute(
+                'INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)',
+                (key, value))
+
+    def delete(self, key):
+        with self.lock:
+            self.open().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def clear(self):
+        with self.lock:
+            self.open().execute('DELETE FROM entries')
+
+
+class Cache(object):
+    """
+    Cache for JSON resources returned by the server.
+
+    The entries are kept in an in-memory LRU store and, if a filename is
+    specified, in an SQLite database. An entry expires after ttl seconds
+    (None: never). Unless it is stored as final, an entry also becomes
+    stale status_ttl seconds after it was last validated, after which the
+    caller should check whether the resource has changed.
+    """
+
+    def __init__(self, max_size=1000, filename=None, ttl=None, status_ttl=60):
+
+        self.memory = MemoryStore(max_size)
+        self.database = SQLiteStore(filename) if filename else None
+        self.ttl = ttl
+        self.status_ttl = status_ttl
+
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def get_stats(self):
+        """
+        Return the hit/miss counters.
+        """
+
+        with self.lock:
+            stats = dict(self.stats)
+
+        stats['evictions'] = self.memory.evictions
+        stats['size'] = len(self.memory)
+
+        return stats
+
+    def get(self, key):
+        """
+        Return a (data, stale) tuple for the key, or None if the entry is
+        missing or has expired.
+        """
+
+        entry = self.memory.get(key)
+
+        if entry is None and self.database:
+            entry = self.database.get(key)
+            if entry is not None:
+                self.memory.put(key, entry)
+
+        if entry is None:
+            self.count('misses')
+            return None
+
+        now = time.time()
+
+        if self.ttl is not None and now - entry['created'] > self.ttl:
+            self.count('expired')
+            self.count('misses')
+            self.delete(key)
+            return None
+
+        stale = not entry['final'] and now - entry['validated'] > self.status_ttl
+
+        self.count('stale' if stale else 'hits')
+
+        return entry['data'], stale
+
+    def put(self, key, data, final=False):
+        """
+        Store a resource. A final resource does not become stale.
+        """
+
+        now = time.time()
+
+        entry = {
+            'data': data,
+            'final': final,
+            'created': now,
+            'validated': now,
+        }
+
+        self.memory.put(key, entry)
+
+        if self.database:
+            self.database.put(key, entry)
+
+    def validate(self, key):
+        """
+        Mark an entry as unchanged since it was stored.
+        """
+
+        entry = self.memory.get(key)
+        if entry is None:
+            return
+
+        entry = dict(entry, validated=time.time())
+        self.count('revalidations')
+
+        self.memory.put(key, entry)
+
+        if self.database:
+            self.database.put(key, entry)
+
+    def delete(self, key):
+        self.memory.delete(key)
+
+        if self.database:
+            self.database.delete(key)
+
+    def invalidate(self, key):
+        """
+        Remove an entry that is known to have changed.
+        """
+
+        self.count('invalidations')
+        self.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+
+        if self.database:
+            self.database.clear()
+
+    def close(self):
+        if self.database:
+            self.database.close()
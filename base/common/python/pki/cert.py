@@ -24,6 +24,10 @@ from __future__ import print_function
 import copy
 import json
 import logging
+import os
+import sys
+import threading
+import time
 
 from six import iteritems
 
@@ -31,6 +35,7 @@ import pki
 import pki.client as client
 import pki.encoder as encoder
 import pki.profile as profile
+import pki.util
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +53,19 @@ class CertData(object):
         'Link': 'link', 'PKCS7CertChain': 'pkcs7_cert_chain'
     }
 
+    # attributes without a mapping keep their JSON names, other attributes
+    # returned by the server are stored in __dict__
+    __slots__ = (
+        'serial_number', 'issuer_dn', 'subject_dn', 'pretty_repr', 'encoded',
+        'binary', 'pkcs7_cert_chain', 'not_before', 'not_after', 'status',
+        'nonce', 'link', 'RevokedOn', 'RevokedBy', 'RevocationReason',
+        '__dict__')
+
+    json_fields = encoder.json_fields(json_attribute_names, __slots__)
+
+    # the link is decoded separately
+    json_fields['Link'] = None
+
     def __init__(self):
         """Constructor"""
 
@@ -78,13 +96,12 @@ class CertData(object):
     def from_json(cls, attr_list):
         """ Return CertData object from JSON dict """
         cert_data = cls()
+        fields = CertData.json_fields
 
-        for k, v in iteritems(attr_list):
-            if k not in ['Link']:
-                if k in CertData.json_attribute_names:
-                    setattr(cert_data, CertData.json_attribute_names[k], v)
-                else:
-                    setattr(cert_data, k, v)
+        for k, v in attr_list.items():
+            name = fields.get(k, k)
+            if name:
+                setattr(cert_data, name, v)
 
         if 'Link' in attr_list:
             cert_data.link = pki.Link.from_json(attr_list['Link'])
@@ -106,6 +123,20 @@ class CertDataInfo(object):
         'NotValidAfter': 'not_valid_after', 'IssuedOn': 'issued_on',
         'IssuedBy': 'issued_by'}
 
+    __slots__ = (
+        'serial_number', 'subject_dn', 'status', 'type', 'version',
+        'key_algorithm_oid', 'key_length', 'not_valid_before',
+        'not_valid_after', 'issued_on', 'issued_by', 'link', 'IssuerDN',
+        'RevokedOn', 'RevokedBy', '__dict__')
+
+    json_fields = encoder.json_fields(json_attribute_names, __slots__)
+    json_fields['Link'] = None
+
+    # values shared by many certificates are interned to reduce the
+    # memory used by large search results
+    interned_attributes = {
+        'Status', 'Type', 'KeyAlgorithmOID', 'IssuedBy', 'IssuerDN', 'RevokedBy'}
+
     def __init__(self):
         """ Constructor """
         self.serial_number = None
@@ -135,13 +166,16 @@ class CertDataInfo(object):
     def from_json(cls, attr_list):
         """ Return CertDataInfo object from JSON dict """
         cert_data_info = cls()
-        for k, v in iteritems(attr_list):
-            if k not in ['Link']:
-                if k in CertDataInfo.json_attribute_names:
-                    setattr(cert_data_info,
-                            CertDataInfo.json_attribute_names[k], v)
-                else:
-                    setattr(cert_data_info, k, v)
+        fields = CertDataInfo.json_fields
+        interned_attributes = CertDataInfo.interned_attributes
+
+        for k, v in attr_list.items():
+            name = fields.get(k, k)
+            if not name:
+                continue
+            if k in interned_attributes and isinstance(v, str):
+                v = sys.intern(v)
+            setattr(cert_data_info, name, v)
 
         if 'Link' in attr_list:
             cert_data_info.link = pki.Link.from_json(attr_list['Link'])
@@ -198,6 +232,18 @@ class CertRequestInfo(object):
         'errorMessage': 'error_message', 'certRequestType': 'cert_request_type'
     }
 
+    __slots__ = (
+        'request_id', 'request_type', 'request_url', 'request_status',
+        'operation_result', 'cert_id', 'cert_request_type', 'cert_url',
+        'error_message', 'requestId', 'realm', '__dict__')
+
+    json_fields = encoder.json_fields(json_attribute_names, __slots__)
+    json_fields['Link'] = None
+
+    interned_attributes = {
+        'requestType', 'requestStatus', 'operationResult', 'certRequestType',
+        'realm'}
+
     def __init__(self):
         """ Constructor """
         self.request_id = None
@@ -224,14 +270,16 @@ class CertRequestInfo(object):
     @classmethod
     def from_json(cls, attr_list):
         cert_request_info = cls()
+        fields = CertRequestInfo.json_fields
+        interned_attributes = CertRequestInfo.interned_attributes
 
-        for k, v in iteritems(attr_list):
-            if k not in ['Link']:
-                if k in CertRequestInfo.json_attribute_names:
-                    setattr(cert_request_info,
-                            CertRequestInfo.json_attribute_names[k], v)
-                else:
-                    setattr(cert_request_info, k, v)
+        for k, v in attr_list.items():
+            name = fields.get(k, k)
+            if not name:
+                continue
+            if k in interned_attributes and isinstance(v, str):
+                v = sys.intern(v)
+            setattr(cert_request_info, name, v)
 
         cert_request_info.request_id = \
             str(cert_request_info.request_url)[(str(
@@ -259,13 +307,22 @@ class CertEnrollmentResult(object):
     and any certificates issued.
     """
 
-    def __init__(self, request, cert):
+    def __init__(self, request, cert, error=None, profile_id=None,
+                 inputs=None, index=None):
         """  Initializer.
         :param: request: CertRequestInfo object for request generated.
         :param: cert: CertData object for certificate generated (if any)
+        :param: error: exception raised during the enrollment (if any)
+        :param: profile_id: profile ID of the enrollment (if any)
+        :param: inputs: inputs of the enrollment (if any)
+        :param: index: position of the enrollment in a batch (if any)
         """
         self.request = request
         self.cert = cert
+        self.error = error
+        self.profile_id = profile_id
+        self.inputs = inputs
+        self.index = index
 
 
 class CertRequestInfoCollection(object):
@@ -623,10 +680,17 @@ class CertClient(object):
     Java interface class defining the REST API for Certificate resources.
     """
 
-    def __init__(self, connection):
-        """ Constructor """
+    def __init__(self, connection, cache=None):
+        """ Constructor
+
+        :param connection: connection to the server
+        :type connection: PKIConnection
+        :param cache: optional cache for certificates and requests
+        :type cache: pki.cache.Cache
+        """
 
         self.connection = connection
+        self.cache = cache
 
         self.cert_url = '/rest/certs'
         self.agent_cert_url = '/rest/agent/certs'
@@ -643,6 +707,7 @@ class CertClient(object):
                         'Accept': 'application/json'}
 
         self.enrollment_templates = {}
+        self.enrollment_templates_lock = threading.Lock()
 
     @pki.handle_exceptions()
     def get_cert(self, cert_serial_number):
@@ -650,10 +715,75 @@ class CertClient(object):
         if cert_serial_number is None:
             raise ValueError("Certificate ID must be specified")
 
+        key = self._cert_cache_key(cert_serial_number)
+
+        if key:
+            cached = self.cache.get(key)
+
+            if cached:
+                data, stale = cached
+
+                if not stale or self._validate_cert_status(cert_serial_number, data):
+                    return CertData.from_json(data)
+
         url = self.cert_url + '/' + str(cert_serial_number)
         r = self.connection.get(url, self.headers)
         # print r.json()
-        return CertData.from_json(r.json())
+        data = r.json()
+
+        if key:
+            self.cache.put(key, data)
+
+        return CertData.from_json(data)
+
+    # The cache keys are the resource URLs so a cache shared by clients
+    # of different servers or subsystems does not mix up their entries.
+
+    def _cert_cache_key(self, cert_serial_number):
+        if self.cache is None:
+            return None
+        try:
+            cert_serial_number = normalize_serial_number(cert_serial_number)
+        except ValueError:
+            # let the server reject invalid serial numbers
+            return None
+        return '%s%s/%s' % (self.connection.serverURI, self.cert_url, cert_serial_number)
+
+    def _request_cache_key(self, request_id):
+        if self.cache is None:
+            return None
+        return '%s%s/%s' % (self.connection.serverURI, self.cert_requests_url, request_id)
+
+    def _invalidate(self, key):
+        if key:
+            self.cache.invalidate(key)
+
+    def _validate_cert_status(self, cert_serial_number, data):
+        """
+        Check whether the status of a cached certificate has changed
+        with a search that only returns the status fields instead of
+        retrieving the full certificate.
+        """
+
+        cert_serial_number = normalize_serial_number(cert_serial_number)
+        search_request = json.dumps(
+            CertSearchRequest(serial_from=cert_serial_number,
+                              serial_to=cert_serial_number),
+            cls=encoder.CustomTypeEncoder,
+            sort_keys=True)
+
+        entries = client.get_entries(self._search_certs(search_request, 0, 1))
+        if not entries:
+            return False
+
+        info = entries[0]
+        for name in ['Status', 'RevokedOn', 'RevokedBy']:
+            if info.get(name) != data.get(name):
+                logger.debug('Certificate %s has changed', cert_serial_number)
+                return False
+
+        self.cache.validate(self._cert_cache_key(cert_serial_number))
+        return True
 
     @pki.handle_exceptions()
     def list_certs(self, max_results=None, max_time=None, start=None, size=None,
@@ -671,7 +801,38 @@ class CertClient(object):
                                     sort_keys=True)
         response = self.connection.post(url, search_request, self.headers,
                                         query_params)
-        return CertDataInfoCollection.from_json(response.json())
+        return CertDataInfoCollection.from_json(encoder.loads(response.content))
+
+    @pki.handle_exceptions()
+    def _search_certs(self, search_request, start, size):
+        url = self.cert_url + '/search'
+        query_params = {'start': start, 'size': size}
+        response = self.connection.post(url, search_request, self.headers,
+                                        query_params)
+        return encoder.loads(response.content)
+
+    def iter_certs(self, start=0, size=100, prefetch=True,
+                   **cert_search_params):
+        """ Return a generator of CertDataInfo objects for all the
+            certificates that satisfy the search criteria. The results
+            are retrieved one page at a time. If prefetch is True the
+            next page is retrieved while the current page is processed.
+        """
+        cert_search_request = CertSearchRequest(**cert_search_params)
+        search_request = json.dumps(cert_search_request,
+                                    cls=encoder.CustomTypeEncoder,
+                                    sort_keys=True)
+
+        def fetch(start):
+            json_value = self._search_certs(search_request, start, size)
+            entries = client.get_entries(json_value)
+            end = start + len(entries)
+            if not entries or end >= json_value.get('total', 0):
+                return entries, None
+            return entries, end
+
+        for entry in client.iter_pages(fetch, start, prefetch):
+            yield CertDataInfo.from_json(entry)
 
     @pki.handle_exceptions()
     def review_cert(self, cert_serial_number):
@@ -714,11 +875,14 @@ class CertClient(object):
         if authority:
             params['issuer-id'] = authority
 
-        r = self.connection.post(
-            url,
-            revoke_request,
-            headers=self.headers,
-            params=params)
+        try:
+            r = self.connection.post(
+                url,
+                revoke_request,
+                headers=self.headers,
+                params=params)
+        finally:
+            self._invalidate(self._cert_cache_key(cert_serial_number))
 
         return CertRequestInfo.from_json(r.json())
 
@@ -779,11 +943,14 @@ class CertClient(object):
         if authority is not None:
             params['issuer-id'] = authority
 
-        r = self.connection.post(
-            url,
-            None,
-            headers=self.headers,
-            params=params)
+        try:
+            r = self.connection.post(
+                url,
+                None,
+                headers=self.headers,
+                params=params)
+        finally:
+            self._invalidate(self._cert_cache_key(cert_serial_number))
 
         return CertRequestInfo.from_json(r.json())
 
@@ -796,10 +963,27 @@ class CertClient(object):
 
         if request_id is None:
             raise ValueError("Request ID must be specified")
+
+        key = self._request_cache_key(request_id)
+
+        if key:
+            cached = self.cache.get(key)
+            if cached and not cached[1]:
+                return CertRequestInfo.from_json(cached[0])
+
         url = self.cert_requests_url + '/' + str(request_id)
         r = self.connection.get(url, headers=self.headers)
+        data = r.json()
 
-        return CertRequestInfo.from_json(r.json())
+        if key:
+            # requests do not change once they are no longer pending
+            final = data.get('requestStatus') in [
+                CertRequestStatus.COMPLETE,
+                CertRequestStatus.REJECTED,
+                CertRequestStatus.CANCELED]
+            self.cache.put(key, data, final=final)
+
+        return CertRequestInfo.from_json(data)
 
     @pki.handle_exceptions()
     def list_requests(self, request_status=None, request_type=None,
@@ -820,7 +1004,49 @@ class CertClient(object):
         }
         r = self.connection.get(self.agent_cert_requests_url, self.headers,
                                 query_params)
-        return CertRequestInfoCollection.from_json(r.json())
+        return CertRequestInfoCollection.from_json(encoder.loads(r.content))
+
+    @pki.handle_exceptions()
+    def _list_requests(self, query_params):
+        r = self.connection.get(self.agent_cert_requests_url, self.headers,
+                                query_params)
+        return encoder.loads(r.content)
+
+    def iter_requests(self, request_status=None, request_type=None,
+                      from_request_id=None, size=100, max_results=None,
+                      max_time=None, prefetch=True):
+        """
+        Return a generator of CertRequestInfo objects for the requests
+        that match the arguments. The requests are retrieved one page at
+        a time starting from from_request_id. If prefetch is True the next
+        page is retrieved while the current page is processed.
+        """
+
+        def fetch(start):
+            query_params = {
+                'requestStatus': request_status,
+                'requestType': request_type,
+                'start': start,
+                'pageSize': size,
+                'maxResults': max_results,
+                'maxTime': max_time
+            }
+            json_value = self._list_requests(query_params)
+            entries = client.get_entries(json_value)
+
+            # searches that cannot be paged return all results at once
+            if len(entries) < size or len(entries) >= json_value.get('total', 0):
+                return entries, None
+
+            last = CertRequestInfo.from_json(entries[-1])
+            next_start = parse_request_id(last.request_id) + 1
+            if start is not None and next_start <= parse_request_id(start):
+                return entries, None
+
+            return entries, next_start
+
+        for entry in client.iter_pages(fetch, from_request_id, prefetch):
+            yield CertRequestInfo.from_json(entry)
 
     @pki.handle_exceptions()
     def review_request(self, request_id):
@@ -853,7 +1079,10 @@ class CertClient(object):
                                      cls=encoder.CustomTypeEncoder,
                                      sort_keys=True)
         # print review_response
-        r = self.connection.post(url, review_response, headers=self.headers)
+        try:
+            r = self.connection.post(url, review_response, headers=self.headers)
+        finally:
+            self._invalidate(self._request_cache_key(request_id))
         return r
 
     def approve_request(self, request_id, cert_review_response=None):
@@ -953,13 +1182,19 @@ class CertClient(object):
             raise ValueError("Profile ID must be specified.")
         if profile_id in self.enrollment_templates:
             return copy.deepcopy(self.enrollment_templates[profile_id])
-        url = self.cert_requests_url + '/profiles/' + str(profile_id)
-        r = self.connection.get(url, self.headers)
-        enrollment_request = r.json()
-        logger.info('Enrollment request: %s', enrollment_request)
-        # Caching the enrollment template object in-memory for future use.
-        enrollment_template = CertEnrollmentRequest.from_json(enrollment_request)
-        self.enrollment_templates[profile_id] = enrollment_template
+
+        # make concurrent enrollments wait for a single download
+        with self.enrollment_templates_lock:
+            if profile_id in self.enrollment_templates:
+                return copy.deepcopy(self.enrollment_templates[profile_id])
+
+            url = self.cert_requests_url + '/profiles/' + str(profile_id)
+            r = self.connection.get(url, self.headers)
+            enrollment_request = r.json()
+            logger.info('Enrollment request: %s', enrollment_request)
+            # Caching the enrollment template object in-memory for future use.
+            enrollment_template = CertEnrollmentRequest.from_json(enrollment_request)
+            self.enrollment_templates[profile_id] = enrollment_template
 
         return copy.deepcopy(enrollment_template)
 
@@ -1022,39 +1257,444 @@ class CertClient(object):
         Returns a list of CertEnrollmentResult objects.
         """
 
+        return self._enroll(profile_id, inputs, authority)
+
+    def _timed(self, histograms, stage, func, *args, **kwargs):
+        if histograms is None:
+            return func(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histograms[stage].record(time.perf_counter() - start)
+
+    def _enroll(self, profile_id, inputs, authority, histograms=None):
+
+        start = time.perf_counter()
+
         # Create a CertEnrollmentRequest object using the inputs for the given
         #  profile id.
-        enroll_request = self.create_enrollment_request(profile_id, inputs)
+        enroll_request = self._timed(
+            histograms, 'create', self.create_enrollment_request,
+            profile_id, inputs)
 
         # Submit the enrollment request
-        cert_request_infos = self.submit_enrollment_request(
+        cert_request_infos = self._timed(
+            histograms, 'submit', self.submit_enrollment_request,
             enroll_request, authority)
 
         # Approve the requests generated for the certificate enrollment.
         # Fetch the CertData objects for all the certificates created and
         # return to the caller.
 
-        ret = []
+        results = []
         for cert_request_info in cert_request_infos.cert_request_info_list:
             status = cert_request_info.request_status
             if status == CertRequestStatus.REJECTED or \
                     status == CertRequestStatus.CANCELED:
-                ret.append(
-                    CertEnrollmentResult(cert_request_info, None)
-                )
-            else:
-                request_id = cert_request_info.request_id
-                if status == CertRequestStatus.PENDING:
-                    self.approve_request(request_id)
-                cert_request_info = self.get_request(request_id)
-                ret.append(
-                    CertEnrollmentResult(
-                        cert_request_info,
-                        self.get_cert(cert_request_info.cert_id)
-                    )
-                )
+                results.append(CertEnrollmentResult(cert_request_info, None))
+                continue
 
-        return ret
+            request_id = cert_request_info.request_id
+            if status == CertRequestStatus.PENDING:
+                self._timed(
+                    histograms, 'approve', self.approve_request, request_id)
+
+            cert_request_info = self._timed(
+                histograms, 'get_request', self.get_request, request_id)
+
+            cert = self._timed(
+                histograms, 'get_cert', self.get_cert, cert_request_info.cert_id)
+
+            results.append(CertEnrollmentResult(cert_request_info, cert))
+
+        if histograms is not None:
+            histograms['total'].record(time.perf_counter() - start)
+
+        return results
+
+    def enroll_certs(self, enrollments, authority=None, workers=None,
+                     return_exceptions=False, histograms=None):
+        """
+        Enroll certificates for an iterable of (profile ID, inputs) pairs.
+
+        The enrollments are processed by a bounded pool of workers, so the
+        submit, approve and fetch round trips of different enrollments
+        overlap. The CertEnrollmentResult objects are yielded as the
+        enrollments complete, which may be in a different order than the
+        input, so each result includes the profile ID, inputs and index of
+        its enrollment. Only a bounded number of enrollments is read ahead
+        from the iterable.
+
+        If return_exceptions is True, a failed enrollment yields a
+        CertEnrollmentResult with the exception in its error attribute
+        instead of stopping the batch.
+
+        If histograms is a dict, it is populated with a LatencyHistogram
+        for each stage: create, submit, approve, get_request, get_cert and
+        total.
+
+        Requires an agent level authentication.
+        """
+
+        workers = workers or client.POOL_SIZE
+
+        if histograms is None:
+            histograms = {}
+
+        for stage in ['create', 'submit', 'approve', 'get_request', 'get_cert', 'total']:
+            histograms.setdefault(stage, pki.util.LatencyHistogram(stage))
+
+        def enroll(enrollment):
+            _, (profile_id, inputs) = enrollment
+            return self._enroll(profile_id, inputs, authority, histograms)
+
+        for (index, (profile_id, inputs)), future in client.run_batch(
+                enroll, enumerate(enrollments), workers):
+
+            try:
+                results = future.result()
+            except Exception as e:  # pylint: disable=broad-except
+                if not return_exceptions:
+                    raise
+                logger.warning('Unable to enroll %s certificate: %s', profile_id, e)
+                results = [CertEnrollmentResult(None, None, error=e)]
+
+            for result in results:
+                result.profile_id = profile_id
+                result.inputs = inputs
+                result.index = index
+                yield result
+
+        for histogram in histograms.values():
+            logger.info('Enrollment latency: %s', histogram)
+
+    def _revoke(self, cert_serial_number, action, revocation_reason,
+                invalidity_date, comments, authority, rate_limiter, histograms):
+
+        rate_limiter.acquire()
+        start = time.perf_counter()
+
+        if action == 'unrevoke':
+            result = self._timed(
+                histograms, 'submit', self.unrevoke_cert,
+                cert_serial_number, authority=authority)
+
+        else:
+            if action == 'hold':
+                revocation_reason = 'Certificate_Hold'
+
+            cert_data = self._timed(
+                histograms, 'review', self.review_cert, cert_serial_number)
+
+            result = self._timed(
+                histograms, 'submit', self.revoke_cert, cert_serial_number,
+                revocation_reason=revocation_reason,
+                invalidity_date=invalidity_date, comments=comments,
+                nonce=cert_data.nonce, authority=authority)
+
+        histograms['total'].record(time.perf_counter() - start)
+
+        return result
+
+    def revoke_certs(self, cert_serial_numbers, action='revoke',
+                     revocation_reason=None, invalidity_date=None,
+                     comments=None, authority=None, workers=None, rate=None,
+                     journal=None, summary=None, histograms=None):
+        """
+        Revoke, hold, or unrevoke multiple certificates.
+
+        The certificates are processed by a bounded pool of workers, so the
+        nonce retrieval and revocation round trips of different certificates
+        overlap, and no more than rate certificates are started per second.
+        A (serial number, CertRequestInfo) pair is yielded as each
+        certificate completes. A failed certificate or an invalid serial
+        number yields the exception in place of the CertRequestInfo and
+        does not stop the batch.
+
+        If journal is specified, the serial numbers of the completed
+        certificates are appended to the file, and serial numbers already
+        in the file are skipped, so an interrupted batch can be resumed.
+        Use a separate journal for each batch.
+
+        If summary is a dict, it is populated with the number of
+        certificates completed, failed, and skipped and the elapsed time.
+        If histograms is a dict, it is populated with a LatencyHistogram
+        for each stage: review, submit and total.
+
+        :param action: revoke, hold, or unrevoke
+        :type action: str
+
+        This method requires an agent's authentication cert in the
+        connection object.
+        """
+
+        if action not in ['revoke', 'hold', 'unrevoke']:
+            raise ValueError('Invalid revocation action: %s' % action)
+
+        if revocation_reason is not None and \
+                revocation_reason not in CertRevokeRequest.reasons:
+            raise ValueError('Invalid revocation reason specified.')
+
+        workers = workers or client.POOL_SIZE
+        rate_limiter = pki.util.RateLimiter(rate)
+
+        if summary is None:
+            summary = {}
+
+        summary.update({'completed': 0, 'failed': 0, 'skipped': 0})
+
+        if histograms is None:
+            histograms = {}
+
+        for stage in ['review', 'submit', 'total']:
+            histograms.setdefault(stage, pki.util.LatencyHistogram(stage))
+
+        completed = load_journal(journal) if journal else set()
+
+        def serial_numbers():
+            for cert_serial_number in cert_serial_numbers:
+
+                try:
+                    normalized = normalize_serial_number(cert_serial_number)
+
+                except ValueError as e:
+                    # report an invalid serial number as a failed
+                    # certificate instead of aborting the batch
+                    yield cert_serial_number, e
+                    continue
+
+                if normalized in completed:
+                    summary['skipped'] += 1
+                    continue
+
+                yield normalized, None
+
+        def revoke(item):
+            cert_serial_number, error = item
+
+            if error:
+                raise error
+
+            return self._revoke(
+                cert_serial_number, action, revocation_reason, invalidity_date,
+                comments, authority, rate_limiter, histograms)
+
+        journal_file = open(journal, 'a') if journal else None
+        start = time.perf_counter()
+
+        try:
+            for (cert_serial_number, _), future in client.run_batch(
+                    revoke, serial_numbers(), workers):
+
+                try:
+                    result = future.result()
+
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.warning('Unable to %s certificate %s: %s',
+                                   action, cert_serial_number, e)
+                    summary['failed'] += 1
+                    yield cert_serial_number, e
+                    continue
+
+                if journal_file:
+                    journal_file.write(cert_serial_number + '\n')
+                    journal_file.flush()
+
+                summary['completed'] += 1
+                yield cert_serial_number, result
+
+        finally:
+            if journal_file:
+                journal_file.close()
+
+            summary['elapsed'] = time.perf_counter() - start
+
+            for histogram in histograms.values():
+                logger.info('Revocation latency: %s', histogram)
+
+
+def normalize_serial_number(serial_number):
+    """
+    Return the serial number as a lowercase hexadecimal string with
+    0x prefix. The serial number can be an int or a string in decimal or
+    hexadecimal (with 0x prefix) format.
+    """
+
+    if isinstance(serial_number, int):
+        return hex(serial_number)
+
+    serial_number = str(serial_number).strip()
+
+    if serial_number.lower().startswith('0x'):
+        return hex(int(serial_number[2:], 16))
+
+    return hex(int(serial_number, 10))
+
+
+def parse_request_id(request_id):
+    """
+    Return the request ID as an int. The request ID can be an int or a
+    string in decimal or hexadecimal (with 0x prefix) format.
+    """
+
+    if isinstance(request_id, int):
+        return request_id
+
+    request_id = str(request_id).strip()
+
+    if request_id.lower().startswith('0x'):
+        return int(request_id[2:], 16)
+
+    return int(request_id, 10)
+
+
+def load_journal(filename):
+    """
+    Return the set of serial numbers in a revocation journal.
+    """
+
+    if not os.path.exists(filename):
+        return set()
+
+    with open(filename, 'r') as f:
+        # ignore an incomplete last line
+        return set(line.strip() for line in f if line.endswith('\n'))
+
+
+class AsyncCertClient(object):
+    """
+    Asyncio version of CertClient.
+
+    The requests are sent through an AsyncPKIConnection and the responses
+    are converted with the same models as CertClient. The number of
+    concurrent requests is bounded by the connection's max_concurrency.
+    """
+
+    def __init__(self, connection, max_concurrency=None, cache=None):
+        """
+        :param connection: connection to the server
+        :type connection: PKIConnection or AsyncPKIConnection
+        :param max_concurrency: maximum number of concurrent requests
+           (only used when connection is a PKIConnection)
+        :type max_concurrency: int
+        :param cache: optional cache for certificates and requests
+        :type cache: pki.cache.Cache
+        """
+
+        if not isinstance(connection, client.AsyncPKIConnection):
+            connection = client.AsyncPKIConnection(
+                connection, max_concurrency=max_concurrency)
+
+        self.connection = connection
+        self.client = CertClient(connection.connection, cache=cache)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    async def get_cert(self, cert_serial_number):
+        return await self.connection.run(
+            self.client.get_cert, cert_serial_number)
+
+    async def list_certs(self, max_results=None, max_time=None, start=None,
+                         size=None, **cert_search_params):
+        return await self.connection.run(
+            self.client.list_certs, max_results=max_results,
+            max_time=max_time, start=start, size=size, **cert_search_params)
+
+    async def review_cert(self, cert_serial_number):
+        return await self.connection.run(
+            self.client.review_cert, cert_serial_number)
+
+    async def revoke_cert(self, cert_serial_number, revocation_reason=None,
+                          invalidity_date=None, comments=None, nonce=None,
+                          authority=None):
+        return await self.connection.run(
+            self.client.revoke_cert, cert_serial_number,
+            revocation_reason=revocation_reason,
+            invalidity_date=invalidity_date, comments=comments, nonce=nonce,
+            authority=authority)
+
+    async def hold_cert(self, cert_serial_number, comments=None,
+                        authority=None):
+        return await self.connection.run(
+            self.client.hold_cert, cert_serial_number, comments=comments,
+            authority=authority)
+
+    async def unrevoke_cert(self, cert_serial_number, authority=None):
+        return await self.connection.run(
+            self.client.unrevoke_cert, cert_serial_number,
+            authority=authority)
+
+    async def get_request(self, request_id):
+        return await self.connection.run(self.client.get_request, request_id)
+
+    async def list_requests(self, request_status=None, request_type=None,
+                            from_request_id=None, size=None,
+                            max_results=None, max_time=None):
+        return await self.connection.run(
+            self.client.list_requests, request_status=request_status,
+            request_type=request_type, from_request_id=from_request_id,
+            size=size, max_results=max_results, max_time=max_time)
+
+    async def review_request(self, request_id):
+        return await self.connection.run(
+            self.client.review_request, request_id)
+
+    async def approve_request(self, request_id, cert_review_response=None):
+        return await self.connection.run(
+            self.client.approve_request, request_id, cert_review_response)
+
+    async def cancel_request(self, request_id, cert_review_response=None):
+        return await self.connection.run(
+            self.client.cancel_request, request_id, cert_review_response)
+
+    async def reject_request(self, request_id, cert_review_response=None):
+        return await self.connection.run(
+            self.client.reject_request, request_id, cert_review_response)
+
+    async def get_enrollment_template(self, profile_id):
+        return await self.connection.run(
+            self.client.get_enrollment_template, profile_id)
+
+    async def create_enrollment_request(self, profile_id, inputs):
+        return await self.connection.run(
+            self.client.create_enrollment_request, profile_id, inputs)
+
+    async def submit_enrollment_request(self, enrollment_request,
+                                        authority=None):
+        return await self.connection.run(
+            self.client.submit_enrollment_request, enrollment_request,
+            authority=authority)
+
+    async def get_certs(self, cert_serial_numbers, return_exceptions=False):
+        """
+        Retrieve multiple certificates concurrently and yield
+        (serial number, CertData) in completion order.
+        """
+
+        async for serial_number, cert in self.connection.map(
+                self.client.get_cert, cert_serial_numbers,
+                return_exceptions=return_exceptions):
+            yield serial_number, cert
+
+    async def get_requests(self, request_ids, return_exceptions=False):
+        """
+        Retrieve multiple certificate requests concurrently and yield
+        (request ID, CertRequestInfo) in completion order.
+        """
+
+        async for request_id, request in self.connection.map(
+                self.client.get_request, request_ids,
+                return_exceptions=return_exceptions):
+            yield request_id, request
 
 
 encoder.NOTYPES['CertData'] = CertData
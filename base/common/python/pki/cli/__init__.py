@@ -24,6 +24,7 @@ from __future__ import print_function
 
 import collections
 import getopt
+import importlib
 import logging
 import sys
 from six import itervalues
@@ -55,7 +56,15 @@ class CLI(object):
         module.parent = self
 
     def get_module(self, name):
-        return self.modules.get(name)
+
+        module = self.modules.get(name)
+
+        if isinstance(module, LazyModule):
+            # replace the placeholder with the actual module
+            module = module.load()
+            self.add_module(module)
+
+        return module
 
     def get_top_module(self):
         if self.parent:
@@ -215,3 +224,32 @@ class CLI(object):
         (module, module_args) = self.parse_args(argv)
 
         module.execute(module_args)
+
+
+class LazyModule(object):
+    '''
+    Placeholder for a CLI module whose Python module is only imported
+    when the CLI module is used. The name and description are used to
+    display the help message without importing the module.
+    '''
+
+    def __init__(self, name, description, module_name, class_name, deprecated=False):
+
+        self.name = name
+        self.description = description
+        self.module_name = module_name
+        self.class_name = class_name
+        self.parent = None
+        self.deprecated = deprecated
+
+    def get_full_name(self):
+        if self.parent:
+            return self.parent.get_full_module_name(self.name)
+        return self.name
+
+    def load(self):
+
+        logger.debug('Loading module %s from %s', self.name, self.module_name)
+
+        module = importlib.import_module(self.module_name)
+        return getattr(module, self.class_name)()
@@ -0,0 +1,372 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+from __future__ import absolute_import
+from __future__ import print_function
+import getopt
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from six.moves.urllib.parse import urlparse  # pylint: disable=F0401,E0611
+
+import pki
+import pki.cert
+import pki.cli
+import pki.client
+import pki.nssdb
+
+logger = logging.getLogger(__name__)
+
+
+class CACLI(pki.cli.CLI):
+
+    def __init__(self):
+        super().__init__('ca', 'CA management commands')
+
+        self.add_module(CACertCLI())
+
+
+class CACertCLI(pki.cli.CLI):
+
+    def __init__(self):
+        super().__init__('cert', 'Certificate management commands')
+
+        self.add_module(CACertRevokeCLI())
+        self.add_module(CACertHoldCLI())
+        self.add_module(CACertReleaseHoldCLI())
+
+
+class CACertBatchCLI(pki.cli.CLI):
+    '''
+    Base class for commands that process a list of certificates
+    from a file with CertClient.revoke_certs().
+    '''
+
+    action = None
+    prompt = None
+    message = None
+
+    def print_help(self):
+        print('Usage: pki ca-cert-%s --input-file <path> [OPTIONS]' % self.name)
+        print()
+        print('      --input-file <path>            File containing serial numbers, one per line')
+        self.print_action_help()
+        print('  -U <URL>                           Server URL (default: global server options or')
+        print('                                     https://localhost:8443)')
+        print('      --client-cert <path>           PEM file containing agent certificate')
+        print('                                     (default: -n certificate in NSS database)')
+        print('      --client-key <path>            PEM file containing agent key')
+        print('      --ca-bundle <path>             PEM file containing trusted CA certificates')
+        print('                                     (default: chain of global -n certificate)')
+        print('      --issuer-id <ID>               Authority ID of the issuer')
+        print('      --workers <number>             Number of concurrent requests (default: %d)'
+              % pki.client.POOL_SIZE)
+        print('      --rate <number>                Maximum certificates per second')
+        print('      --journal <path>               File to record completed certificates '
+              'for resuming')
+        print('      --force                        Do not ask for confirmation')
+        print('  -v, --verbose                      Run in verbose mode.')
+        print('      --debug                        Run in debug mode.')
+        print('      --help                         Show help message.')
+        print()
+
+    def print_action_help(self):
+        pass
+
+    def execute(self, argv):
+
+        try:
+            opts, _ = getopt.gnu_getopt(argv, 'U:v', [
+                'input-file=', 'reason=', 'comments=',
+                'client-cert=', 'client-key=', 'ca-bundle=', 'issuer-id=',
+                'workers=', 'rate=', 'journal=', 'force',
+                'verbose', 'debug', 'help'])
+
+        except getopt.GetoptError as e:
+            logger.error(e)
+            self.print_help()
+            sys.exit(1)
+
+        main_cli = self.get_top_module()
+
+        input_file = None
+        reason = None
+        comments = None
+        url = main_cli.url
+        client_cert = None
+        client_key = None
+        ca_bundle = None
+        issuer_id = None
+        workers = None
+        rate = None
+        journal = None
+        force = False
+
+        for o, a in opts:
+            if o == '--input-file':
+                input_file = a
+
+            elif o == '--reason' and self.action == 'revoke':
+                reason = a
+
+            elif o == '--comments' and self.action != 'unrevoke':
+                comments = a
+
+            elif o == '-U':
+                url = a
+
+            elif o == '--client-cert':
+                client_cert = a
+
+            elif o == '--client-key':
+                client_key = a
+
+            elif o == '--ca-bundle':
+                ca_bundle = a
+
+            elif o == '--issuer-id':
+                issuer_id = a
+
+            elif o == '--workers':
+                try:
+                    workers = int(a)
+                except ValueError:
+                    logger.error('Invalid number of workers: %s', a)
+                    self.print_help()
+                    sys.exit(1)
+
+            elif o == '--rate':
+                try:
+                    rate = float(a)
+                except ValueError:
+                    logger.error('Invalid rate: %s', a)
+                    self.print_help()
+                    sys.exit(1)
+
+            elif o == '--journal':
+                journal = a
+
+            elif o == '--force':
+                force = True
+
+            elif o in ('-v', '--verbose'):
+                logging.getLogger().setLevel(logging.INFO)
+
+            elif o == '--debug':
+                logging.getLogger().setLevel(logging.DEBUG)
+
+            elif o == '--help':
+                self.print_help()
+                sys.exit()
+
+            else:
+                logger.error('Invalid option: %s', o)
+                self.print_help()
+                sys.exit(1)
+
+        if not input_file:
+            logger.error('Missing input file')
+            self.print_help()
+            sys.exit(1)
+
+        if reason and reason not in pki.cert.CertRevokeRequest.reasons:
+            logger.error('Invalid revocation reason: %s', reason)
+            sys.exit(1)
+
+        if not client_cert and not main_cli.nickname:
+            logger.error('Missing agent certificate')
+            self.print_help()
+            sys.exit(1)
+
+        if not force:
+            print('%s certificates listed in %s' % (self.prompt, input_file))
+            print('Are you sure (Y/N)? ', end='')
+            sys.stdout.flush()
+
+            if sys.stdin.readline().strip().upper() != 'Y':
+                return
+
+        if url:
+            o = urlparse(url)
+            protocol = o.scheme
+            hostname = o.hostname
+            port = str(o.port or (443 if o.scheme == 'https' else 80))
+
+        else:
+            protocol = main_cli.protocol or 'https'
+            hostname = main_cli.hostname or 'localhost'
+            port = main_cli.port or '8443'
+
+        tmpdir = tempfile.mkdtemp()
+
+        try:
+            if not client_cert:
+                client_cert, chain = self.export_client_cert(main_cli, tmpdir)
+                ca_bundle = ca_bundle or chain
+
+            connection = pki.client.PKIConnection(
+                protocol=protocol,
+                hostname=hostname,
+                port=port,
+                verify=True,
+                cert_paths=ca_bundle,
+                pool_size=workers)
+
+            connection.set_authentication_cert(client_cert, client_key)
+
+            # the files are loaded when the connections are established
+            self.process(
+                connection, input_file, reason, comments, issuer_id,
+                workers, rate, journal)
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def export_client_cert(self, main_cli, tmpdir):
+        '''
+        Export the certificate specified with the global -n option and its
+        key from the NSS database into a PEM file for python-requests.
+        Return the PEM file and a PEM file containing the certificate chain,
+        or None if the chain is empty.
+        '''
+
+        nssdb = pki.nssdb.NSSDatabase(
+            directory=main_cli.database,
+            token=main_cli.token,
+            password=main_cli.password,
+            password_file=main_cli.password_file,
+            password_conf=main_cli.password_conf)
+
+        try:
+            pkcs12_file = os.path.join(tmpdir, 'client.p12')
+            pkcs12_password_file = nssdb.create_password_file(
+                tmpdir, pki.generate_password(), 'pkcs12_password.txt')
+
+            logger.info('Exporting %s certificate from %s', main_cli.nickname, nssdb.directory)
+
+            nssdb.export_pkcs12(
+                pkcs12_file,
+                pkcs12_password_file=pkcs12_password_file,
+                nicknames=[main_cli.nickname],
+                include_trust_flags=False)
+
+            client_cert = os.path.join(tmpdir, 'client.pem')
+            chain = os.path.join(tmpdir, 'chain.pem')
+
+            cmd = [
+                'openssl', 'pkcs12',
+                '-in', pkcs12_file,
+                '-passin', 'file:' + pkcs12_password_file,
+                '-nodes'
+            ]
+
+            logger.debug('Command: %s', ' '.join(cmd))
+            subprocess.check_call(cmd + ['-clcerts', '-out', client_cert])
+            subprocess.check_call(cmd + ['-cacerts', '-nokeys', '-out', chain])
+
+        finally:
+            nssdb.close()
+
+        if not os.path.getsize(chain):
+            chain = None
+
+        return client_cert, chain
+
+    def process(self, connection, input_file, reason, comments, issuer_id,
+                workers, rate, journal):
+
+        cert_client = pki.cert.CertClient(connection)
+        summary = {}
+        histograms = {}
+
+        with open(input_file, 'r') as f:
+
+            # skip blank lines and comments
+            serial_numbers = (line.strip() for line in f)
+            serial_numbers = (s for s in serial_numbers if s and not s.startswith('#'))
+
+            results = cert_client.revoke_certs(
+                serial_numbers,
+                action=self.action,
+                revocation_reason=reason,
+                comments=comments,
+                authority=issuer_id,
+                workers=workers,
+                rate=rate,
+                journal=journal,
+                summary=summary,
+                histograms=histograms)
+
+            for serial_number, result in results:
+                if isinstance(result, Exception):
+                    print('%s: ERROR: %s' % (serial_number, result))
+                else:
+                    logger.info('%s: %s', serial_number, result.operation_result)
+
+        self.print_summary(summary, histograms)
+
+        if summary['failed']:
+            sys.exit(1)
+
+    def print_summary(self, summary, histograms):
+
+        elapsed = summary['elapsed']
+        rate = summary['completed'] / elapsed if elapsed else 0
+
+        print('-' * 40)
+        print('%s %d certificate(s)' % (self.message, summary['completed']))
+        print('-' * 40)
+        print('  Completed: %d' % summary['completed'])
+        print('  Failed: %d' % summary['failed'])
+        print('  Skipped: %d' % summary['skipped'])
+        print('  Elapsed: %.1f s' % elapsed)
+        print('  Rate: %.1f/s' % rate)
+
+        for name in ['review', 'submit', 'total']:
+            if histograms[name].count:
+                print('  Latency: %s' % histograms[name])
+
+
+class CACertRevokeCLI(CACertBatchCLI):
+
+    action = 'revoke'
+    prompt = 'Revoking'
+    message = 'Revoked'
+
+    def __init__(self):
+        super().__init__('revoke', 'Revoke certificates')
+
+    def print_action_help(self):
+        print('      --reason <reason>              Revocation reason: %s (default: Unspecified)'
+              % ', '.join(pki.cert.CertRevokeRequest.reasons))
+        print('      --comments <comments>          Comments')
+
+
+class CACertHoldCLI(CACertBatchCLI):
+
+    action = 'hold'
+    prompt = 'Placing on-hold'
+    message = 'Placed on-hold'
+
+    def __init__(self):
+        super().__init__('hold', 'Place certificates on-hold')
+
+    def print_action_help(self):
+        print('      --comments <comments>          Comments')
+
+
+class CACertReleaseHoldCLI(CACertBatchCLI):
+
+    action = 'unrevoke'
+    prompt = 'Placing off-hold'
+    message = 'Placed off-hold'
+
+    def __init__(self):
+        super().__init__('release-hold', 'Place certificates off-hold')
@@ -27,6 +27,7 @@ import subprocess
 import sys
 
 import pki.cli
+import pki.cli.ca
 import pki.cli.password
 import pki.cli.pkcs12
 import pki.nssdb
@@ -36,6 +37,14 @@ logger = logging.getLogger(__name__)
 
 PYTHON_COMMANDS = ['password-generate', 'pkcs12-import']
 
+# commands executed in Python when processing an input file
+PYTHON_BATCH_COMMANDS = ['ca-cert-revoke', 'ca-cert-hold', 'ca-cert-release-hold']
+
+# global options with values that are only used by Java commands
+JAVA_OPTIONS = [
+    '-t', '-u', '-w', '-W', '--output', '--reject-cert-status',
+    '--ignore-cert-status', '--message-format']
+
 
 class PKICLI(pki.cli.CLI):
 
@@ -50,6 +59,13 @@ class PKICLI(pki.cli.CLI):
         self.token = None
         self.ignore_banner = False
 
+        self.url = None
+        self.protocol = None
+        self.hostname = None
+        self.port = None
+        self.nickname = None
+
+        self.add_module(pki.cli.ca.CACLI())
         self.add_module(pki.cli.password.PasswordCLI())
         self.add_module(pki.cli.pkcs12.PKCS12CLI())
 
@@ -60,6 +76,11 @@ class PKICLI(pki.cli.CLI):
         print('Usage: pki [OPTIONS]')
         print()
         print('      --client-type <type>     PKI client type (default: java)')
+        print('   -U <URL>                    Server URL')
+        print('   -P <protocol>               Protocol (default: https)')
+        print('   -h <hostname>               Hostname')
+        print('   -p <port>                   Port (default: 8443)')
+        print('   -n <nickname>               Nickname for client certificate authentication')
         print('   -d <path>                   NSS database location ' +
               '(default: ~/.dogtag/nssdb)')
         print('   -c <password>               NSS database password ' +
@@ -129,6 +150,21 @@ class PKICLI(pki.cli.CLI):
 
         # restore options for Java commands
 
+        if self.url:
+            cmd.extend(['-U', self.url])
+
+        if self.protocol:
+            cmd.extend(['-P', self.protocol])
+
+        if self.hostname:
+            cmd.extend(['-h', self.hostname])
+
+        if self.port:
+            cmd.extend(['-p', self.port])
+
+        if self.nickname:
+            cmd.extend(['-n', self.nickname])
+
         if self.database:
             cmd.extend(['-d', self.database])
 
@@ -169,6 +205,7 @@ class PKICLI(pki.cli.CLI):
         client_type = 'java'
 
         pki_options = []
+        java_options = []
         command = None
         cmd_args = []
 
@@ -182,8 +219,43 @@ class PKICLI(pki.cli.CLI):
                 command = args[i]
                 break
 
+            # get server URL
+            if args[i] == '-U':
+                self.url = args[i + 1]
+                pki_options.append(args[i])
+                pki_options.append(args[i + 1])
+                i = i + 2
+
+            # get server protocol
+            elif args[i] == '-P':
+                self.protocol = args[i + 1]
+                pki_options.append(args[i])
+                pki_options.append(args[i + 1])
+                i = i + 2
+
+            # get server hostname
+            elif args[i] == '-h':
+                self.hostname = args[i + 1]
+                pki_options.append(args[i])
+                pki_options.append(args[i + 1])
+                i = i + 2
+
+            # get server port
+            elif args[i] == '-p':
+                self.port = args[i + 1]
+                pki_options.append(args[i])
+                pki_options.append(args[i + 1])
+                i = i + 2
+
+            # get client certificate nickname
+            elif args[i] == '-n':
+                self.nickname = args[i + 1]
+                pki_options.append(args[i])
+                pki_options.append(args[i + 1])
+                i = i + 2
+
             # get database path
-            if args[i] == '-d':
+            elif args[i] == '-d':
                 self.database = args[i + 1]
                 pki_options.append(args[i])
                 pki_options.append(args[i + 1])
@@ -242,8 +314,13 @@ class PKICLI(pki.cli.CLI):
                 pki_options.append(args[i + 1])
                 i = i + 2
 
-            else:  # otherwise, save the arg for the next module
-                cmd_args.append(args[i])
+            # save Java options with their values
+            elif args[i] in JAVA_OPTIONS:
+                java_options.extend(args[i:i + 2])
+                i = i + 2
+
+            else:  # otherwise, save the arg for Java commands
+                java_options.append(args[i])
                 i = i + 1
 
         # save the rest of the args
@@ -251,15 +328,19 @@ class PKICLI(pki.cli.CLI):
             cmd_args.append(args[i])
             i = i + 1
 
-        logger.info('PKI options: %s', ' '.join(pki_options))
+        logger.info('PKI options: %s', ' '.join(pki_options + java_options))
         logger.info('PKI command: %s %s', command, ' '.join(cmd_args))
 
+        if command in PYTHON_BATCH_COMMANDS and \
+                any(arg.startswith('--input-file') for arg in cmd_args):
+            client_type = 'python'
+
         if client_type == 'python' or command in PYTHON_COMMANDS:
             (module, module_args) = self.parse_args(cmd_args)
             module.execute(module_args)
 
         elif client_type == 'java':
-            self.execute_java(cmd_args)
+            self.execute_java(java_options + cmd_args)
 
         else:
             raise Exception('Unsupported client type: ' + client_type)
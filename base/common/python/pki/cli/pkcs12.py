@@ -21,6 +21,7 @@
 
 from __future__ import absolute_import
 from __future__ import print_function
+import base64
 import getopt
 import logging
 import os
@@ -29,8 +30,11 @@ import shutil
 import sys
 import tempfile
 
+from cryptography.exceptions import UnsupportedAlgorithm
+
 import pki.cli
 import pki.nssdb
+import pki.pkcs12
 
 logger = logging.getLogger(__name__)
 
@@ -148,12 +152,94 @@ class PKCS12ImportCLI(pki.cli.CLI):
 
         main_cli = self.parent.parent
 
-        # Due to JSS limitation, CA certificates need to be imported
-        # using certutil in order to preserve the nickname stored in
-        # the PKCS #12 file.
+        certs = self.find_certs(pkcs12_file, pkcs12_password, password_file)
 
         logger.info('Certificates in PKCS #12 file:')
+        for cert_info in certs:
+            logger.info('- %s', cert_info['nickname'])
+
+        # import CA certificates if requested
+        if import_ca_certs:
+            self.import_ca_certs(
+                certs, pkcs12_file, pkcs12_password, password_file, overwrite)
+
+        # import user certificates if requested
+        nicknames = []
+
+        if import_user_certs:
+
+            logger.info('Importing user certificates:')
+
+            for cert_info in certs:
+
+                has_key = cert_info['has_key']
+                if not has_key:
+                    continue
+
+                nickname = cert_info['nickname']
+                logger.info('- %s', nickname)
+
+                if nickname not in nicknames:
+                    nicknames.append(nickname)
+
+        # the PKCS #12 file is only imported with JSS if it contains keys
+        if nicknames:
+
+            cmd = ['pkcs12-import']
+
+            if pkcs12_file:
+                cmd.extend(['--pkcs12', pkcs12_file])
+
+            if pkcs12_password:
+                cmd.extend(['--password', pkcs12_password])
+
+            if password_file:
+                cmd.extend(['--password-file', password_file])
+
+            if no_trust_flags:
+                cmd.extend(['--no-trust-flags'])
+
+            if overwrite:
+                cmd.extend(['--overwrite'])
+
+            if logger.isEnabledFor(logging.DEBUG):
+                cmd.extend(['--debug'])
+
+            elif logger.isEnabledFor(logging.INFO):
+                cmd.extend(['-v'])
+
+            cmd.extend(nicknames)
+
+            with open(os.devnull, 'w') as f:
+                main_cli.execute_java(cmd, stdout=f)
+
+    def find_certs(self, pkcs12_file, pkcs12_password=None, password_file=None):
+        '''
+        Find the certificates in the PKCS #12 file in-process, or with
+        pkcs12-cert-find if the file cannot be read directly (e.g. it uses
+        an unsupported algorithm).
+        '''
+
+        password = pkcs12_password
+
+        if password_file:
+            with open(password_file, 'r') as f:
+                password = f.read().strip()
+
+        with open(pkcs12_file, 'rb') as f:
+            data = f.read()
+
+        try:
+            return pki.pkcs12.find_certs(data, password)
 
+        except (UnsupportedAlgorithm, ValueError) as e:
+            logger.info('Unable to read %s: %s', pkcs12_file, e)
+
+        return self.find_certs_with_java(pkcs12_file, pkcs12_password, password_file)
+
+    def find_certs_with_java(self, pkcs12_file, pkcs12_password=None, password_file=None):
+
+        main_cli = self.parent.parent
         certs = []
 
         tmpdir = tempfile.mkdtemp()
@@ -196,9 +282,7 @@ class PKCS12ImportCLI(pki.cli.CLI):
 
                     match = re.match(r'  Friendly Name: (.*)$', line)
                     if match:
-                        nickname = match.group(1)
-                        cert_info['nickname'] = nickname
-                        logger.info('- %s', nickname)
+                        cert_info['nickname'] = match.group(1)
                         continue
 
                     match = re.match(r'  Trust Flags: (.*)$', line)
@@ -214,125 +298,97 @@ class PKCS12ImportCLI(pki.cli.CLI):
         finally:
             shutil.rmtree(tmpdir)
 
-        # import CA certificates if requested
-        if import_ca_certs:
-
-            logger.info('Importing CA certificates:')
-
-            tmpdir = tempfile.mkdtemp()
-
-            try:
-                cert_file = os.path.join(tmpdir, 'ca-cert.pem')
-
-                nssdb = pki.nssdb.NSSDatabase(
-                    main_cli.database,
-                    token=main_cli.token,
-                    password=main_cli.password,
-                    password_file=main_cli.password_file,
-                    password_conf=main_cli.password_conf)
-
-                for cert_info in certs:
-
-                    has_key = cert_info['has_key']
-                    if has_key:
-                        continue
-
-                    cert_id = cert_info['id']
-                    nickname = cert_info['nickname']
-                    logger.info('- %s', nickname)
-
-                    cert = nssdb.get_cert(nickname=nickname)
+        return certs
 
-                    if cert:
-                        if not overwrite:
-                            logger.warning('Certificate already exists: %s', nickname)
-                            continue
+    def export_cert_with_java(
+            self, cert_id, pkcs12_file, pkcs12_password=None, password_file=None):
 
-                        nssdb.remove_cert(nickname=nickname)
+        main_cli = self.parent.parent
 
-                    if 'trust_flags' in cert_info:
-                        trust_flags = cert_info['trust_flags']
-                    else:
-                        # default trust flags for CA certificates
-                        trust_flags = 'CT,C,C'
+        tmpdir = tempfile.mkdtemp()
 
-                    logger.info('Exporting %s (%s) from PKCS #12 file', nickname, cert_id)
+        try:
+            cert_file = os.path.join(tmpdir, 'ca-cert.pem')
 
-                    cmd = ['pkcs12-cert-export']
+            cmd = ['pkcs12-cert-export']
 
-                    if pkcs12_file:
-                        cmd.extend(['--pkcs12-file', pkcs12_file])
+            if pkcs12_file:
+                cmd.extend(['--pkcs12-file', pkcs12_file])
 
-                    if pkcs12_password:
-                        cmd.extend(['--pkcs12-password', pkcs12_password])
+            if pkcs12_password:
+                cmd.extend(['--pkcs12-password', pkcs12_password])
 
-                    if password_file:
-                        cmd.extend(['--pkcs12-password-file', password_file])
+            if password_file:
+                cmd.extend(['--pkcs12-password-file', password_file])
 
-                    cmd.extend(['--cert-file', cert_file])
+            cmd.extend(['--cert-file', cert_file])
 
-                    cmd.extend(['--cert-id', cert_id])
+            cmd.extend(['--cert-id', cert_id])
 
-                    if logger.isEnabledFor(logging.DEBUG):
-                        cmd.extend(['--debug'])
+            if logger.isEnabledFor(logging.DEBUG):
+                cmd.extend(['--debug'])
 
-                    elif logger.isEnabledFor(logging.INFO):
-                        cmd.extend(['-v'])
+            elif logger.isEnabledFor(logging.INFO):
+                cmd.extend(['-v'])
 
-                    main_cli.execute_java(cmd)
+            main_cli.execute_java(cmd)
 
-                    logger.info('Importing %s', nickname)
+            with open(cert_file, 'r') as f:
+                cert_data = pki.nssdb.convert_cert(f.read(), 'pem', 'base64')
 
-                    nssdb.add_cert(
-                        nickname=nickname,
-                        cert_file=cert_file,
-                        trust_attributes=trust_flags)
+            return base64.b64decode(cert_data)
 
-            finally:
-                shutil.rmtree(tmpdir)
+        finally:
+            shutil.rmtree(tmpdir)
 
-        # import user certificates if requested
-        if import_user_certs:
+    def import_ca_certs(
+            self, certs, pkcs12_file,
+            pkcs12_password=None, password_file=None, overwrite=False):
+        '''
+        Import the certificates without keys in a single batch.
+        '''
 
-            logger.info('Importing user certificates:')
+        main_cli = self.parent.parent
 
-            nicknames = []
-            for cert_info in certs:
+        logger.info('Importing CA certificates:')
 
-                has_key = cert_info['has_key']
-                if not has_key:
-                    continue
+        nssdb = pki.nssdb.NSSDatabase(
+            main_cli.database,
+            token=main_cli.token,
+            password=main_cli.password,
+            password_file=main_cli.password_file,
+            password_conf=main_cli.password_conf)
 
-                nickname = cert_info['nickname']
-                logger.info('- %s', nickname)
+        inventory = nssdb.get_cert_inventory()
+        ca_certs = []
 
-                if nickname not in nicknames:
-                    nicknames.append(nickname)
+        for cert_info in certs:
 
-            cmd = ['pkcs12-import']
+            if cert_info['has_key']:
+                continue
 
-            if pkcs12_file:
-                cmd.extend(['--pkcs12', pkcs12_file])
+            nickname = cert_info['nickname']
 
-            if pkcs12_password:
-                cmd.extend(['--password', pkcs12_password])
+            if not nickname:
+                logger.warning('Certificate has no nickname')
+                continue
 
-            if password_file:
-                cmd.extend(['--password-file', password_file])
+            logger.info('- %s', nickname)
 
-            if no_trust_flags:
-                cmd.extend(['--no-trust-flags'])
+            if nickname in inventory and not overwrite:
+                logger.warning('Certificate already exists: %s', nickname)
+                continue
 
-            if overwrite:
-                cmd.extend(['--overwrite'])
+            # default trust flags for CA certificates
+            trust_flags = cert_info.get('trust_flags', 'CT,C,C')
 
-            if logger.isEnabledFor(logging.DEBUG):
-                cmd.extend(['--debug'])
+            cert_data = cert_info.get('data')
 
-            elif logger.isEnabledFor(logging.INFO):
-                cmd.extend(['-v'])
+            if cert_data is None:
+                logger.info('Exporting %s (%s) from PKCS #12 file', nickname, cert_info['id'])
+                cert_data = self.export_cert_with_java(
+                    cert_info['id'], pkcs12_file, pkcs12_password, password_file)
 
-            cmd.extend(nicknames)
+            ca_certs.append((nickname, cert_data, trust_flags))
 
-            with open(os.devnull, 'w') as f:
-                main_cli.execute_java(cmd, stdout=f)
+        nssdb.add_certs(ca_certs, overwrite=overwrite)
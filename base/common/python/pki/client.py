@@ -22,11 +22,16 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import asyncio
+import concurrent.futures
+import copy
 import functools
 import inspect
+import itertools
 import logging
 import os
 import ssl
+import threading
 import warnings
 
 import requests
@@ -39,6 +44,18 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# maximum number of connections to keep in each connection pool
+POOL_SIZE = int(os.getenv('PKI_CONNECTION_POOL_SIZE', str(DEFAULT_POOLSIZE)))
+
+# SSL contexts indexed by (verify, CA files, CA paths, client cert)
+SSL_CONTEXTS = {}
+
+# adapters shared by PKIConnections indexed by
+# (hostname, port, verify, cert paths, client cert, pool size)
+CONNECTION_POOLS = {}
+
+CONNECTION_POOLS_LOCK = threading.Lock()
+
 
 def catch_insecure_warning(func):
     """Temporary silence InsecureRequestWarning
@@ -56,6 +73,119 @@ def catch_insecure_warning(func):
     return wrapper
 
 
+def get_ssl_context(verify=True, cafiles=(), capaths=(), client_cert=None):
+    """
+    Return an SSLContext for the specified trust configuration. The
+    context is created once and shared, so the system trust store and
+    the CA certificates are only loaded once per process.
+
+    :param verify: enable certificate verification
+    :type verify: None, bool, str
+    :param cafiles: paths to CA certificate files
+    :type cafiles: tuple
+    :param capaths: paths to CA certificate directories
+    :type capaths: tuple
+    :param client_cert: client certificate that will be used with the context
+    :type client_cert: None, str, tuple
+    :returns: ssl.SSLContext
+    """
+
+    key = (verify, tuple(cafiles), tuple(capaths), client_cert)
+
+    with CONNECTION_POOLS_LOCK:
+
+        context = SSL_CONTEXTS.get(key)
+        if context:
+            return context
+
+        context = ssl.SSLContext(
+            ssl.PROTOCOL_TLS  # pylint: disable=no-member
+        )
+
+        # Enable post handshake authentication for TLS 1.3
+        if getattr(context, "post_handshake_auth", None) is not None:
+            context.post_handshake_auth = True
+
+        # Load from the system trust store when possible; per documentation
+        # this call could silently fail and refuse to configure any
+        # certificates. In this instance, the user should provide a
+        # certificate manually.
+        context.set_default_verify_paths()
+
+        # Load any specific certificate paths that have been specified.
+        for cafile in cafiles:
+            context.load_verify_locations(cafile=cafile)
+        for capath in capaths:
+            context.load_verify_locations(capath=capath)
+
+        if verify:
+            # Enable certificate verification
+            context.verify_mode = ssl.VerifyMode.CERT_REQUIRED  # pylint: disable=no-member
+
+        SSL_CONTEXTS[key] = context
+
+    return context
+
+
+def get_connection_pool(hostname, port, verify=True, cert_paths=None,
+                        client_cert=None, pool_size=None):
+    """
+    Return the adapter that holds the connection pools for the specified
+    server. The adapter is shared by all PKIConnections in the process
+    with the same parameters so that they reuse keep-alive connections
+    instead of performing new TLS handshakes.
+
+    :param pool_size: maximum number of connections to keep in the pool
+       (default: PKI_CONNECTION_POOL_SIZE or 10)
+    :type pool_size: int
+    :returns: SSLContextAdapter
+    """
+
+    if isinstance(cert_paths, list):
+        cert_paths = tuple(cert_paths)
+
+    if isinstance(client_cert, list):
+        client_cert = tuple(client_cert)
+
+    pool_size = pool_size or POOL_SIZE
+
+    key = (hostname, port, verify, cert_paths, client_cert, pool_size)
+
+    with CONNECTION_POOLS_LOCK:
+        adapter = CONNECTION_POOLS.get(key)
+
+    if adapter:
+        return adapter
+
+    adapter = SSLContextAdapter(
+        pool_maxsize=pool_size,
+        verify=verify,
+        cert_paths=cert_paths,
+        client_cert=client_cert)
+
+    with CONNECTION_POOLS_LOCK:
+        # another thread might have created the adapter
+        return CONNECTION_POOLS.setdefault(key, adapter)
+
+
+def close_connection_pools():
+    """
+    Close all shared connection pools.
+    """
+
+    with CONNECTION_POOLS_LOCK:
+        adapters_list = list(CONNECTION_POOLS.values())
+        CONNECTION_POOLS.clear()
+
+    for adapter in adapters_list:
+        adapter.close()
+
+
+if hasattr(os, 'register_at_fork'):
+    # connections must not be shared with child processes
+    os.register_at_fork(after_in_child=CONNECTION_POOLS.clear)
+
+
 class SSLContextAdapter(adapters.HTTPAdapter):
     """
     Custom SSLContext Adapter for requests
@@ -64,8 +194,9 @@ class SSLContextAdapter(adapters.HTTPAdapter):
     def __init__(self, pool_connections=DEFAULT_POOLSIZE,
                  pool_maxsize=DEFAULT_POOLSIZE, max_retries=DEFAULT_RETRIES,
                  pool_block=DEFAULT_POOLBLOCK, verify=True,
-                 cert_paths=None):
+                 cert_paths=None, client_cert=None):
         self.verify = verify
+        self.client_cert = client_cert
         self.cafiles = []
         self.capaths = []
 
@@ -94,30 +225,15 @@ class SSLContextAdapter(adapters.HTTPAdapter):
 
     def init_poolmanager(self, connections, maxsize,
                          block=adapters.DEFAULT_POOLBLOCK, **pool_kwargs):
-        context = ssl.SSLContext(
-            ssl.PROTOCOL_TLS  # pylint: disable=no-member
-        )
 
-        # Enable post handshake authentication for TLS 1.3
-        if getattr(context, "post_handshake_auth", None) is not None:
-            context.post_handshake_auth = True
-
-        # Load from the system trust store when possible; per documentation
-        # this call could silently fail and refuse to configure any
-        # certificates. In this instance, the user should provide a
-        # certificate manually.
-        context.set_default_verify_paths()
-
-        # Load any specific certificate paths that have been specified during
-        # adapter initialization.
-        for cafile in self.cafiles:
-            context.load_verify_locations(cafile=cafile)
-        for capath in self.capaths:
-            context.load_verify_locations(capath=capath)
-
-        if self.verify:
-            # Enable certificate verification
-            context.verify_mode = ssl.VerifyMode.CERT_REQUIRED  # pylint: disable=no-member
+        # Contexts are shared between adapters with the same configuration.
+        # The client cert is part of the key since it is loaded into the
+        # context when a connection is established.
+        context = get_ssl_context(
+            verify=self.verify,
+            cafiles=self.cafiles,
+            capaths=self.capaths,
+            client_cert=self.client_cert)
 
         pool_kwargs['ssl_context'] = context
         return super().init_poolmanager(
@@ -133,7 +249,8 @@ class PKIConnection:
 
     def __init__(self, protocol='http', hostname='localhost', port='8080',
                  subsystem=None, accept='application/json',
-                 trust_env=None, verify=True, cert_paths=None):
+                 trust_env=None, verify=True, cert_paths=None,
+                 pool_size=None):
         """
         Set the parameters for a python-requests based connection to a
         Dogtag subsystem.
@@ -158,6 +275,10 @@ class PKIConnection:
         :param cert_paths: paths to CA certificates / directories in OpenSSL
           format. (default: None)
         :type cert_paths: None, str, list
+        :param pool_size: maximum number of keep-alive connections to the
+          server shared by all PKIConnections in the process
+          (default: PKI_CONNECTION_POOL_SIZE or 10)
+        :type pool_size: int
         :return: PKIConnection object.
         """
 
@@ -177,14 +298,35 @@ class PKIConnection:
         else:
             self.serverURI = self.rootURI
 
+        self.verify = verify
+        self.cert_paths = cert_paths
+        self.pool_size = pool_size
+
         self.session = requests.Session()
-        self.session.mount("https://", SSLContextAdapter(verify=verify, cert_paths=cert_paths))
+        self.mount()
         self.session.trust_env = trust_env
         self.session.verify = verify
 
         if accept:
             self.session.headers.update({'Accept': accept})
 
+    def mount(self):
+        """
+        Use the shared connection pool for the current server and
+        client certificate.
+        """
+
+        adapter = get_connection_pool(
+            self.hostname,
+            self.port,
+            verify=self.verify,
+            cert_paths=self.cert_paths,
+            client_cert=self.session.cert,
+            pool_size=self.pool_size)
+
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
     def authenticate(self, username=None, password=None):
         """
         Set the parameters used for authentication if username/password is to
@@ -222,6 +364,9 @@ class PKIConnection:
         else:
             self.session.cert = pem_cert_path
 
+        # connections with a different client cert must not be shared
+        self.mount()
+
     @catch_insecure_warning
     def get(self, path, headers=None, params=None, payload=None,
             use_root_uri=False, timeout=None):
@@ -357,6 +502,280 @@ class PKIConnection:
         return r
 
 
+def get_entries(json_value):
+    """
+    Return the entries of a collection returned by the server as a list.
+    """
+
+    entries = json_value.get('entries')
+
+    if entries is None:
+        return []
+
+    if not isinstance(entries, list):
+        return [entries]
+
+    return entries
+
+
+def iter_pages(fetch, start=None, prefetch=False):
+    """
+    Iterate over the entries of a paged collection.
+
+    The fetch function takes the start of a page and returns the entries
+    in the page and the start of the next page, or None if it is the last
+    page. Only one page (or two with prefetch) is kept in memory at a time.
+
+    :param fetch: function that retrieves a page
+    :type fetch: function
+    :param start: start of the first page
+    :param prefetch: retrieve the next page in the background while the
+       entries in the current page are being processed
+    :type prefetch: bool
+    """
+
+    if not prefetch:
+        while True:
+            entries, start = fetch(start)
+            yield from entries
+            if start is None:
+                return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+
+        future = executor.submit(fetch, start)
+
+        try:
+            while future:
+                entries, start = future.result()
+
+                if start is None:
+                    future = None
+                else:
+                    future = executor.submit(fetch, start)
+
+                yield from entries
+
+        finally:
+            if future:
+                future.cancel()
+
+
+def run_batch(func, items, workers, executor=None):
+    """
+    Execute a function for each item in a bounded pool of threads and
+    yield (item, future) in completion order. Only a bounded number of
+    items is read ahead from the iterable, so it can be arbitrarily
+    large. Pending items are cancelled if the generator is closed.
+
+    If the iterable raises an exception, the items that have already
+    been submitted are yielded before the exception is raised.
+
+    :param func: function that takes an item
+    :type func: function
+    :param items: items to process
+    :type items: iterable
+    :param workers: number of threads
+    :type workers: int
+    :param executor: existing executor to run the function in
+       (default: a new executor with the specified number of threads)
+    :type executor: concurrent.futures.Executor
+    """
+
+    if executor is None:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            yield from run_batch(func, items, workers, executor=executor)
+        return
+
+    items = iter(items)
+    pending = {}
+    errors = []
+
+    def submit(count):
+
+        if errors:
+            return
+
+        try:
+            for item in itertools.islice(items, count):
+                pending[executor.submit(func, item)] = item
+
+        except Exception as e:  # pylint: disable=broad-except
+            # stop reading items but finish the submitted ones
+            errors.append(e)
+
+    # keep an item queued for each worker
+    submit(workers * 2)
+
+    try:
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                item = pending.pop(future)
+                submit(1)
+                yield item, future
+
+    finally:
+        for future in pending:
+            future.cancel()
+
+    if errors:
+        raise errors[0]
+
+
+class AsyncPKIConnection:
+    """
+    Asyncio transport for a PKIConnection.
+
+    The requests are executed with the PKIConnection in a bounded pool of
+    workers that matches the size of the connection pool, so each worker
+    reuses a keep-alive connection. At most max_concurrency requests are
+    in flight at any time; additional requests wait until a worker is
+    available.
+    """
+
+    def __init__(self, connection, max_concurrency=None):
+        """
+        :param connection: connection to the server
+        :type connection: PKIConnection
+        :param max_concurrency: maximum number of concurrent requests
+           (default: connection pool size)
+        :type max_concurrency: int
+        """
+
+        self.connection = connection
+        self.max_concurrency = max_concurrency or connection.pool_size or POOL_SIZE
+        self.adapter = None
+
+        # If the shared pool cannot keep a connection for each worker, send
+        # the requests through a copy of the connection with a private pool
+        # so the caller's connection is not modified.
+        if (connection.pool_size or POOL_SIZE) < self.max_concurrency:
+
+            self.adapter = SSLContextAdapter(
+                pool_maxsize=self.max_concurrency,
+                verify=connection.verify,
+                cert_paths=connection.cert_paths,
+                client_cert=connection.session.cert)
+
+            session = requests.Session()
+            session.headers = connection.session.headers.copy()
+            session.auth = connection.session.auth
+            session.cert = connection.session.cert
+            session.cookies = connection.session.cookies
+            session.trust_env = connection.session.trust_env
+            session.verify = connection.session.verify
+            session.mount('https://', self.adapter)
+            session.mount('http://', self.adapter)
+
+            self.connection = copy.copy(connection)
+            self.connection.pool_size = self.max_concurrency
+            self.connection.session = session
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_concurrency)
+
+        # the semaphore is created in the event loop that uses it
+        self.semaphore = None
+
+    @property
+    def subsystem(self):
+        return self.connection.subsystem
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+        if self.adapter:
+            self.adapter.close()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Execute a blocking function that uses the connection, for example
+        a method of a client object, once a worker is available.
+        """
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor,
+                functools.partial(func, *args, **kwargs))
+
+    async def map(self, func, items, return_exceptions=False):
+        """
+        Execute a function for each item with bounded concurrency and yield
+        (item, result) in completion order. Only a bounded number of items
+        is read ahead from the iterable (see run_batch()), so a large or
+        unbounded iterable does not create a task per item.
+
+        :param return_exceptions: yield exceptions as results instead of
+           raising them
+        :type return_exceptions: bool
+        """
+
+        loop = asyncio.get_running_loop()
+        batch = run_batch(func, items, self.max_concurrency, executor=self.executor)
+
+        try:
+            while True:
+                # wait for the next completed item outside of the event loop
+                entry = await loop.run_in_executor(None, next, batch, None)
+
+                if entry is None:
+                    break
+
+                item, future = entry
+
+                try:
+                    result = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    if not return_exceptions:
+                        raise
+                    result = e
+
+                yield item, result
+
+        finally:
+            try:
+                batch.close()
+            except ValueError:
+                # the generator is still waiting in a thread after the
+                # task was cancelled, the pending items run to completion
+                pass
+
+    async def get(self, path, headers=None, params=None, payload=None,
+                  use_root_uri=False, timeout=None):
+        return await self.run(
+            self.connection.get, path, headers=headers, params=params,
+            payload=payload, use_root_uri=use_root_uri, timeout=timeout)
+
+    async def post(self, path, payload, headers=None, params=None,
+                   use_root_uri=False):
+        return await self.run(
+            self.connection.post, path, payload, headers=headers,
+            params=params, use_root_uri=use_root_uri)
+
+    async def put(self, path, payload, headers=None, use_root_uri=False):
+        return await self.run(
+            self.connection.put, path, payload, headers=headers,
+            use_root_uri=use_root_uri)
+
+    async def delete(self, path, headers=None, use_root_uri=False):
+        return await self.run(
+            self.connection.delete, path, headers=headers,
+            use_root_uri=use_root_uri)
+
+
 def main():
     """
     Test code for the PKIConnection class.
@@ -23,8 +23,160 @@ import json
 import six
 from six import iteritems, itervalues
 
-TYPES = {}
-NOTYPES = {}
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class TypeRegistry(dict):
+    """
+    Map of type names to classes that clears the encoder cache
+    whenever a class is registered or removed.
+    """
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        clear_cache()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        clear_cache()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        clear_cache()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        clear_cache()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        clear_cache()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        clear_cache()
+        return value
+
+    def clear(self):
+        super().clear()
+        clear_cache()
+
+
+TYPES = TypeRegistry()
+NOTYPES = TypeRegistry()
+
+# per-class encoding information, see get_class_info()
+_class_info = {}
+
+
+def loads(data):
+    """Parse JSON data returned by the server
+
+    orjson is used if it is available since it is several times faster
+    than the json module for large responses.
+
+    :param data: JSON data
+    :type data: str, bytes
+    """
+    if orjson:
+        return orjson.loads(data)  # pylint: disable=no-member
+    return json.loads(data)
+
+
+def json_fields(json_attribute_names, slots):
+    """Return a map of JSON attribute names to object attribute names
+
+    The map contains the names in json_attribute_names and the slots
+    that keep their JSON names, so the from_json() methods can decode
+    each attribute with a single lookup.
+    """
+    fields = {name: name for name in slots if name != '__dict__'}
+    fields.update(json_attribute_names)
+    return fields
+
+
+def clear_cache():
+    """Discard the cached per-class encoding information"""
+    _class_info.clear()
+
+
+def get_slots(cls):
+    """Return the names of the slots declared by a class and its bases"""
+    return get_class_info(cls)[1]
+
+
+def get_reverse_attribute_names(cls):
+    """Return a map of object attribute names to JSON attribute names
+
+    :returns: the reversed json_attribute_names of the class or None
+    """
+    return get_class_info(cls)[2]
+
+
+def get_class_info(cls):
+    """Return the cached (type name, slots, reverse names, registered)
+    tuple used to encode the objects of a class.
+
+    The type name is the TYPES key of the class, if any. The registered
+    flag indicates that the class is in either TYPES or NOTYPES.
+    """
+    info = _class_info.get(cls)
+    if info is not None:
+        return info
+
+    # keep the lookup order of the original isinstance() checks
+    type_name = None
+    registered = False
+
+    for k, v in iteritems(TYPES):
+        if issubclass(cls, v):
+            type_name = k
+            registered = True
+            break
+    else:
+        for t in itervalues(NOTYPES):
+            if issubclass(cls, t):
+                registered = True
+                break
+
+    slots = []
+    for c in reversed(cls.__mro__):
+        slot_names = getattr(c, '__slots__', ())
+        if isinstance(slot_names, six.string_types):
+            slot_names = (slot_names,)
+        for name in slot_names:
+            if name != '__dict__' and name not in slots:
+                slots.append(name)
+
+    json_attribute_names = getattr(cls, 'json_attribute_names', None)
+    if json_attribute_names is None:
+        reverse_names = None
+    else:
+        reverse_names = {v: k for k, v in iteritems(json_attribute_names)}
+
+    info = (type_name, tuple(slots), reverse_names, registered)
+    _class_info[cls] = info
+    return info
+
+
+def get_attributes(o):
+    """Return the attributes of an object including the slots"""
+    slots = get_slots(type(o))
+    if not slots:
+        return dict(getattr(o, '__dict__', {}))
+    attrs = {}
+    for name in slots:
+        try:
+            attrs[name] = getattr(o, name)
+        except AttributeError:
+            pass
+    attrs.update(getattr(o, '__dict__', {}))
+    return attrs
 
 
 def encode_cert(data):
@@ -83,27 +235,58 @@ class CustomTypeEncoder(json.JSONEncoder):
     # pylint: disable=E0202
 
     def default(self, o):
-        for k, v in iteritems(TYPES):
-            if isinstance(o, v):
-                return {k: o.__dict__}
-        for t in itervalues(NOTYPES):
-            if isinstance(o, t):
-                return self.attr_name_conversion(o.__dict__, type(o))
+        type_name, _, reverse_names, registered = get_class_info(type(o))
+        if type_name:
+            return {type_name: get_attributes(o)}
+        if registered:
+            attrs = get_attributes(o)
+            if reverse_names is None:
+                return attrs
+            return {reverse_names.get(k, k): v for k, v in iteritems(attrs)}
         return json.JSONEncoder.default(self, o)
 
     @staticmethod
     def attr_name_conversion(attr_dict, object_class):
-        if not hasattr(object_class, 'json_attribute_names'):
+        reverse_dict = get_reverse_attribute_names(object_class)
+        if reverse_dict is None:
             return attr_dict
-        reverse_dict = {v: k for k, v in
-                        iteritems(object_class.json_attribute_names)}
-        new_dict = dict()
-        for k, v in iteritems(attr_dict):
-            if k in reverse_dict:
-                new_dict[reverse_dict[k]] = v
-            else:
-                new_dict[k] = v
-        return new_dict
+        return {reverse_dict.get(k, k): v for k, v in iteritems(attr_dict)}
+
+
+def iterencode(objects, **kwargs):
+    """Encode an iterable of objects as a JSON array in chunks
+
+    The objects are encoded one at a time so a large batch of requests
+    can be written out or sent without building the whole document in
+    memory.
+
+    :param objects: objects to encode
+    :param kwargs: CustomTypeEncoder parameters (e.g. indent, sort_keys)
+    :returns: generator of JSON strings
+    """
+    json_encoder = CustomTypeEncoder(**kwargs)
+    separator = json_encoder.item_separator
+
+    yield '['
+    first = True
+    for o in objects:
+        if not first:
+            yield separator
+        first = False
+        # encode() uses the C accelerated encoder when available
+        yield json_encoder.encode(o)
+    yield ']'
+
+
+def dump(objects, fp, **kwargs):
+    """Write an iterable of objects as a JSON array to a file
+
+    :param objects: objects to encode
+    :param fp: file object opened in text mode
+    :param kwargs: CustomTypeEncoder parameters
+    """
+    for chunk in iterencode(objects, **kwargs):
+        fp.write(chunk)
 
 
 def CustomTypeDecoder(dct):  # nopep8
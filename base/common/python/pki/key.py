@@ -28,12 +28,14 @@ from __future__ import print_function
 import base64
 import json
 import os
+import sys
 import warnings
 
 from six import iteritems
 from six.moves.urllib.parse import quote  # pylint: disable=F0401,E0611
 
 import pki
+import pki.client as client
 import pki.crypto
 import pki.encoder as encoder
 from pki.info import Version
@@ -136,6 +138,17 @@ class KeyInfo(object):
         'ownerName': 'owner_name', 'publicKey': 'public_key'
     }
 
+    # other attributes returned by the server are stored in __dict__
+    __slots__ = (
+        'client_key_id', 'key_url', 'algorithm', 'status', 'owner_name',
+        'size', 'public_key', 'realm', '__dict__')
+
+    json_fields = encoder.json_fields(json_attribute_names, __slots__)
+
+    # values shared by many keys are interned to reduce the memory used
+    # by large search results
+    interned_attributes = {'algorithm', 'status', 'ownerName', 'realm'}
+
     # pylint: disable=C0103
     def __init__(self):
         """ Constructor """
@@ -152,11 +165,13 @@ class KeyInfo(object):
     def from_json(cls, attr_list):
         """ Return KeyInfo from JSON dict """
         key_info = cls()
-        for k, v in iteritems(attr_list):
-            if k in KeyInfo.json_attribute_names:
-                setattr(key_info, KeyInfo.json_attribute_names[k], v)
-            else:
-                setattr(key_info, k, v)
+        fields = KeyInfo.json_fields
+        interned_attributes = KeyInfo.interned_attributes
+
+        for k, v in attr_list.items():
+            if k in interned_attributes and isinstance(v, str):
+                v = sys.intern(v)
+            setattr(key_info, fields.get(k, k), v)
         if key_info.public_key is not None:
             key_info.public_key = encoder.decode_cert(key_info.public_key)
         return key_info
@@ -205,6 +220,12 @@ class KeyRequestInfo(object):
         'keyURL': 'key_url', 'requestStatus': 'request_status'
     }
 
+    __slots__ = (
+        'request_url', 'request_type', 'key_url', 'request_status', 'realm',
+        '__dict__')
+
+    json_fields = encoder.json_fields(json_attribute_names, __slots__)
+
     # pylint: disable=C0103
     def __init__(self):
         """ Constructor """
@@ -218,12 +239,10 @@ class KeyRequestInfo(object):
     def from_json(cls, attr_list):
         """ Return a KeyRequestInfo object from a JSON dict. """
         key_request_info = cls()
-        for k, v in iteritems(attr_list):
-            if k in KeyRequestInfo.json_attribute_names:
-                setattr(key_request_info,
-                        KeyRequestInfo.json_attribute_names[k], v)
-            else:
-                setattr(key_request_info, k, v)
+        fields = KeyRequestInfo.json_fields
+
+        for k, v in attr_list.items():
+            setattr(key_request_info, fields.get(k, k), v)
 
         return key_request_info
 
@@ -574,7 +593,36 @@ class KeyClient(object):
                         'start': start, 'size': size, 'realm': realm}
         response = self.connection.get(self.key_url, self.headers,
                                        params=query_params)
-        return KeyInfoCollection.from_json(response.json())
+        return KeyInfoCollection.from_json(encoder.loads(response.content))
+
+    @pki.handle_exceptions()
+    def _list_keys(self, query_params):
+        response = self.connection.get(self.key_url, self.headers,
+                                       params=query_params)
+        return encoder.loads(response.content)
+
+    def iter_keys(self, client_key_id=None, status=None, max_results=None,
+                  max_time=None, start=0, size=100, realm=None,
+                  prefetch=True):
+        """ Return a generator of KeyInfo objects for the archived secrets
+            that match the arguments. The keys are retrieved one page at a
+            time. If prefetch is True the next page is retrieved while the
+            current page is processed.
+        """
+
+        def fetch(start):
+            query_params = {'clientKeyID': client_key_id, 'status': status,
+                            'maxResults': max_results, 'maxTime': max_time,
+                            'start': start, 'size': size, 'realm': realm}
+            json_value = self._list_keys(query_params)
+            entries = client.get_entries(json_value)
+            end = start + len(entries)
+            if not entries or end >= json_value.get('total', 0):
+                return entries, None
+            return entries, end
+
+        for entry in client.iter_pages(fetch, start, prefetch):
+            yield KeyInfo.from_json(entry)
 
     @pki.handle_exceptions()
     def list_requests(self, request_state=None, request_type=None,
@@ -594,7 +642,7 @@ class KeyClient(object):
                         'realm': realm}
         response = self.connection.get(self.key_requests_url, self.headers,
                                        params=query_params)
-        return KeyRequestInfoCollection.from_json(response.json())
+        return KeyRequestInfoCollection.from_json(encoder.loads(response.content))
 
     @pki.handle_exceptions()
     def get_request_info(self, request_id):
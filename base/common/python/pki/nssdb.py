@@ -27,6 +27,7 @@ import logging
 import os
 import re
 import shutil
+import sqlite3
 import stat
 import subprocess
 import tempfile
@@ -36,6 +37,9 @@ import six
 
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.serialization import pkcs7
+from cryptography.x509.oid import NameOID
 
 try:
     import selinux
@@ -59,6 +63,48 @@ PKCS7_FOOTER = '-----END PKCS7-----'
 INTERNAL_TOKEN_NAME = 'internal'
 INTERNAL_TOKEN_FULL_NAME = 'Internal Key Storage Token'
 
+# PKCS #11 object classes, attribute types, and NSS trust values used to
+# read certificates and trust objects directly from NSS SQL databases.
+# See lib/util/pkcs11t.h and lib/util/pkcs11n.h in NSS.
+
+CKO_CERTIFICATE = 0x00000001
+CKO_PRIVATE_KEY = 0x00000003
+CKO_NSS_TRUST = 0xCE534353
+
+CKA_CLASS = 0x00000000
+CKA_LABEL = 0x00000003
+CKA_VALUE = 0x00000011
+CKA_ISSUER = 0x00000081
+CKA_SERIAL_NUMBER = 0x00000082
+CKA_ID = 0x00000102
+CKA_TRUST_SERVER_AUTH = 0xCE536358
+CKA_TRUST_CLIENT_AUTH = 0xCE536359
+CKA_TRUST_CODE_SIGNING = 0xCE53635A
+CKA_TRUST_EMAIL_PROTECTION = 0xCE53635B
+CKA_TRUST_STEP_UP_APPROVED = 0xCE536360
+
+CKT_NSS_TRUSTED = 0xCE534351
+CKT_NSS_TRUSTED_DELEGATOR = 0xCE534352
+CKT_NSS_NOT_TRUSTED = 0xCE53435A
+CKT_NSS_VALID_DELEGATOR = 0xCE53435B
+
+# NSS 3 trust flags (see lib/certdb/certdb.h in NSS)
+
+CERTDB_TERMINAL_RECORD = 1 << 0
+CERTDB_TRUSTED = 1 << 1
+CERTDB_VALID_CA = 1 << 3
+CERTDB_TRUSTED_CA = 1 << 4
+CERTDB_USER = 1 << 6
+CERTDB_TRUSTED_CLIENT_CA = 1 << 7
+CERTDB_GOVT_APPROVED_CA = 1 << 9
+
+# value stored by NSS SQL database for zero-length attributes
+SDB_EXPLICIT_NULL = b'\xa5\x00\x5a'
+
+# cert inventories shared by all NSSDatabase objects in this process,
+# indexed by the NSS database directory
+CERT_INVENTORIES = {}
+
 logger = logging.LoggerAdapter(
     logging.getLogger(__name__),
     extra={'indent': ''})
@@ -175,6 +221,283 @@ def normalize_token(token):
     return token
 
 
+def get_sdb_ulong(value):
+    '''
+    Decode a CK_ULONG attribute stored in NSS SQL database.
+    '''
+
+    if value is None or value == SDB_EXPLICIT_NULL:
+        return None
+
+    return int.from_bytes(value, 'big')
+
+
+def get_sdb_bytes(value):
+    '''
+    Decode a byte array attribute stored in NSS SQL database.
+    '''
+
+    if value is None:
+        return None
+
+    if value == SDB_EXPLICIT_NULL:
+        return b''
+
+    return bytes(value)
+
+
+def convert_trust_level(trust):
+    '''
+    Convert a PKCS #11 trust level into NSS 3 trust flags.
+    '''
+
+    if trust == CKT_NSS_TRUSTED:
+        return CERTDB_TERMINAL_RECORD | CERTDB_TRUSTED
+
+    if trust == CKT_NSS_TRUSTED_DELEGATOR:
+        return CERTDB_VALID_CA | CERTDB_TRUSTED_CA
+
+    if trust == CKT_NSS_NOT_TRUSTED:
+        return CERTDB_TERMINAL_RECORD
+
+    if trust == CKT_NSS_VALID_DELEGATOR:
+        return CERTDB_VALID_CA
+
+    return 0
+
+
+def encode_trust_flags(flags):
+    '''
+    Encode NSS 3 trust flags the same way as certutil (e.g. CTu).
+    '''
+
+    trust = ''
+
+    if flags & CERTDB_VALID_CA and \
+            not flags & (CERTDB_TRUSTED_CA | CERTDB_TRUSTED_CLIENT_CA):
+        trust += 'c'
+
+    if flags & CERTDB_TERMINAL_RECORD and not flags & CERTDB_TRUSTED:
+        trust += 'p'
+
+    if flags & CERTDB_TRUSTED_CA:
+        trust += 'C'
+
+    if flags & CERTDB_TRUSTED_CLIENT_CA:
+        trust += 'T'
+
+    if flags & CERTDB_TRUSTED:
+        trust += 'P'
+
+    if flags & CERTDB_USER:
+        trust += 'u'
+
+    if flags & CERTDB_GOVT_APPROVED_CA:
+        trust += 'G'
+
+    return trust
+
+
+def split_der_certs(data):
+    '''
+    Split concatenated DER certificates (e.g. certutil -r output
+    for a nickname shared by multiple certificates).
+    '''
+
+    certs = []
+
+    while data:
+
+        # each cert is an ASN.1 SEQUENCE
+        length = data[1]
+        offset = 2
+
+        if length & 0x80:
+            size = length & 0x7F
+            length = int.from_bytes(data[2:2 + size], 'big')
+            offset += size
+
+        certs.append(data[:offset + length])
+        data = data[offset + length:]
+
+    return certs
+
+
+def create_memory_file(name, data):
+    '''
+    Store data in an anonymous memory file (memfd) and return a
+    (path, fd) tuple, where the path can be opened by child processes
+    as long as the fd is open. Return None if memory files are not
+    supported on this system.
+    '''
+
+    memfd_create = getattr(os, 'memfd_create', None)
+    if not memfd_create or not os.path.isdir('/proc/self/fd'):
+        return None
+
+    try:
+        fd = memfd_create(name)
+    except OSError as e:
+        logger.debug('Unable to create memory file: %s', e)
+        return None
+
+    try:
+        os.write(fd, data.encode('utf-8'))
+
+    except OSError:
+        os.close(fd)
+        raise
+
+    # /proc/<pid>/fd/<fd> can be opened by the child processes without
+    # inheriting the fd, and each open starts reading at the beginning
+    return '/proc/%d/fd/%d' % (os.getpid(), fd), fd
+
+
+def normalize_trust_flags(trust_flags):
+    '''
+    Normalize trust flags for comparison (e.g. CTu,Cu,Cu -> CT,C,C).
+    The u flag is ignored since it depends on the private key.
+    '''
+
+    fields = []
+
+    for field in (trust_flags or ',,').split(','):
+        flags = set(field) - {'u'}
+
+        # trusted CA implies valid CA, trusted peer implies valid peer
+        if flags & {'C', 'T'}:
+            flags.discard('c')
+        if 'P' in flags:
+            flags.discard('p')
+
+        fields.append(''.join(sorted(flags)))
+
+    return ','.join(fields)
+
+
+def get_ca_nickname(cert_data, nicknames):
+    '''
+    Generate a nickname for a CA certificate like NSS does in
+    CERT_MakeCANickname(), e.g. "CA Signing Certificate - EXAMPLE",
+    or "CA Signing Certificate - EXAMPLE #2" if it is already used
+    by a certificate with a different subject.
+
+    :param cert_data: DER certificate
+    :type cert_data: bytes
+    :param nicknames: DER certificates indexed by nickname
+    :type nicknames: dict
+    '''
+
+    cert = x509.load_der_x509_certificate(cert_data, default_backend())
+
+    def get_value(name, oid):
+        attrs = name.get_attributes_for_oid(oid)
+        return attrs[-1].value if attrs else None
+
+    name = get_value(cert.subject, NameOID.COMMON_NAME) or \
+        get_value(cert.subject, NameOID.ORGANIZATIONAL_UNIT_NAME)
+
+    org = get_value(cert.issuer, NameOID.ORGANIZATION_NAME) or \
+        get_value(cert.issuer, NameOID.DOMAIN_COMPONENT)
+
+    if org:
+        prefix = '%s - %s' % (name, org) if name else org
+    else:
+        prefix = name or 'Unknown CA'
+
+    def has_other_subject(nickname):
+        for data in nicknames.get(nickname, []):
+            existing_cert = x509.load_der_x509_certificate(data, default_backend())
+            if existing_cert.subject != cert.subject:
+                return True
+        return False
+
+    nickname = prefix
+    count = 1
+
+    # reuse the nickname of certificates with the same subject
+    while has_other_subject(nickname):
+        count += 1
+        nickname = '%s #%d' % (prefix, count)
+
+    return nickname
+
+
+def sort_certs(certs):
+    '''
+    Sort a certificate chain from root to leaf.
+
+    :param certs: DER certificates
+    :type certs: list
+    :return: DER certificates
+    :rtype: list
+    '''
+
+    parsed = [x509.load_der_x509_certificate(data, default_backend()) for data in certs]
+
+    subjects = {}
+    issuers = set()
+
+    for index, cert in enumerate(parsed):
+        subjects[cert.subject] = index
+        if cert.issuer != cert.subject:
+            issuers.add(cert.issuer)
+
+    leaves = [index for index, cert in enumerate(parsed) if cert.subject not in issuers]
+    if len(leaves) != 1:
+        raise Exception('Unable to sort certificate chain')
+
+    chain = []
+    index = leaves[0]
+
+    while index is not None and index not in chain:
+        chain.append(index)
+        cert = parsed[index]
+        index = None if cert.issuer == cert.subject else subjects.get(cert.issuer)
+
+    if len(chain) != len(certs):
+        raise Exception('Invalid certificate chain')
+
+    return [certs[index] for index in reversed(chain)]
+
+
+def load_pkcs7_certs(pkcs7_data):
+    '''
+    Load the certificates in PEM or DER PKCS #7 data.
+
+    :return: DER certificates
+    :rtype: list
+    '''
+
+    if isinstance(pkcs7_data, six.text_type):
+        pkcs7_data = pkcs7_data.encode('ascii')
+
+    if pkcs7_data.lstrip().startswith(b'-----'):
+        certs = pkcs7.load_pem_pkcs7_certificates(pkcs7_data)
+    else:
+        certs = pkcs7.load_der_pkcs7_certificates(pkcs7_data)
+
+    return [cert.public_bytes(serialization.Encoding.DER) for cert in certs]
+
+
+def load_cert_file(cert_file):
+    '''
+    Load the first certificate in a PEM or DER file.
+
+    :return: DER certificate
+    :rtype: bytes
+    '''
+
+    with open(cert_file, 'rb') as f:
+        data = f.read()
+
+    if data.lstrip().startswith(b'-----'):
+        cert = x509.load_pem_x509_certificate(data, default_backend())
+        data = cert.public_bytes(serialization.Encoding.DER)
+
+    return data
+
+
 class NSSDatabase(object):
 
     def __init__(self, directory=None,
@@ -193,8 +516,14 @@ class NSSDatabase(object):
         self.directory = directory
         self.token = normalize_token(token)
 
+        # private scratch area for the lifetime of this object
         self.tmpdir = tempfile.mkdtemp()
 
+        # password files indexed by (tmpdir, filename, password), see
+        # create_password_file()
+        self.password_files = {}
+        self.password_fds = []
+
         if password:
             # if token password is provided, store it in a temp file
             self.password_file = self.create_password_file(
@@ -254,6 +583,13 @@ class NSSDatabase(object):
         return False
 
     def close(self):
+
+        for fd in self.password_fds:
+            os.close(fd)
+
+        self.password_fds = []
+        self.password_files = {}
+
         shutil.rmtree(self.tmpdir)
 
     def get_effective_token(self, token=None):
@@ -262,11 +598,57 @@ class NSSDatabase(object):
         return token
 
     def create_password_file(self, tmpdir, password, filename=None):
+        '''
+        Return the path of a file containing the password that can be
+        passed to NSS tools (e.g. certutil -f, pk12util -k/-w) and the
+        pki CLI.
+
+        If supported, the password is kept in an anonymous memory file
+        which child processes can read through /proc/<pid>/fd/<fd>,
+        so nothing is written to disk. Otherwise the password is stored
+        in tmpdir, or in the database's private directory if tmpdir is
+        None.
+
+        Memory files and files in the private directory are reused for
+        the same password until close() is called.
+        '''
+
         if not filename:
             filename = 'password.txt'
-        password_file = os.path.join(tmpdir, filename)
-        with open(password_file, 'w') as f:
-            f.write(password)
+
+        if not tmpdir:
+            tmpdir = self.tmpdir
+
+        key = (tmpdir, filename, password)
+        password_file = self.password_files.get(key)
+
+        if password_file:
+            return password_file
+
+        password_file = create_memory_file(filename, password)
+
+        if password_file:
+            self.password_fds.append(password_file[1])
+            password_file = password_file[0]
+
+        else:
+            password_file = os.path.join(tmpdir, filename)
+            index = 0
+
+            while os.path.exists(password_file):
+                index += 1
+                password_file = os.path.join(tmpdir, '%d-%s' % (index, filename))
+
+            fd = os.open(password_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(password)
+
+            # the caller may remove its own tmpdir at any time
+            if tmpdir != self.tmpdir:
+                return password_file
+
+        self.password_files[key] = password_file
+
         return password_file
 
     def get_password_file(self, tmpdir, token, filename=None):
@@ -282,7 +664,7 @@ class NSSDatabase(object):
             token = INTERNAL_TOKEN_NAME
         password = self.passwords[token]
 
-        # then store it in a temp file
+        # then store it in a password file
         return self.create_password_file(
             tmpdir,
             password,
@@ -468,10 +850,9 @@ class NSSDatabase(object):
                 trust_attributes=trust_attributes)
             return
 
-        tmpdir = tempfile.mkdtemp()
         try:
             token = self.get_effective_token(token)
-            password_file = self.get_password_file(tmpdir, token)
+            password_file = self.get_password_file(self.tmpdir, token)
 
             # Add cert in two steps due to bug #1393668.
 
@@ -526,8 +907,229 @@ class NSSDatabase(object):
                 logger.debug('Command: %s', ' '.join(map(str, cmd)))
                 subprocess.check_call(cmd)
 
+        finally:
+            self.invalidate_cert_inventory()
+
+    def diff_certs(self, certs, token=None, overwrite=False):
+        '''
+        Compare certificates against the cert inventory and determine
+        the changes needed to import them.
+
+        A certificate without a nickname is a CA certificate for the
+        internal token. It keeps its existing nickname if it has already
+        been imported, otherwise a nickname is generated like NSS does.
+
+        Each change is a dict with action, nickname, token, data (DER),
+        and trust_flags. The action is one of:
+
+        - add: the certificate does not exist
+        - replace: another certificate exists with the same nickname
+          and overwrite is enabled
+        - modify: the certificate exists with different trust flags
+        - skip: the certificate exists with the same trust flags
+
+        :param certs: Certificates as (nickname, DER data, trust attributes)
+        :type certs: list
+        :param token: Token name
+        :type token: str
+        :param overwrite: Replace existing certificates with the same nicknames
+        :type overwrite: bool
+        :return: Changes
+        :rtype: list
+        '''
+
+        token = self.get_effective_token(token)
+
+        inventories = {}
+        nicknames = {}
+        changes = []
+
+        for nickname, data, trust_attributes in certs:
+
+            cert_token = token if nickname else None
+
+            if cert_token not in inventories:
+                inventory = self.__get_token_inventory(cert_token)
+                inventories[cert_token] = inventory
+                nicknames[cert_token] = {
+                    name: [cert['data'] for cert in existing_certs]
+                    for name, existing_certs in inventory.items()}
+
+            inventory = inventories[cert_token]
+
+            if not nickname:
+                trust_attributes = trust_attributes or 'CT,C,C'
+
+                # reuse existing nickname
+                for existing_nickname, existing_certs in inventory.items():
+                    if any(cert['data'] == data for cert in existing_certs):
+                        nickname = existing_nickname
+                        break
+                else:
+                    nickname = get_ca_nickname(data, nicknames[cert_token])
+
+            existing_certs = inventory.get(nickname, [])
+            existing_cert = None
+
+            for cert in existing_certs:
+                if cert['data'] == data:
+                    existing_cert = cert
+                    break
+
+            if existing_cert:
+                if normalize_trust_flags(existing_cert['trust_flags']) == \
+                        normalize_trust_flags(trust_attributes):
+                    action = 'skip'
+                else:
+                    action = 'modify'
+
+            elif existing_certs and overwrite:
+                action = 'replace'
+
+            else:
+                action = 'add'
+
+            nicknames[cert_token].setdefault(nickname, []).append(data)
+
+            changes.append({
+                'action': action,
+                'nickname': nickname,
+                'token': cert_token,
+                'data': data,
+                'trust_flags': trust_attributes or ',,'
+            })
+
+        return changes
+
+    def add_certs(self, certs, token=None, overwrite=False, dry_run=False):
+        '''
+        Import multiple certificates in a single certutil session
+        instead of running certutil for each certificate.
+
+        Certificates that already exist with the same trust flags are
+        skipped, see diff_certs().
+
+        :param certs: Certificates as (nickname, DER data, trust attributes)
+        :type certs: list
+        :param token: Token name
+        :type token: str
+        :param overwrite: Replace existing certificates with the same nicknames
+        :type overwrite: bool
+        :param dry_run: Only determine the changes
+        :type dry_run: bool
+        :return: Changes
+        :rtype: list
+        '''
+
+        logger.debug('NSSDatabase.add_certs()')
+
+        changes = self.diff_certs(certs, token=token, overwrite=overwrite)
+
+        for change in changes:
+            logger.debug('- %s %s', change['action'], change['nickname'])
+
+        if dry_run:
+            return changes
+
+        changes = [change for change in changes if change['action'] != 'skip']
+        if not changes:
+            return changes
+
+        tmpdir = tempfile.mkdtemp()
+
+        try:
+            commands = []
+
+            for index, change in enumerate(changes):
+
+                nickname = change['nickname']
+                cert_token = change['token']
+                trust_flags = change['trust_flags']
+
+                cert_file = os.path.join(tmpdir, 'cert-%d.pem' % index)
+                with open(cert_file, 'w') as f:
+                    f.write(convert_cert(
+                        base64.b64encode(change['data']).decode('ascii'), 'base64', 'pem'))
+
+                # HSM certs are imported in two steps (bug #1393668)
+                if cert_token:
+
+                    if change['action'] == 'modify':
+                        self.modify_cert(
+                            nickname=nickname,
+                            trust_attributes=trust_flags,
+                            token=cert_token)
+                        continue
+
+                    if change['action'] == 'replace':
+                        self.remove_cert(nickname=nickname, token=cert_token)
+
+                    self.add_cert(
+                        nickname=nickname,
+                        cert_file=cert_file,
+                        token=cert_token,
+                        trust_attributes=trust_flags)
+                    continue
+
+                options = ['-d', self.directory]
+                if self.internal_password_file:
+                    options.extend(['-f', self.internal_password_file])
+
+                if change['action'] == 'modify':
+                    commands.append(['-M'] + options + ['-n', nickname, '-t', trust_flags])
+                    continue
+
+                if change['action'] == 'replace':
+                    commands.append(['-D'] + options + ['-n', nickname])
+
+                commands.append(['-A'] + options + [
+                    '-n', nickname, '-t', trust_flags, '-a', '-i', cert_file])
+
+            self.__run_certutil_batch(tmpdir, commands)
+
         finally:
             shutil.rmtree(tmpdir)
+            self.invalidate_cert_inventory()
+
+        return changes
+
+    def __run_certutil_batch(self, tmpdir, commands):
+        '''
+        Run certutil commands for the internal token in a single
+        certutil -B process.
+        '''
+
+        if not commands:
+            return
+
+        # certutil batch files cannot contain quotes in arguments
+        if any('"' in arg for command in commands for arg in command):
+            for command in commands:
+                cmd = ['certutil'] + command
+                logger.debug('Command: %s', ' '.join(map(str, cmd)))
+                subprocess.check_call(cmd)
+            return
+
+        batch_file = os.path.join(tmpdir, 'batch.txt')
+        with open(batch_file, 'w') as f:
+            for command in commands:
+                logger.debug('Batch: certutil %s', ' '.join(command))
+                # certutil only unquotes the arguments after the command
+                f.write(' '.join([command[0]] + ['"%s"' % arg for arg in command[1:]]) + '\n')
+
+        cmd = [
+            'certutil',
+            '-B',
+            '-d', self.directory
+        ]
+
+        if self.internal_password_file:
+            cmd.extend(['-f', self.internal_password_file])
+
+        cmd.extend(['-i', batch_file])
+
+        logger.debug('Command: %s', ' '.join(map(str, cmd)))
+        subprocess.check_call(cmd)
 
     def __add_cert(
             self,
@@ -572,6 +1174,8 @@ class NSSDatabase(object):
         logger.debug('Command: %s', ' '.join(map(str, cmd)))
         subprocess.check_call(cmd)
 
+        self.invalidate_cert_inventory()
+
     def add_ca_cert(self, cert_file, trust_attributes='CT,C,C'):
 
         # Import CA certificate into internal token with automatically
@@ -579,41 +1183,28 @@ class NSSDatabase(object):
 
         # If the certificate has previously been imported, it will keep
         # the existing nickname. If the certificate has not been imported,
-        # JSS will generate a nickname based on root CA's subject DN.
+        # the nickname will be generated based on root CA's subject DN.
 
         # For example, if the root CA's subject DN is "CN=CA Signing
         # Certificate, O=EXAMPLE", the root CA cert's nickname will be
         # "CA Signing Certificate - EXAMPLE". The subordinate CA cert's
         # nickname will be "CA Signing Certificate - EXAMPLE #2".
 
-        cmd = [
-            'pki',
-            '-d', self.directory
-        ]
-
-        if self.internal_password_file:
-            cmd.extend(['-C', self.internal_password_file])
+        self.add_certs([(None, load_cert_file(cert_file), trust_attributes)])
 
-        cmd.extend([
-            'client-cert-import',
-            '--ca-cert', cert_file
-        ])
-
-        if trust_attributes:
-            cmd.extend(['--trust', trust_attributes])
+    def modify_cert(self, nickname, trust_attributes, token=None):
 
-        logger.debug('Command: %s', ' '.join(map(str, cmd)))
-        subprocess.check_call(cmd)
+        token = self.get_effective_token(token)
 
-    def modify_cert(self, nickname, trust_attributes):
         cmd = [
             'certutil',
             '-M',
             '-d', self.directory
         ]
 
-        if self.token:
-            cmd.extend(['-h', self.token])
+        if normalize_token(token):
+            cmd.extend(['-h', token])
+            nickname = token + ':' + nickname
 
         if self.password_file:
             cmd.extend(['-f', self.password_file])
@@ -626,6 +1217,8 @@ class NSSDatabase(object):
         logger.debug('Command: %s', ' '.join(map(str, cmd)))
         subprocess.check_call(cmd)
 
+        self.invalidate_cert_inventory()
+
     def create_noise(self, noise_file, size=2048, key_type='rsa'):
         # Under EC keys, key_size parameter is actually the name of a curve.
         # This curve maps to a specific size, but EC keys require less entropy
@@ -1377,6 +1970,310 @@ class NSSDatabase(object):
         logger.debug('Command: %s', ' '.join(map(str, cmd)))
         subprocess.check_call(cmd)
 
+    def get_sql_files(self):
+        '''
+        Return the paths of cert9.db and key4.db if the internal token
+        is stored in NSS SQL database format, or None otherwise.
+        '''
+
+        directory = self.directory
+
+        if directory.startswith('sql:'):
+            directory = directory[4:]
+
+        elif directory.startswith('dbm:'):
+            return None
+
+        elif os.environ.get('NSS_DEFAULT_DB_TYPE') == 'dbm':
+            return None
+
+        cert_db = os.path.join(os.path.abspath(directory), 'cert9.db')
+        key_db = os.path.join(os.path.abspath(directory), 'key4.db')
+
+        if not os.path.isfile(cert_db):
+            return None
+
+        return cert_db, key_db
+
+    def get_cert_inventory(self, token=None):
+        """
+        Get all certificates in a token with their trust attributes
+        and DER data in a single pass.
+
+        Certificates in the internal token of an NSS SQL database are
+        read directly from cert9.db and key4.db without running certutil.
+        The result is cached and shared with other NSSDatabase objects
+        for the same directory until the database files change.
+
+        :param token: Token name
+        :type token: str
+        :return: Certificates indexed by nickname. Each value is a list
+                 of dicts with nickname, token, data (DER), and
+                 trust_flags since NSS allows multiple certificates
+                 with the same nickname.
+        :rtype: dict
+        """
+
+        logger.debug('NSSDatabase.get_cert_inventory()')
+
+        token = self.get_effective_token(token)
+
+        return self.__get_token_inventory(token)
+
+    def __get_token_inventory(self, token):
+        '''
+        Get the cert inventory of a token without falling back to the
+        default token (i.e. None means the internal token).
+        '''
+
+        if not token:
+            inventory = self.__get_cached_cert_inventory()
+            if inventory is not None:
+                return inventory
+
+        return self.__list_cert_inventory(token)
+
+    def invalidate_cert_inventory(self):
+        '''
+        Discard the cached cert inventory after the database has been
+        modified.
+        '''
+
+        files = self.get_sql_files()
+        if files:
+            CERT_INVENTORIES.pop(files[0], None)
+
+    def __get_cached_cert_inventory(self):
+        '''
+        Return the cert inventory of the internal token from cache or
+        from the NSS SQL database, or None if it cannot be read directly.
+        '''
+
+        files = self.get_sql_files()
+        if not files:
+            return None
+
+        cert_db, key_db = files
+
+        try:
+            stamp = []
+            for filename in files:
+                if not os.path.exists(filename):
+                    stamp.append(None)
+                    continue
+                st = os.stat(filename)
+                stamp.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            stamp = tuple(stamp)
+
+        except OSError as e:
+            logger.debug('Unable to check %s: %s', cert_db, e)
+            return None
+
+        cached = CERT_INVENTORIES.get(cert_db)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        try:
+            inventory = self.__read_cert_inventory(cert_db, key_db)
+
+        except sqlite3.Error as e:
+            logger.debug('Unable to read %s: %s', cert_db, e)
+            return None
+
+        CERT_INVENTORIES[cert_db] = (stamp, inventory)
+
+        return inventory
+
+    @staticmethod
+    def __open_sdb(filename):
+        uri = 'file:%s?mode=ro' % six.moves.urllib.parse.quote(filename)
+        return sqlite3.connect(uri, uri=True)
+
+    def __read_cert_inventory(self, cert_db, key_db):
+        '''
+        Read certificates, trust objects, and private key IDs from
+        the NSS SQL database.
+        '''
+
+        logger.debug('Reading certs from %s', cert_db)
+
+        attributes = [
+            CKA_CLASS,
+            CKA_LABEL,
+            CKA_VALUE,
+            CKA_ISSUER,
+            CKA_SERIAL_NUMBER,
+            CKA_ID,
+            CKA_TRUST_SERVER_AUTH,
+            CKA_TRUST_CLIENT_AUTH,
+            CKA_TRUST_EMAIL_PROTECTION,
+            CKA_TRUST_CODE_SIGNING,
+            CKA_TRUST_STEP_UP_APPROVED
+        ]
+
+        query = 'SELECT %s FROM nssPublic' % ', '.join(
+            ['a%x' % attribute for attribute in attributes])
+
+        cert_records = []
+        trust_records = {}
+
+        con = self.__open_sdb(cert_db)
+        try:
+            for record in con.execute(query):
+                obj_class = get_sdb_ulong(record[0])
+
+                if obj_class == CKO_CERTIFICATE:
+                    cert_records.append(record)
+
+                elif obj_class == CKO_NSS_TRUST:
+                    key = (get_sdb_bytes(record[3]), get_sdb_bytes(record[4]))
+                    trust_records[key] = record
+        finally:
+            con.close()
+
+        key_ids = set()
+
+        if os.path.exists(key_db):
+            con = self.__open_sdb(key_db)
+            try:
+                query = 'SELECT a%x, a%x FROM nssPrivate' % (CKA_CLASS, CKA_ID)
+                for obj_class, key_id in con.execute(query):
+                    if get_sdb_ulong(obj_class) == CKO_PRIVATE_KEY:
+                        key_ids.add(get_sdb_bytes(key_id))
+            finally:
+                con.close()
+
+        inventory = {}
+
+        for record in cert_records:
+
+            label = get_sdb_bytes(record[1])
+            if not label:
+                continue
+
+            nickname = label.decode('utf-8')
+
+            ssl_flags = 0
+            email_flags = 0
+            object_signing_flags = 0
+
+            key = (get_sdb_bytes(record[3]), get_sdb_bytes(record[4]))
+            trust = trust_records.get(key)
+
+            if trust:
+                # see cert_trust_from_stan_trust() in NSS
+                ssl_flags = convert_trust_level(get_sdb_ulong(trust[6]))
+
+                client_flags = convert_trust_level(get_sdb_ulong(trust[7]))
+                if client_flags & CERTDB_TRUSTED_CA:
+                    client_flags &= ~CERTDB_TRUSTED_CA
+                    ssl_flags |= CERTDB_TRUSTED_CLIENT_CA
+                ssl_flags |= client_flags
+
+                email_flags = convert_trust_level(get_sdb_ulong(trust[8]))
+                object_signing_flags = convert_trust_level(get_sdb_ulong(trust[9]))
+
+                if get_sdb_bytes(trust[10]) == b'\x01':
+                    ssl_flags |= CERTDB_GOVT_APPROVED_CA
+
+            if get_sdb_bytes(record[5]) in key_ids:
+                ssl_flags |= CERTDB_USER
+                email_flags |= CERTDB_USER
+                object_signing_flags |= CERTDB_USER
+
+            cert = {}
+            cert['nickname'] = nickname
+            cert['token'] = None
+            cert['data'] = get_sdb_bytes(record[2])
+            cert['trust_flags'] = ','.join([
+                encode_trust_flags(ssl_flags),
+                encode_trust_flags(email_flags),
+                encode_trust_flags(object_signing_flags)
+            ])
+
+            inventory.setdefault(nickname, []).append(cert)
+
+        logger.debug('Found %d cert(s) in %s', len(cert_records), cert_db)
+
+        return inventory
+
+    def __list_cert_inventory(self, token=None):
+        '''
+        Build cert inventory with certutil for tokens that cannot
+        be read directly (e.g. HSM or NSS DBM database).
+        '''
+
+        password_file = self.get_password_file(self.tmpdir, token)
+
+        cmd = [
+            'certutil',
+            '-L',
+            '-d', self.directory
+        ]
+
+        if token:
+            cmd.extend(['-h', token])
+
+        if password_file:
+            cmd.extend(['-f', password_file])
+
+        logger.debug('Command: %s', ' '.join(map(str, cmd)))
+        output = subprocess.check_output(cmd)
+
+        # output contains list that looks like:
+        #   ca_signing                                   CTu,Cu,Cu
+        #   HSM:subsystem                                u,u,u
+        pattern = re.compile(r'^(\S.*?)\s+([A-Za-z]*,[A-Za-z]*,[A-Za-z]*)$')
+
+        trust_flags = {}
+
+        for line in output.decode('utf-8').splitlines():
+
+            match = pattern.match(line)
+            if not match:
+                continue
+
+            nickname = match.group(1)
+            if token and nickname.startswith(token + ':'):
+                nickname = nickname[len(token) + 1:]
+
+            trust_flags.setdefault(nickname, []).append(match.group(2))
+
+        inventory = {}
+
+        for nickname, flags in trust_flags.items():
+
+            data = self.__get_cert(nickname, token=token, output_format_option='-r')
+            if not data:
+                continue
+
+            for i, cert_data in enumerate(split_der_certs(data)):
+                cert = {}
+                cert['nickname'] = nickname
+                cert['token'] = token
+                cert['data'] = cert_data
+                cert['trust_flags'] = flags[min(i, len(flags) - 1)]
+
+                inventory.setdefault(nickname, []).append(cert)
+
+        return inventory
+
+    def __get_inventory_certs(self, nickname, token=None):
+        '''
+        Return the certs with the given nickname from the cached cert
+        inventory, an empty list if the cert does not exist, or None if
+        the inventory cannot be read directly.
+        '''
+
+        if self.get_effective_token(token):
+            return None
+
+        inventory = self.__get_cached_cert_inventory()
+        if inventory is None:
+            return None
+
+        return inventory.get(nickname, [])
+
     def get_trust(self, nickname, token=None):
         """
         Get trust of certificate from NSSDB
@@ -1389,103 +2286,105 @@ class NSSDatabase(object):
         :rtype: str
         """
         logger.debug('NSSDatabase.get_trust(%s)', nickname)
-        cert_trust = None
 
-        tmpdir = tempfile.mkdtemp()
-        try:
-            token = self.get_effective_token(token)
-            password_file = self.get_password_file(tmpdir, token)
-            cmd = [
-                'certutil',
-                '-L',
-                '-d', self.directory
-            ]
-            fullname = nickname
+        certs = self.__get_inventory_certs(nickname, token=token)
+        if certs is not None:
+            if not certs:
+                return None
+            return certs[0]['trust_flags']
 
-            if token:
-                cmd.extend(['-h', token])
-                fullname = token + ':' + fullname
+        cert_trust = None
 
-            logger.debug('fullname: %s', fullname)
+        token = self.get_effective_token(token)
+        password_file = self.get_password_file(self.tmpdir, token)
+        cmd = [
+            'certutil',
+            '-L',
+            '-d', self.directory
+        ]
+        fullname = nickname
 
-            if password_file:
-                cmd.extend(['-f', password_file])
+        if token:
+            cmd.extend(['-h', token])
+            fullname = token + ':' + fullname
 
-            logger.debug('Command: %s', ' '.join(map(str, cmd)))
+        logger.debug('fullname: %s', fullname)
 
-            p = subprocess.Popen(cmd,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
+        if password_file:
+            cmd.extend(['-f', password_file])
 
-            output, error = p.communicate()
+        logger.debug('Command: %s', ' '.join(map(str, cmd)))
 
-            if error:
-                # certutil returned an error
-                # raise exception unless its not cert not found
-                logger.error('error : %s', error)
-                if error.startswith(b'certutil: Could not find cert: '):
-                    return None
+        p = subprocess.Popen(cmd,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
 
-                raise Exception('Could not find certificate: %s: %s' % (fullname, error.strip()))
+        output, error = p.communicate()
 
-            if p.returncode != 0:
-                logger.warning('certutil returned non-zero exit code (bug #1539996)')
+        if error:
+            # certutil returned an error
+            # raise exception unless its not cert not found
+            logger.error('error : %s', error)
+            if error.startswith(b'certutil: Could not find cert: '):
+                return None
 
-            re_compile = re.compile(r'^' + fullname + r'\s+(\S+)$', re.MULTILINE)
-            cert_trust = re.search(re_compile, output.decode()).group(1)
+            raise Exception('Could not find certificate: %s: %s' % (fullname, error.strip()))
 
-            return cert_trust
+        if p.returncode != 0:
+            logger.warning('certutil returned non-zero exit code (bug #1539996)')
 
-        finally:
-            shutil.rmtree(tmpdir)
+        re_compile = re.compile(r'^' + fullname + r'\s+(\S+)$', re.MULTILINE)
+        cert_trust = re.search(re_compile, output.decode()).group(1)
+
+        return cert_trust
 
     def show_cert(self, nickname, token=None):
 
-        tmpdir = tempfile.mkdtemp()
-        try:
-            token = self.get_effective_token(token)
-            password_file = self.get_password_file(tmpdir, token)
+        # certutil is only needed to pretty-print an existing cert
+        certs = self.__get_inventory_certs(nickname, token=token)
+        if certs is not None and not certs:
+            return None
 
-            cmd = [
-                'certutil',
-                '-L',
-                '-d', self.directory
-            ]
+        token = self.get_effective_token(token)
+        password_file = self.get_password_file(self.tmpdir, token)
 
-            fullname = nickname
+        cmd = [
+            'certutil',
+            '-L',
+            '-d', self.directory
+        ]
 
-            if token:
-                cmd.extend(['-h', token])
-                fullname = token + ':' + fullname
+        fullname = nickname
 
-            if password_file:
-                cmd.extend(['-f', password_file])
+        if token:
+            cmd.extend(['-h', token])
+            fullname = token + ':' + fullname
 
-            cmd.extend(['-n', fullname])
+        if password_file:
+            cmd.extend(['-f', password_file])
 
-            logger.debug('Command: %s', ' '.join(map(str, cmd)))
+        cmd.extend(['-n', fullname])
 
-            p = subprocess.Popen(cmd,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
+        logger.debug('Command: %s', ' '.join(map(str, cmd)))
 
-            output, error = p.communicate()
+        p = subprocess.Popen(cmd,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
 
-            if error:
-                # certutil returned an error
-                # raise exception unless its not cert not found
-                if error.startswith(b'certutil: Could not find cert: '):
-                    return None
+        output, error = p.communicate()
 
-                raise Exception('Could not find certificate: %s: %s' % (fullname, error.strip()))
+        if error:
+            # certutil returned an error
+            # raise exception unless its not cert not found
+            if error.startswith(b'certutil: Could not find cert: '):
+                return None
 
-            if p.returncode != 0:
-                logger.warning('certutil returned non-zero exit code (bug #1539996)')
+            raise Exception('Could not find certificate: %s: %s' % (fullname, error.strip()))
 
-            print(output.decode('ascii'))
+        if p.returncode != 0:
+            logger.warning('certutil returned non-zero exit code (bug #1539996)')
 
-        finally:
-            shutil.rmtree(tmpdir)
+        print(output.decode('ascii'))
 
     def get_cert(self, nickname, token=None, output_format='pem',
                  output_text=False):
@@ -1504,68 +2403,97 @@ class NSSDatabase(object):
         else:
             raise Exception('Unsupported output format: %s' % output_format)
 
-        tmpdir = tempfile.mkdtemp()
-        try:
-            token = self.get_effective_token(token)
-            password_file = self.get_password_file(tmpdir, token)
+        certs = None
+        if output_format_option:
+            certs = self.__get_inventory_certs(nickname, token=token)
 
-            cmd = [
-                'certutil',
-                '-L',
-                '-d', self.directory
-            ]
+        if certs is not None:
 
-            fullname = nickname
+            if not certs:
+                logger.debug('Cert not found: %s', nickname)
+                return None
 
-            if token:
-                cmd.extend(['-h', token])
-                fullname = token + ':' + fullname
+            if output_format == 'base64':
+                cert_data = b''.join([cert['data'] for cert in certs])
 
-            if password_file:
-                cmd.extend(['-f', password_file])
+            else:
+                cert_data = ''.join([
+                    convert_cert(
+                        base64.b64encode(cert['data']).decode('ascii'),
+                        'base64',
+                        'pem')
+                    for cert in certs]).encode('ascii')
+
+        else:
+            cert_data = self.__get_cert(
+                nickname,
+                token=token,
+                output_format_option=output_format_option)
 
-            cmd.extend(['-n', fullname])
+            if not cert_data:
+                return None
 
-            if output_format_option:
-                cmd.extend([output_format_option])
+        if output_format == 'base64':
+            cert_data = base64.b64encode(cert_data).decode('utf-8')
+        if output_text and not isinstance(cert_data, six.string_types):
+            cert_data = cert_data.decode('ascii')
 
-            logger.debug('Command: %s', ' '.join(map(str, cmd)))
+        logger.debug('NSSDatabase.get_cert(%s) ends', nickname)
 
-            p = subprocess.Popen(cmd,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            cert_data, std_err = p.communicate()
+        return cert_data
 
-            if std_err:
-                # certutil returned an error
-                # raise exception unless its not cert not found
-                if std_err.startswith(b'certutil: Could not find cert: '):
-                    logger.debug('Cert not found: %s', nickname)
-                    return None
+    def __get_cert(self, nickname, token=None, output_format_option=None):
 
-                raise Exception('Could not find cert: %s: %s' % (fullname, std_err.strip()))
+        token = self.get_effective_token(token)
+        password_file = self.get_password_file(self.tmpdir, token)
 
-            if not cert_data:
-                logger.debug('certutil did not return cert data')
-                return None
-            else:
-                logger.debug('certutil returned cert data')
+        cmd = [
+            'certutil',
+            '-L',
+            '-d', self.directory
+        ]
 
-            if p.returncode != 0:
-                logger.warning('certutil returned non-zero exit code (bug #1539996)')
-                logger.debug('return code: %s', p.returncode)
+        fullname = nickname
 
-            if output_format == 'base64':
-                cert_data = base64.b64encode(cert_data).decode('utf-8')
-            if output_text and not isinstance(cert_data, six.string_types):
-                cert_data = cert_data.decode('ascii')
+        if token:
+            cmd.extend(['-h', token])
+            fullname = token + ':' + fullname
 
-            logger.debug('NSSDatabase.get_cert(%s) ends', nickname)
+        if password_file:
+            cmd.extend(['-f', password_file])
 
-            return cert_data
+        cmd.extend(['-n', fullname])
 
-        finally:
-            shutil.rmtree(tmpdir)
+        if output_format_option:
+            cmd.extend([output_format_option])
+
+        logger.debug('Command: %s', ' '.join(map(str, cmd)))
+
+        p = subprocess.Popen(cmd,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+        cert_data, std_err = p.communicate()
+
+        if std_err:
+            # certutil returned an error
+            # raise exception unless its not cert not found
+            if std_err.startswith(b'certutil: Could not find cert: '):
+                logger.debug('Cert not found: %s', nickname)
+                return None
+
+            raise Exception('Could not find cert: %s: %s' % (fullname, std_err.strip()))
+
+        if not cert_data:
+            logger.debug('certutil did not return cert data')
+            return None
+        else:
+            logger.debug('certutil returned cert data')
+
+        if p.returncode != 0:
+            logger.warning('certutil returned non-zero exit code (bug #1539996)')
+            logger.debug('return code: %s', p.returncode)
+
+        return cert_data
 
     def get_cert_info(self, nickname, token=None):
 
@@ -1718,10 +2646,9 @@ class NSSDatabase(object):
             token=None,
             remove_key=False):
 
-        tmpdir = tempfile.mkdtemp()
         try:
             token = self.get_effective_token(token)
-            password_file = self.get_password_file(tmpdir, token)
+            password_file = self.get_password_file(self.tmpdir, token)
 
             cmd = ['certutil']
 
@@ -1744,7 +2671,7 @@ class NSSDatabase(object):
             subprocess.check_call(cmd)
 
         finally:
-            shutil.rmtree(tmpdir)
+            self.invalidate_cert_inventory()
 
     def import_cert_chain(
             self,
@@ -1762,11 +2689,9 @@ class NSSDatabase(object):
 
             if file_type == 'cert':  # import single PEM cert
                 logger.debug('Importing a single cert')
-                self.add_cert(
-                    nickname=nickname,
-                    cert_file=cert_chain_file,
-                    token=token,
-                    trust_attributes=trust_attributes)
+                self.add_certs(
+                    [(nickname, load_cert_file(cert_chain_file), trust_attributes)],
+                    token=token)
                 return (
                     self.get_cert(
                         nickname=nickname,
@@ -1855,53 +2780,27 @@ class NSSDatabase(object):
 
             subprocess.run(cmd, input=data, check=True)
 
+            self.invalidate_cert_inventory()
+
             return
 
         # Import certificate chain with nickname
 
-        tmpdir = tempfile.mkdtemp()
+        if pkcs7_file:
+            with open(pkcs7_file, 'rb') as f:
+                pkcs7_data = f.read()
 
-        try:
-            # Sort and split the certs from root to leaf.
-            prefix = os.path.join(tmpdir, 'cert')
-            suffix = '.crt'
+        # Sort the certs from root to leaf.
+        certs = sort_certs(load_pkcs7_certs(pkcs7_data))
 
-            cmd = [
-                'pki',
-                '-d', self.directory,
-                'pkcs7-cert-export',
-                '--pkcs7', pkcs7_file,
-                '--output-prefix', prefix,
-                '--output-suffix', suffix
-            ]
+        logger.debug('Number of certs in PKCS #7: %s', len(certs))
 
-            logger.debug('Command: %s', ' '.join(map(str, cmd)))
-            subprocess.check_call(cmd)
-
-            # Count the number of certs in the chain.
-            n = 0
-            while True:
-                cert_file = prefix + str(n) + suffix
-                if not os.path.exists(cert_file):
-                    break
-                n = n + 1
-
-            logger.debug('Number of certs in PKCS #7: %s', n)
-            # Import CA certs with default nicknames and trust attributes.
-            for i in range(0, n - 1):
-                cert_file = prefix + str(i) + suffix
-                self.add_ca_cert(cert_file)
-
-            # Import user cert with specified nickname and trust attributes.
-            cert_file = prefix + str(n - 1) + suffix
-            self.add_cert(
-                nickname=nickname,
-                cert_file=cert_file,
-                token=token,
-                trust_attributes=trust_attributes)
-
-        finally:
-            shutil.rmtree(tmpdir)
+        # Import CA certs with default nicknames and trust attributes,
+        # and user cert with specified nickname and trust attributes.
+        self.add_certs(
+            [(None, data, 'CT,C,C') for data in certs[:-1]] +
+            [(nickname, certs[-1], trust_attributes)],
+            token=token)
 
     def import_pkcs12(self, pkcs12_file,
                       pkcs12_password=None,
@@ -1965,6 +2864,7 @@ class NSSDatabase(object):
 
         finally:
             shutil.rmtree(tmpdir)
+            self.invalidate_cert_inventory()
 
     def export_pkcs12(self, pkcs12_file,
                       pkcs12_password=None,
@@ -2000,6 +2900,9 @@ class NSSDatabase(object):
             if self.password_file:
                 cmd.extend(['-C', self.password_file])
 
+            elif self.password_conf:
+                cmd.extend(['-f', self.password_conf])
+
             if self.token:
                 cmd.extend(['--token', self.token])
 
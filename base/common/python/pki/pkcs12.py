@@ -20,11 +20,74 @@
 #
 
 from __future__ import absolute_import
+import hashlib
+import hmac
 import os
 import shutil
 import subprocess
 import tempfile
 
+from cryptography.exceptions import UnsupportedAlgorithm
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+try:
+    from cryptography.hazmat.decrepit.ciphers.algorithms import RC2, TripleDES
+except ImportError:
+    from cryptography.hazmat.primitives.ciphers.algorithms import TripleDES
+    RC2 = None
+
+import pki.nssdb
+
+DATA_OID = '1.2.840.113549.1.7.1'
+ENCRYPTED_DATA_OID = '1.2.840.113549.1.7.6'
+
+KEY_BAG_OID = '1.2.840.113549.1.12.10.1.1'
+SHROUDED_KEY_BAG_OID = '1.2.840.113549.1.12.10.1.2'
+CERT_BAG_OID = '1.2.840.113549.1.12.10.1.3'
+SAFE_CONTENTS_BAG_OID = '1.2.840.113549.1.12.10.1.6'
+X509_CERT_OID = '1.2.840.113549.1.9.22.1'
+
+FRIENDLY_NAME_OID = '1.2.840.113549.1.9.20'
+LOCAL_KEY_ID_OID = '1.2.840.113549.1.9.21'
+
+# trust flags attribute added by JSS
+CERT_TRUST_FLAGS_OID = '2.16.840.1.113730.5.1.1.1'
+
+PBES2_OID = '1.2.840.113549.1.5.13'
+PBKDF2_OID = '1.2.840.113549.1.5.12'
+
+DIGEST_ALGORITHMS = {
+    '1.3.14.3.2.26': 'sha1',
+    '2.16.840.1.101.3.4.2.4': 'sha224',
+    '2.16.840.1.101.3.4.2.1': 'sha256',
+    '2.16.840.1.101.3.4.2.2': 'sha384',
+    '2.16.840.1.101.3.4.2.3': 'sha512',
+}
+
+HMAC_ALGORITHMS = {
+    '1.2.840.113549.2.7': 'sha1',
+    '1.2.840.113549.2.8': 'sha224',
+    '1.2.840.113549.2.9': 'sha256',
+    '1.2.840.113549.2.10': 'sha384',
+    '1.2.840.113549.2.11': 'sha512',
+}
+
+# PKCS #12 PBE algorithms: (cipher, key size, IV size)
+PKCS12_PBE_ALGORITHMS = {
+    '1.2.840.113549.1.12.1.3': (TripleDES, 24, 8),
+    '1.2.840.113549.1.12.1.4': (TripleDES, 16, 8),
+    '1.2.840.113549.1.12.1.5': (RC2, 16, 8),
+}
+
+# PBES2 encryption schemes: (cipher, key size)
+PBES2_CIPHERS = {
+    '2.16.840.1.101.3.4.1.2': (algorithms.AES, 16),
+    '2.16.840.1.101.3.4.1.22': (algorithms.AES, 24),
+    '2.16.840.1.101.3.4.1.42': (algorithms.AES, 32),
+    '1.2.840.113549.3.7': (TripleDES, 24),
+}
+
 
 class PKCS12(object):
 
@@ -39,11 +102,18 @@ class PKCS12(object):
         self.nssdb = nssdb
 
         self.tmpdir = tempfile.mkdtemp()
+        self.password_fd = None
 
         if password:
-            self.password_file = os.path.join(self.tmpdir, 'password.txt')
-            with open(self.password_file, 'w') as f:
-                f.write(password)
+            memory_file = pki.nssdb.create_memory_file('password.txt', password)
+
+            if memory_file:
+                self.password_file, self.password_fd = memory_file
+
+            else:
+                self.password_file = os.path.join(self.tmpdir, 'password.txt')
+                with open(self.password_file, 'w') as f:
+                    f.write(password)
 
         elif password_file:
             self.password_file = password_file
@@ -52,6 +122,10 @@ class PKCS12(object):
             raise Exception('Missing PKCS #12 password')
 
     def close(self):
+        if self.password_fd is not None:
+            os.close(self.password_fd)
+            self.password_fd = None
+
         shutil.rmtree(self.tmpdir)
 
     def show_certs(self):
@@ -71,3 +145,348 @@ class PKCS12(object):
         ])
 
         subprocess.check_call(cmd)
+
+
+def read_tlv(data, offset=0):
+    """
+    Read the BER element at the given offset and return its tag,
+    value, and the offset of the next element.
+    """
+
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+
+    if length == 0x80:
+        # indefinite length, the value ends with an end-of-contents
+        start = offset
+        while data[offset:offset + 2] != b'\0\0':
+            _, _, offset = read_tlv(data, offset)
+        return tag, data[start:offset], offset + 2
+
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[offset:offset + size], 'big')
+        offset += size
+
+    end = offset + length
+    if end > len(data):
+        raise ValueError('Truncated ASN.1 data')
+
+    return tag, data[offset:end], end
+
+
+def read_elements(data):
+    """
+    Return the (tag, value) tuples of the elements in a constructed value.
+    """
+
+    elements = []
+    offset = 0
+
+    while offset < len(data):
+        tag, value, offset = read_tlv(data, offset)
+        elements.append((tag, value))
+
+    return elements
+
+
+def read_octets(tag, value):
+    """
+    Return the content of a primitive or constructed OCTET STRING.
+    """
+
+    if tag & 0x20:
+        return b''.join([read_octets(t, v) for t, v in read_elements(value)])
+
+    return value
+
+
+def read_oid(value):
+
+    arcs = []
+    n = 0
+
+    for b in value:
+        n = (n << 7) | (b & 0x7F)
+        if not b & 0x80:
+            arcs.append(n)
+            n = 0
+
+    first = min(arcs[0] // 40, 2)
+    arcs[0:1] = [first, arcs[0] - 40 * first]
+
+    return '.'.join([str(arc) for arc in arcs])
+
+
+def read_string(tag, value):
+
+    if tag == 0x1E:  # BMPString
+        return value.decode('utf-16-be')
+
+    return value.decode('utf-8')
+
+
+def pkcs12_kdf(hash_name, password, salt, purpose, iterations, size):
+    """
+    Derive key material with the PKCS #12 key derivation function
+    (RFC 7292, appendix B.2).
+
+    :param password: password as null-terminated BMPString
+    :param purpose: 1 for keys, 2 for IVs, 3 for MAC keys
+    """
+
+    u = hashlib.new(hash_name).digest_size
+    v = hashlib.new(hash_name).block_size
+
+    def fill(data):
+        if not data:
+            return b''
+        length = v * ((len(data) + v - 1) // v)
+        return (data * (length // len(data) + 1))[:length]
+
+    d = bytes([purpose]) * v
+    i = fill(salt) + fill(password)
+    result = b''
+
+    while len(result) < size:
+
+        a = hashlib.new(hash_name, d + i).digest()
+        for _ in range(iterations - 1):
+            a = hashlib.new(hash_name, a).digest()
+
+        result += a
+
+        b = int.from_bytes((a * (v // u + 1))[:v], 'big') + 1
+        mask = (1 << (8 * v)) - 1
+
+        i = b''.join([
+            ((int.from_bytes(i[j:j + v], 'big') + b) & mask).to_bytes(v, 'big')
+            for j in range(0, len(i), v)])
+
+    return result[:size]
+
+
+def get_bmp_password(password):
+    return (password + '\0').encode('utf-16-be')
+
+
+def verify_mac(mac_data, content, password):
+
+    mac_data = read_elements(mac_data)
+    digest_info = read_elements(mac_data[0][1])
+
+    digest_oid = read_oid(read_elements(digest_info[0][1])[0][1])
+    hash_name = DIGEST_ALGORITHMS.get(digest_oid)
+    if not hash_name:
+        raise UnsupportedAlgorithm('Unsupported PKCS #12 MAC algorithm: %s' % digest_oid)
+
+    salt = mac_data[1][1]
+    iterations = int.from_bytes(mac_data[2][1], 'big') if len(mac_data) > 2 else 1
+
+    key = pkcs12_kdf(
+        hash_name,
+        get_bmp_password(password),
+        salt,
+        3,
+        iterations,
+        hashlib.new(hash_name).digest_size)
+
+    mac = hmac.new(key, content, hash_name).digest()
+
+    if not hmac.compare_digest(mac, digest_info[1][1]):
+        raise ValueError('Invalid PKCS #12 password')
+
+
+def decrypt(algorithm, data, password):
+    """
+    Decrypt data encrypted with a PKCS #12 PBE or PBES2 algorithm.
+    """
+
+    algorithm = read_elements(algorithm)
+    oid = read_oid(algorithm[0][1])
+    params = read_elements(algorithm[1][1])
+
+    if oid in PKCS12_PBE_ALGORITHMS:
+
+        cipher, key_size, iv_size = PKCS12_PBE_ALGORITHMS[oid]
+        if not cipher:
+            raise UnsupportedAlgorithm('Unsupported PKCS #12 algorithm: %s' % oid)
+
+        salt = params[0][1]
+        iterations = int.from_bytes(params[1][1], 'big')
+        bmp_password = get_bmp_password(password)
+
+        key = pkcs12_kdf('sha1', bmp_password, salt, 1, iterations, key_size)
+        iv = pkcs12_kdf('sha1', bmp_password, salt, 2, iterations, iv_size)
+
+    elif oid == PBES2_OID:
+
+        kdf = read_elements(params[0][1])
+        scheme = read_elements(params[1][1])
+
+        kdf_oid = read_oid(kdf[0][1])
+        if kdf_oid != PBKDF2_OID:
+            raise UnsupportedAlgorithm('Unsupported PBES2 key derivation: %s' % kdf_oid)
+
+        scheme_oid = read_oid(scheme[0][1])
+        if scheme_oid not in PBES2_CIPHERS:
+            raise UnsupportedAlgorithm('Unsupported PBES2 encryption: %s' % scheme_oid)
+
+        cipher, key_size = PBES2_CIPHERS[scheme_oid]
+        iv = scheme[1][1]
+
+        kdf_params = read_elements(kdf[1][1])
+        salt = kdf_params[0][1]
+        iterations = int.from_bytes(kdf_params[1][1], 'big')
+        hash_name = 'sha1'
+
+        for tag, value in kdf_params[2:]:
+            if tag == 0x02:  # key length
+                key_size = int.from_bytes(value, 'big')
+            elif tag == 0x30:  # PRF
+                prf_oid = read_oid(read_elements(value)[0][1])
+                hash_name = HMAC_ALGORITHMS.get(prf_oid)
+                if not hash_name:
+                    raise UnsupportedAlgorithm('Unsupported PBKDF2 PRF: %s' % prf_oid)
+
+        key = hashlib.pbkdf2_hmac(
+            hash_name, password.encode('utf-8'), salt, iterations, key_size)
+
+    else:
+        raise UnsupportedAlgorithm('Unsupported PKCS #12 algorithm: %s' % oid)
+
+    algorithm = cipher(key)
+    decryptor = Cipher(algorithm, modes.CBC(iv)).decryptor()
+    data = decryptor.update(data) + decryptor.finalize()
+
+    unpadder = padding.PKCS7(algorithm.block_size).unpadder()
+    return unpadder.update(data) + unpadder.finalize()
+
+
+def read_safe_bags(safe_contents, bags):
+
+    for _, value in read_elements(safe_contents):
+
+        bag = read_elements(value)
+        bag_id = read_oid(bag[0][1])
+        bag_value = read_elements(bag[1][1])[0]
+        attributes = {}
+
+        if len(bag) > 2:
+            for _, attribute in read_elements(bag[2][1]):
+                attribute = read_elements(attribute)
+                values = read_elements(attribute[1][1])
+                if values:
+                    attributes[read_oid(attribute[0][1])] = values[0]
+
+        if bag_id == SAFE_CONTENTS_BAG_OID:
+            read_safe_bags(bag_value[1], bags)
+            continue
+
+        bags.append((bag_id, bag_value, attributes))
+
+
+def find_certs(data, password):
+    """
+    Find the certificates in a PKCS #12 file without running the
+    pki CLI.
+
+    The returned certificates are dicts with nickname, data (DER),
+    has_key, and, if stored in the file, trust_flags.
+
+    :param data: PKCS #12 data
+    :type data: bytes
+    :param password: PKCS #12 password
+    :type password: str
+    :raises cryptography.exceptions.UnsupportedAlgorithm: if the file
+        uses an algorithm that is not supported
+    :raises ValueError: if the file cannot be decoded or the password
+        is invalid
+    """
+
+    try:
+        pfx = read_elements(read_tlv(data)[1])
+        auth_safe = read_elements(pfx[1][1])
+
+        content_type = read_oid(auth_safe[0][1])
+        if content_type != DATA_OID:
+            raise UnsupportedAlgorithm('Unsupported PKCS #12 content: %s' % content_type)
+
+        content = read_octets(*read_elements(auth_safe[1][1])[0])
+
+        if len(pfx) > 2:
+            verify_mac(pfx[2][1], content, password)
+
+        bags = []
+
+        for _, value in read_elements(read_tlv(content)[1]):
+
+            content_info = read_elements(value)
+            content_type = read_oid(content_info[0][1])
+
+            if content_type == DATA_OID:
+                safe_contents = read_octets(*read_elements(content_info[1][1])[0])
+
+            elif content_type == ENCRYPTED_DATA_OID:
+                encrypted_data = read_elements(read_elements(content_info[1][1])[0][1])
+                encrypted_content_info = read_elements(encrypted_data[1][1])
+                safe_contents = decrypt(
+                    encrypted_content_info[1][1],
+                    read_octets(*encrypted_content_info[2]),
+                    password)
+
+            else:
+                raise UnsupportedAlgorithm('Unsupported PKCS #12 content: %s' % content_type)
+
+            read_safe_bags(read_tlv(safe_contents)[1], bags)
+
+    except (IndexError, UnicodeDecodeError) as e:
+        raise ValueError('Unable to decode PKCS #12 data: %s' % e)
+
+    key_ids = set()
+    key_names = set()
+
+    for bag_id, _, attributes in bags:
+
+        if bag_id not in (KEY_BAG_OID, SHROUDED_KEY_BAG_OID):
+            continue
+
+        if LOCAL_KEY_ID_OID in attributes:
+            key_ids.add(read_octets(*attributes[LOCAL_KEY_ID_OID]))
+
+        if FRIENDLY_NAME_OID in attributes:
+            key_names.add(read_string(*attributes[FRIENDLY_NAME_OID]))
+
+    certs = []
+
+    for bag_id, bag_value, attributes in bags:
+
+        if bag_id != CERT_BAG_OID:
+            continue
+
+        cert_bag = read_elements(bag_value[1])
+        if read_oid(cert_bag[0][1]) != X509_CERT_OID:
+            continue
+
+        cert = {
+            'nickname': None,
+            'data': read_octets(*read_elements(cert_bag[1][1])[0]),
+            'has_key': False
+        }
+
+        if FRIENDLY_NAME_OID in attributes:
+            cert['nickname'] = read_string(*attributes[FRIENDLY_NAME_OID])
+
+        if CERT_TRUST_FLAGS_OID in attributes:
+            cert['trust_flags'] = read_string(*attributes[CERT_TRUST_FLAGS_OID])
+
+        if LOCAL_KEY_ID_OID in attributes:
+            cert['has_key'] = read_octets(*attributes[LOCAL_KEY_ID_OID]) in key_ids
+
+        elif cert['nickname']:
+            cert['has_key'] = cert['nickname'] in key_names
+
+        certs.append(cert)
+
+    return certs
@@ -21,10 +21,14 @@
 
 from __future__ import absolute_import
 import functools
+import hashlib
+import importlib.util
 import logging
+import marshal
 import os
 import pathlib
 import re
+import time
 
 import pki
 import pki.util
@@ -36,6 +40,15 @@ UPGRADE_DIR = pki.SHARE_DIR + '/upgrade'
 BACKUP_DIR = pki.LOG_DIR + '/upgrade'
 SYSTEM_TRACKER = pki.CONF_DIR + '/pki.version'
 
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+    'pki',
+    'upgrade')
+
+# scriptlet manifests loaded by PKIUpgrader.get_manifest() indexed by
+# upgrade directory
+MANIFESTS = {}
+
 logger = logging.getLogger(__name__)
 
 
@@ -216,18 +229,18 @@ class PKIUpgrader(object):
         self.upgrade_dir = upgrade_dir
         self.tracker = None
 
+        # (scriptlet, elapsed time) of the scriptlets executed by upgrade()
+        self.timings = []
+
     def version_dir(self, version):
 
         return os.path.join(self.upgrade_dir, str(version))
 
     def all_versions(self):
 
-        all_versions = []
-
-        if os.path.exists(self.upgrade_dir):
-            for version in os.listdir(self.upgrade_dir):
-                version = pki.util.Version(version)
-                all_versions.append(version)
+        all_versions = [
+            pki.util.Version(version) for version in self.get_manifest()['versions']
+        ]
 
         all_versions.sort()
 
@@ -280,37 +293,188 @@ class PKIUpgrader(object):
 
         return versions
 
-    def scriptlets(self, version):
-        scriptlets = []
+    def get_manifest_stamp(self):
+        '''
+        Return the modification times of the upgrade directory and the
+        version directories, and the modification times and sizes of
+        the scriptlets, or None if the upgrade directory does not exist.
+        '''
+
+        try:
+            st = os.stat(self.upgrade_dir)
+            names = os.listdir(self.upgrade_dir)
+
+        except FileNotFoundError:
+            return None
+
+        stamp = [('', st.st_mtime_ns)]
+
+        for name in sorted(names):
+            version_dir = os.path.join(self.upgrade_dir, name)
+            st = os.stat(version_dir)
+
+            # scriptlets can be modified in place without changing
+            # the modification time of the version directory
+            files = []
+
+            if os.path.isdir(version_dir):
+                for filename in sorted(os.listdir(version_dir)):
+                    file_st = os.stat(os.path.join(version_dir, filename))
+                    files.append((filename, file_st.st_mtime_ns, file_st.st_size))
+
+            stamp.append((name, st.st_mtime_ns, tuple(files)))
+
+        return tuple(stamp)
+
+    def get_manifest_file(self):
+
+        upgrade_dir = os.path.abspath(self.upgrade_dir)
+        name = hashlib.sha256(upgrade_dir.encode('utf-8')).hexdigest()
 
-        version_dir = self.version_dir(version)
-        if not os.path.exists(version_dir):
-            return scriptlets
+        return os.path.join(CACHE_DIR, name + '.manifest')
 
-        filenames = os.listdir(version_dir)
-        for filename in filenames:
+    def load_manifest(self, manifest_file, stamp):
 
-            # parse <index>_<classname>.py
-            match = re.match(r'^(.+)-(.+)\.py$', filename)
+        try:
+            with open(manifest_file, 'rb') as f:
 
-            if not match:
+                # only trust a cache file that cannot be modified by others
+                st = os.fstat(f.fileno())
+                if st.st_uid != os.geteuid() or st.st_mode & 0o022:
+                    logger.debug('Ignoring untrusted manifest: %s', manifest_file)
+                    return None
+
+                manifest = marshal.load(f)
+
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.debug('Unable to load manifest from %s: %s', manifest_file, e)
+            return None
+
+        if manifest.get('magic') != importlib.util.MAGIC_NUMBER:
+            return None
+
+        if manifest.get('stamp') != stamp:
+            return None
+
+        logger.debug('Loaded scriptlet manifest from %s', manifest_file)
+        return manifest
+
+    def create_manifest(self, stamp):
+
+        versions = {}
+
+        for name, _, _ in stamp[1:]:
+
+            version_dir = os.path.join(self.upgrade_dir, name)
+            if not os.path.isdir(version_dir):
                 continue
 
-            index = int(match.group(1))
-            classname = match.group(2)
+            entries = []
+
+            for filename in os.listdir(version_dir):
+
+                # parse <index>_<classname>.py
+                match = re.match(r'^(.+)-(.+)\.py$', filename)
+
+                if not match:
+                    continue
+
+                absname = os.path.join(version_dir, filename)
+                with open(absname, 'r') as f:
+                    bytecode = compile(f.read(), absname, 'exec')
+
+                entry = {
+                    'index': int(match.group(1)),
+                    'classname': match.group(2),
+                    'filename': absname,
+                    'code': bytecode,
+                }
 
-            # load scriptlet class
-            variables = {}
-            absname = os.path.join(version_dir, filename)
-            with open(absname, 'r') as f:
-                bytecode = compile(f.read(), absname, 'exec')
-            exec(bytecode, variables)  # pylint: disable=W0122
+                # get the message from the scriptlet, errors will be
+                # reported when the scriptlet is executed
+                try:
+                    entry['message'] = self.create_scriptlet(entry).message
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.debug('Unable to load %s: %s', absname, e)
+                    entry['message'] = None
 
-            # create scriptlet object
-            scriptlet = variables[classname]()
+                entries.append(entry)
+
+            entries.sort(key=lambda entry: entry['index'])
+            versions[name] = entries
+
+        return {
+            'magic': importlib.util.MAGIC_NUMBER,
+            'stamp': stamp,
+            'versions': versions,
+        }
+
+    def store_manifest(self, manifest_file, manifest):
+
+        try:
+            os.makedirs(os.path.dirname(manifest_file), mode=0o700, exist_ok=True)
+
+            tmp_file = '%s.%d' % (manifest_file, os.getpid())
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                marshal.dump(manifest, f)
+            os.replace(tmp_file, manifest_file)
+
+        except (OSError, ValueError) as e:
+            logger.debug('Unable to store manifest in %s: %s', manifest_file, e)
+
+    def get_manifest(self):
+        '''
+        Return the scriptlet manifest which contains the metadata and
+        the compiled code of the scriptlets in each version directory.
+
+        The manifest is cached in memory and in CACHE_DIR, and it is
+        rebuilt when the modification time of the upgrade directory, of
+        a version directory, or of a scriptlet changes.
+        '''
+
+        stamp = self.get_manifest_stamp()
+
+        if stamp is None:
+            return {'stamp': None, 'versions': {}}
+
+        entry = MANIFESTS.get(self.upgrade_dir)
+        if entry and entry['stamp'] == stamp:
+            return entry
+
+        manifest_file = self.get_manifest_file()
+        manifest = self.load_manifest(manifest_file, stamp)
+
+        if not manifest:
+            logger.debug('Creating scriptlet manifest for %s', self.upgrade_dir)
+            manifest = self.create_manifest(stamp)
+            self.store_manifest(manifest_file, manifest)
+
+        MANIFESTS[self.upgrade_dir] = manifest
+
+        return manifest
+
+    def get_manifest_entries(self, version):
+        return self.get_manifest()['versions'].get(str(version), [])
+
+    def create_scriptlet(self, entry):
+
+        # load scriptlet class
+        variables = {}
+        exec(entry['code'], variables)  # pylint: disable=W0122
+
+        # create scriptlet object
+        return variables[entry['classname']]()
+
+    def scriptlets(self, version):
+        scriptlets = []
+
+        for entry in self.get_manifest_entries(version):
+
+            scriptlet = self.create_scriptlet(entry)
 
             scriptlet.version = version
-            scriptlet.index = index
+            scriptlet.index = entry['index']
 
             scriptlets.append(scriptlet)
 
@@ -455,10 +619,18 @@ class PKIUpgrader(object):
             logger.info('Running upgrade script %s-%s: %s',
                         version, scriptlet.index, scriptlet.message)
 
+            start_time = time.time()
+
             self.init_scriptlet(scriptlet)
             self.run_scriptlet(scriptlet)
             self.update_tracker(scriptlet)
 
+            elapsed = time.time() - start_time
+            self.timings.append((scriptlet, elapsed))
+
+            logger.info('Upgrade script %s-%s completed in %.3f s',
+                        version, scriptlet.index, elapsed)
+
     def init_scriptlet(self, scriptlet):
 
         scriptlet.upgrader = self
@@ -478,6 +650,7 @@ class PKIUpgrader(object):
 
     def upgrade(self):
 
+        self.timings = []
         versions = self.versions()
 
         for version in versions:
@@ -576,6 +749,16 @@ class PKIUpgrader(object):
 
         self.show_tracker()
 
+        if self.is_complete():
+            return
+
+        # count pending scriptlets without loading them
+        count = 0
+        for version in self.versions():
+            count += len(self.get_manifest_entries(version))
+
+        print('  Pending scriptlets: %d' % count)
+
     def set_tracker(self, version):
 
         tracker = self.get_tracker()
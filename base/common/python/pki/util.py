@@ -29,7 +29,6 @@ import functools
 import getpass
 import io
 import logging
-import operator
 import os
 import re
 import shutil
@@ -42,6 +41,8 @@ except ImportError:
 import six
 from six.moves import input   # pylint: disable=W0622,F0401
 import subprocess
+import threading
+import time
 
 DEFAULT_PKI_ENV_LIST = [
     '/usr/share/pki/etc/pki.conf',
@@ -354,70 +355,225 @@ def customize_file(input_file, output_file, params):
             outfile.write(line)
 
 
+def parse_properties(content, filename=None):
+    """
+    Parse the content of a properties file and return the properties
+    as a list of (name, value) tuples in the order they appear.
+    """
+
+    properties = []
+    append = properties.append
+
+    lines = content.splitlines()
+
+    if '\\\n' not in content and not content.endswith('\\'):
+        # no line continuations, parse each line independently
+
+        for index, line in enumerate(lines):
+
+            name, sep, value = line.partition('=')
+            name = name.strip()
+
+            if sep and name[:1] != '#':
+                append((name, value.strip()))
+                continue
+
+            line = line.lstrip()
+            if line and not line.startswith('#'):
+                raise Exception('Missing delimiter in %s line %d' %
+                                (filename, index + 1))
+
+        return properties
+
+    name = None
+    value = None
+    multi_line = False
+
+    for index, line in enumerate(lines):
+
+        if multi_line:
+            # append line to previous property
+            value = value + line
+
+        else:
+            # parse line for new property
+
+            line = line.lstrip()
+            if not line or line.startswith('#'):
+                continue
+
+            name, sep, value = line.partition('=')
+            if not sep:
+                raise Exception('Missing delimiter in %s line %d' %
+                                (filename, index + 1))
+
+            name = name.rstrip()
+            value = value.lstrip()
+
+        # check if the value is multi-line
+        if value.endswith('\\'):
+            value = value[:-1]
+            multi_line = True
+
+        else:
+            append((name, value.rstrip()))
+            multi_line = False
+
+    if multi_line:
+        append((name, value))
+
+    return properties
+
+
 def load_properties(filename, properties):
 
     with open(filename) as f:
+        content = f.read()
 
-        lines = f.read().splitlines()
-        name = None
-        multi_line = False
+    properties.update(parse_properties(content, filename))
 
-        for index, line in enumerate(lines):
 
-            if multi_line:
-                # append line to previous property
+def format_properties(properties, content=None, filename=None):
+    """
+    Format properties for storing into a file with the specified
+    existing content.
 
-                value = properties[name]
-                value = value + line
+    The existing properties are kept in the order they appear in the
+    content and new properties are merged in sorted order. If nothing
+    has changed the original content is returned.
+    """
 
-            else:
-                # parse line for new property
+    lines = dict(
+        (name, u'{0}={1}\n'.format(name, value)
+            if isinstance(value, six.string_types)
+            else format_property(name, value))
+        for name, value in properties.items())
 
-                line = line.lstrip()
-                if not line or line.startswith('#'):
-                    continue
+    # properties loaded from this file are already in the same order
+    output = u''.join(lines.values())
 
-                parts = line.split('=', 1)
-                if len(parts) < 2:
-                    raise Exception('Missing delimiter in %s line %d' %
-                                    (filename, index + 1))
+    if output == content:
+        return content
 
-                name = parts[0].rstrip()
-                value = parts[1].lstrip()
+    if content and '\\\n' not in content:
+        # if the file has the same properties in the same order
+        # only the values have changed, so store them in that order
 
-            # check if the value is multi-line
-            if value.endswith('\\'):
-                value = value[:-1]
-                multi_line = True
+        old_lines = content.splitlines(True)
 
-            else:
-                value = value.rstrip()
-                multi_line = False
+        if len(old_lines) == len(lines) and all(
+                old_line.partition('=')[0] == name
+                for old_line, name in zip(old_lines, lines)):
+            return output
+
+    names = []
+
+    if content:
+        try:
+            names = parse_properties(content, filename)
+
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning('Unable to parse %s: %s', filename, e)
+
+    existing_names = set(name for name, _ in names)
+    new_names = sorted(
+        (name for name in properties if name not in existing_names),
+        reverse=True)
+
+    output = []
+    append = output.append
+
+    for name, _ in names:
+
+        # merge new properties that belong before this one
+        while new_names and new_names[-1] < name:
+            append(lines.pop(new_names.pop()))
 
-            # store value in properties
-            properties[name] = value
+        # skip removed or duplicate properties
+        line = lines.pop(name, None)
+        if line is not None:
+            append(line)
+
+    while new_names:
+        append(lines.pop(new_names.pop()))
+
+    output = u''.join(output)
+
+    if output == content:
+        return content
+
+    return output
 
 
 def store_properties(filename, properties):
+    """
+    Store properties into a file (see format_properties()).
+    The file is replaced atomically and only if the content has changed.
+    """
 
-    sorted_props = sorted(properties.items(), key=operator.itemgetter(0))
+    filename = os.path.realpath(filename)
 
-    with io.open(filename, 'w') as f:
+    try:
+        with io.open(filename) as f:
+            content = f.read()
 
-        for name, value in sorted_props:
+    except (IOError, OSError):
+        content = None
 
-            if value is None:
-                # write None as empty value
-                f.write(u'{0}=\n'.format(name))
+    output = format_properties(properties, content, filename)
 
-            elif isinstance(value, six.string_types):
-                f.write(u'{0}={1}\n'.format(name, value))
+    if output == content:
+        logger.debug('No changes in %s', filename)
+        return
 
-            elif isinstance(value, six.integer_types):
-                f.write(u'{0}={1:d}\n'.format(name, value))
+    write_file(filename, output, content is not None)
+
+
+def write_file(filename, content, replace=False):
+    """
+    Write a file atomically. The content is written into a temporary
+    file in the same directory which is synced to disk and then renamed.
+    If the file is being replaced, its permissions and ownership are
+    preserved.
+    """
+
+    tmp_file = '%s.%d.tmp' % (filename, os.getpid())
+
+    try:
+        with io.open(tmp_file, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if replace:
+            st = os.stat(filename)
+            os.chmod(tmp_file, st.st_mode & 0o7777)
+            try:
+                os.chown(tmp_file, st.st_uid, st.st_gid)
+            except OSError:
+                pass
+
+        os.replace(tmp_file, filename)
+
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
 
-            else:
-                raise TypeError((name, value, type(value)))
+
+def format_property(name, value):
+
+    if value is None:
+        # write None as empty value
+        return u'{0}=\n'.format(name)
+
+    if isinstance(value, six.string_types):
+        return u'{0}={1}\n'.format(name, value)
+
+    if isinstance(value, six.integer_types):
+        return u'{0}={1:d}\n'.format(name, value)
+
+    raise TypeError((name, value, type(value)))
 
 
 def set_property(properties, name, value):
@@ -656,3 +812,130 @@ class Version(object):
 
     def __repr__(self):
         return '%d.%d.%d' % (self.major, self.minor, self.patch)
+
+
+class LatencyHistogram(object):
+    """
+    Thread-safe histogram of operation latencies.
+
+    The latencies are counted in power-of-two millisecond buckets, so the
+    memory used does not depend on the number of operations recorded.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, latency):
+        """
+        Record a latency in seconds.
+        """
+
+        ms = latency * 1000
+
+        # upper bound of the bucket: 1, 2, 4, 8, ... ms
+        bucket = 1
+        while bucket < ms:
+            bucket <<= 1
+
+        with self.lock:
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+            self.count += 1
+            self.total += latency
+
+            if self.min is None or latency < self.min:
+                self.min = latency
+
+            if self.max is None or latency > self.max:
+                self.max = latency
+
+    def percentile(self, p):
+        """
+        Return the upper bound (in seconds) of the bucket containing the
+        p-th percentile of the latencies, or None if nothing was recorded.
+        """
+
+        with self.lock:
+            if not self.count:
+                return None
+
+            threshold = self.count * p / 100.0
+            seen = 0
+            for bucket in sorted(self.buckets):
+                seen += self.buckets[bucket]
+                if seen >= threshold:
+                    return min(bucket / 1000.0, self.max)
+
+            return self.max
+
+    def mean(self):
+        with self.lock:
+            return self.total / self.count if self.count else None
+
+    def to_dict(self):
+        with self.lock:
+            buckets = dict(self.buckets)
+
+        return {
+            'name': self.name,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean(),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': {'<=%dms' % b: buckets[b] for b in sorted(buckets)},
+        }
+
+    def __repr__(self):
+        if not self.count:
+            return '%s: no samples' % self.name
+
+        return '%s: count=%d mean=%.1fms p50<=%.1fms p90<=%.1fms p99<=%.1fms max=%.1fms' % (
+            self.name,
+            self.count,
+            self.mean() * 1000,
+            self.percentile(50) * 1000,
+            self.percentile(90) * 1000,
+            self.percentile(99) * 1000,
+            self.max * 1000)
+
+
+class RateLimiter(object):
+    """
+    Thread-safe limiter that spaces operations evenly so that no more
+    than the specified number of operations per second are started.
+    """
+
+    def __init__(self, rate):
+        """
+        :param rate: maximum operations per second (None or 0: unlimited)
+        :type rate: float
+        """
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def acquire(self):
+        """
+        Wait until the next operation is allowed to start.
+        """
+
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            scheduled = max(self.next_time, now)
+            self.next_time = scheduled + self.interval
+
+        delay = scheduled - now
+        if delay > 0:
+            time.sleep(delay)
@@ -25,7 +25,9 @@ import datetime
 import functools
 import getpass
 import grp
+import hashlib
 import inspect
+import json
 import logging
 import os
 import pathlib
@@ -35,11 +37,15 @@ import requests
 import shutil
 import subprocess
 import tempfile
+import threading
 import time
 import socket
+import zipfile
 
 import ldap
+import ldap.controls
 import ldap.filter
+import ldap.sasl
 from lxml import etree
 
 import pki
@@ -65,6 +71,19 @@ SCHEMA_FILES = [
     '/usr/share/pki/server/conf/schema.ldif'
 ]
 
+# number of entries retrieved per page in LDAP searches
+LDAP_PAGE_SIZE = 1000
+
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+    'pki')
+
+# audit events loaded from JAR files indexed by JAR path, mtime, and size
+AUDIT_EVENTS = {}
+
+# properties loaded by PKIServer.load_properties() indexed by file path
+PROPERTIES = {}
+
 logger = logging.getLogger(__name__)
 
 parser = etree.XMLParser(remove_blank_text=True)
@@ -121,9 +140,13 @@ class PKIServer(object):
         self.user = user
         self.group = group
 
-        self.config = {}
-        self.passwords = {}
-        self.subsystems = {}
+        self._config = {}
+        self._passwords = {}
+        self._subsystems = {}
+
+        # configs that will be loaded on first access
+        self.pending = set()
+        self.lock = threading.RLock()
 
     def __repr__(self):
         return self.name
@@ -632,6 +655,53 @@ grant codeBase "file:%s" {
             mode=DEFAULT_FILE_MODE,
             force=force)
 
+    @property
+    def config(self):
+        if 'config' in self.pending:
+            self.load_pending('config', self.load_config)
+        return self._config
+
+    @property
+    def passwords(self):
+        if 'passwords' in self.pending:
+            self.load_pending('passwords', self.load_passwords)
+        return self._passwords
+
+    @property
+    def subsystems(self):
+        if 'subsystems' in self.pending:
+            self.load_pending('subsystems', self.load_subsystems)
+        return self._subsystems
+
+    def load_pending(self, name, loader):
+        '''
+        Load a pending config unless another thread has loaded it
+        while waiting for the lock.
+        '''
+
+        with self.lock:
+            if name in self.pending:
+                loader()
+
+    def load_properties(self, filename, properties):
+        '''
+        Load properties from a file. The parsed properties are cached
+        in memory and reused as long as the file has not changed.
+        '''
+
+        st = os.stat(filename)
+        stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+        entry = PROPERTIES.get(filename)
+
+        if not entry or entry[0] != stamp:
+            values = {}
+            pki.util.load_properties(filename, values)
+            entry = (stamp, values)
+            PROPERTIES[filename] = entry
+
+        properties.update(entry[1])
+
     def store_properties(self, filename, properties):
         pki.util.store_properties(filename, properties)
         pki.util.chown(filename, self.uid, self.gid)
@@ -1087,47 +1157,62 @@ grant codeBase "file:%s" {
         pki.util.rmtree(self.nssdb_dir, force=force)
 
     def load(self):
+        '''
+        Load the instance. The configs and subsystems are loaded
+        on first access.
+        '''
 
         logger.info('Loading instance: %s', self.name)
 
-        self.load_config()
-        self.load_passwords()
-        self.load_subsystems()
+        with self.lock:
+            self.pending.update(['config', 'passwords', 'subsystems'])
 
     def load_config(self):
 
-        self.config.clear()
+        config = {}
 
         logger.info('Loading global Tomcat config: %s', Tomcat.TOMCAT_CONF)
-        pki.util.load_properties(Tomcat.TOMCAT_CONF, self.config)
+        self.load_properties(Tomcat.TOMCAT_CONF, config)
 
         logger.info('Loading PKI Tomcat config: %s', PKIServer.TOMCAT_CONF)
-        pki.util.load_properties(PKIServer.TOMCAT_CONF, self.config)
+        self.load_properties(PKIServer.TOMCAT_CONF, config)
 
         if os.path.exists(self.tomcat_conf):
             logger.info('Loading instance Tomcat config: %s', self.tomcat_conf)
-            pki.util.load_properties(self.tomcat_conf, self.config)
+            self.load_properties(self.tomcat_conf, config)
 
         # strip quotes
-        for name, value in self.config.items():
+        for name, value in config.items():
             if value.startswith('"') and value.endswith('"'):
-                self.config[name] = value[1:-1]
+                config[name] = value[1:-1]
 
-        self.config['NAME'] = self.name
+        config['NAME'] = self.name
+
+        with self.lock:
+            self._config.clear()
+            self._config.update(config)
+            self.pending.discard('config')
 
     def load_passwords(self):
 
-        self.passwords.clear()
+        passwords = {}
 
         if os.path.exists(self.password_conf):
             logger.info('Loading password config: %s', self.password_conf)
-            pki.util.load_properties(self.password_conf, self.passwords)
+            self.load_properties(self.password_conf, passwords)
+
+        with self.lock:
+            self._passwords.clear()
+            self._passwords.update(passwords)
+            self.pending.discard('passwords')
 
     def store_passwords(self):
         self.store_properties(self.password_conf, self.passwords)
 
     def load_subsystems(self):
 
+        subsystems = {}
+
         for subsystem_name in SUBSYSTEM_TYPES:
 
             subsystem_dir = os.path.join(self.base_dir, subsystem_name)
@@ -1141,7 +1226,12 @@ grant codeBase "file:%s" {
 
             subsystem = pki.server.subsystem.PKISubsystemFactory.create(self, subsystem_name)
             subsystem.load()
-            self.subsystems[subsystem_name] = subsystem
+            subsystems[subsystem_name] = subsystem
+
+        with self.lock:
+            self._subsystems.clear()
+            self._subsystems.update(subsystems)
+            self.pending.discard('subsystems')
 
     def get_subsystems(self):
         return list(self.subsystems.values())
@@ -1487,6 +1577,69 @@ grant codeBase "file:%s" {
         with open(filename) as f:
             lines = f.read().splitlines()
 
+        return PKIServer.parse_audit_events(lines)
+
+    @staticmethod
+    def load_audit_events_from_jar(jar_file):
+        '''
+        This method loads audit event info from audit-events.properties
+        stored in a JAR file and return it as a map of objects.
+
+        The result is cached in memory and in CACHE_DIR, keyed by the
+        JAR file's path, modification time, and size.
+        '''
+
+        jar_file = os.path.abspath(jar_file)
+        st = os.stat(jar_file)
+        key = '%s:%d:%d' % (jar_file, st.st_mtime_ns, st.st_size)
+
+        events = AUDIT_EVENTS.get(key)
+        if events is not None:
+            return events
+
+        cache_file = os.path.join(
+            CACHE_DIR,
+            'audit-events',
+            hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+        try:
+            with open(cache_file) as f:
+                events = json.load(f)
+            logger.info('Loaded audit events from %s', cache_file)
+
+        except (OSError, ValueError):
+            events = None
+
+        if events is None:
+            logger.info('Loading audit-events.properties from %s', jar_file)
+
+            with zipfile.ZipFile(jar_file) as jar:
+                data = jar.read('audit-events.properties').decode('utf-8')
+
+            events = PKIServer.parse_audit_events(data.splitlines())
+
+            try:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+
+                tmp_file = '%s.%d' % (cache_file, os.getpid())
+                with open(tmp_file, 'w') as f:
+                    json.dump(events, f)
+                os.replace(tmp_file, cache_file)
+
+            except OSError as e:
+                logger.debug('Unable to store audit events in %s: %s', cache_file, e)
+
+        AUDIT_EVENTS[key] = events
+
+        return events
+
+    @staticmethod
+    def parse_audit_events(lines):
+        '''
+        This method parses the content of audit-events.properties
+        and return it as a map of objects.
+        '''
+
         events = {}
 
         event_pattern = re.compile(r'# Event: (\S+)')
@@ -1773,8 +1926,13 @@ class PKIDatabaseConnection(object):
         self.nssdb_password = None
 
         self.temp_dir = None
+        self.password_fd = None
         self.ldap = None
 
+        # pool that the connection is returned to on close()
+        self.pool = None
+        self.last_used = None
+
     def set_security_database(self, nssdb_dir=None):
         self.nssdb_dir = nssdb_dir
 
@@ -1785,33 +1943,254 @@ class PKIDatabaseConnection(object):
         self.client_cert_nickname = client_cert_nickname
         self.nssdb_password = nssdb_password
 
+    def get_key(self):
+        '''
+        Return the parameters that identify equivalent connections.
+        '''
+
+        return (
+            self.url,
+            self.nssdb_dir,
+            self.bind_dn,
+            self.bind_password,
+            self.client_cert_nickname,
+            self.nssdb_password)
+
     def open(self):
 
         self.temp_dir = tempfile.mkdtemp()
 
+        self.ldap = ldap.initialize(self.url)
+
+        # TLS options are set on the connection instead of globally so
+        # connections to different directories can coexist
+        tls = False
+
         if self.nssdb_dir:
-            ldap.set_option(ldap.OPT_X_TLS_CACERTDIR, self.nssdb_dir)
+            self.ldap.set_option(ldap.OPT_X_TLS_CACERTDIR, self.nssdb_dir)
+            tls = True
 
         if self.client_cert_nickname:
-            password_file = os.path.join(self.temp_dir, 'password.txt')
-            with open(password_file, 'w') as f:
-                f.write(self.nssdb_password)
+            result = pki.nssdb.create_memory_file('password.txt', self.nssdb_password)
 
-            ldap.set_option(ldap.OPT_X_TLS_CERTFILE, self.client_cert_nickname)
-            ldap.set_option(ldap.OPT_X_TLS_KEYFILE, password_file)
+            if result:
+                password_file, self.password_fd = result
 
-        self.ldap = ldap.initialize(self.url)
+            else:
+                password_file = os.path.join(self.temp_dir, 'password.txt')
+                with open(password_file, 'w') as f:
+                    f.write(self.nssdb_password)
+
+            self.ldap.set_option(ldap.OPT_X_TLS_CERTFILE, self.client_cert_nickname)
+            self.ldap.set_option(ldap.OPT_X_TLS_KEYFILE, password_file)
+            tls = True
+
+        if tls:
+            # apply the TLS options to this connection
+            self.ldap.set_option(ldap.OPT_X_TLS_NEWCTX, 0)
 
         if self.bind_dn and self.bind_password:
             self.ldap.simple_bind_s(self.bind_dn, self.bind_password)
 
+        elif self.url.startswith('ldapi://'):
+            # autobind with the identity of the current user
+            self.ldap.sasl_interactive_bind_s('', ldap.sasl.external())
+
+        self.last_used = time.time()
+
+    def is_alive(self):
+        '''
+        Check whether the connection is still usable by reading the
+        root DSE.
+        '''
+
+        try:
+            self.ldap.search_s('', ldap.SCOPE_BASE, '(objectClass=*)', ['1.1'])
+            return True
+
+        except ldap.LDAPError as e:
+            logger.debug('Database connection to %s is not usable: %s', self.url, e)
+            return False
+
+    def search(self, base_dn, scope=ldap.SCOPE_SUBTREE,
+               search_filter='(objectClass=*)', attrs=None,
+               page_size=LDAP_PAGE_SIZE):
+        '''
+        Search the database and yield (dn, attrs) entries. The entries
+        are retrieved in pages with the Simple Paged Results control so
+        only one page is kept in memory. If the server does not support
+        the control, all entries are returned in a single page.
+
+        :param attrs: attributes to retrieve (default: all)
+        :param page_size: number of entries per page, or 0 to disable
+           paging
+        '''
+
+        if not page_size:
+            for dn, entry_attrs in self.ldap.search_s(
+                    base_dn, scope, search_filter, attrs):
+                if dn:
+                    yield dn, entry_attrs
+            return
+
+        control = ldap.controls.SimplePagedResultsControl(
+            criticality=False, size=page_size, cookie='')
+
+        while True:
+            msgid = self.ldap.search_ext(
+                base_dn, scope, search_filter, attrs,
+                serverctrls=[control])
+
+            _, entries, _, controls = self.ldap.result3(msgid)
+
+            for dn, entry_attrs in entries:
+                # skip search references
+                if dn:
+                    yield dn, entry_attrs
+
+            cookie = None
+            for c in controls:
+                if c.controlType == ldap.controls.SimplePagedResultsControl.controlType:
+                    cookie = c.cookie
+
+            if not cookie:
+                return
+
+            control.cookie = cookie
+
     def close(self):
+        '''
+        Return the connection to its pool, or disconnect if the
+        connection is not pooled.
+        '''
+
+        if self.pool:
+            self.pool.release(self)
+            return
+
+        self.disconnect()
+
+    def disconnect(self):
 
         if self.ldap:
-            self.ldap.unbind_s()
+            try:
+                self.ldap.unbind_s()
+            except ldap.LDAPError as e:
+                logger.debug('Unable to unbind from %s: %s', self.url, e)
+            self.ldap = None
+
+        if self.password_fd is not None:
+            os.close(self.password_fd)
+            self.password_fd = None
 
         if self.temp_dir:
             shutil.rmtree(self.temp_dir)
+            self.temp_dir = None
+
+
+class PKIDatabaseConnectionPool(object):
+    '''
+    Pool of idle database connections. A connection is reused if it has
+    the same URL, security database, and credentials. Connections that
+    have been idle for a while are checked before reuse, and connections
+    idle longer than the idle timeout are closed.
+    '''
+
+    def __init__(self, idle_timeout=60, check_interval=5, max_idle=4):
+        '''
+        :param idle_timeout: seconds before an idle connection is closed
+        :param check_interval: seconds of idleness after which a
+           connection is checked before reuse
+        :param max_idle: maximum number of idle connections per key
+        '''
+
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self.max_idle = max_idle
+
+        # idle connections indexed by PKIDatabaseConnection.get_key()
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def get_connection(self, connection):
+        '''
+        Return an idle connection equivalent to the specified unopened
+        connection, or open the specified connection.
+        '''
+
+        key = connection.get_key()
+
+        while True:
+            with self.lock:
+                self.evict()
+                idle = self.connections.get(key)
+                pooled = idle.pop() if idle else None
+
+            if not pooled:
+                break
+
+            if time.time() - pooled.last_used < self.check_interval or pooled.is_alive():
+                logger.debug('Reusing database connection to %s', pooled.url)
+                return pooled
+
+            pooled.pool = None
+            pooled.disconnect()
+
+        logger.debug('Opening database connection to %s', connection.url)
+        connection.open()
+        connection.pool = self
+
+        return connection
+
+    def release(self, connection):
+
+        with self.lock:
+            idle = self.connections.setdefault(connection.get_key(), [])
+
+            if any(c is connection for c in idle):
+                # connection closed more than once
+                return
+
+            connection.last_used = time.time()
+
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                connection = None
+
+            self.evict()
+
+        if connection:
+            connection.pool = None
+            connection.disconnect()
+
+    def evict(self):
+        '''
+        Close the connections that exceeded the idle timeout.
+        The lock must be held by the caller.
+        '''
+
+        deadline = time.time() - self.idle_timeout
+
+        for key in list(self.connections):
+            idle = self.connections[key]
+
+            for connection in [c for c in idle if c.last_used < deadline]:
+                idle.remove(connection)
+                connection.pool = None
+                connection.disconnect()
+
+            if not idle:
+                del self.connections[key]
+
+    def close(self):
+
+        with self.lock:
+            for idle in self.connections.values():
+                for connection in idle:
+                    connection.pool = None
+                    connection.disconnect()
+
+            self.connections.clear()
 
 
 class PKIServerException(pki.PKIException):
@@ -0,0 +1,574 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+from __future__ import absolute_import
+
+import base64
+import binascii
+import concurrent.futures
+import json
+import logging
+import os
+import re
+import time
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import utils
+
+# marker of signature records in signed audit logs
+SIGNATURE_EVENT = b'AUDIT_LOG_SIGNING'
+
+# version of the audit log index format
+INDEX_VERSION = 1
+
+# [dd/MMM/yyyy:HH:mm:ss zone] ... [AuditEvent=<name>][SubjectID=<ID>][Outcome=<outcome>]
+TIMESTAMP_PATTERN = re.compile(
+    rb'\[(\d{2})/(\w{3})/(\d{4}):(\d{2}:\d{2}:\d{2})[^\]]*\]')
+EVENT_PATTERN = re.compile(rb'\[AuditEvent=([^\]]*)\]')
+SUBJECT_PATTERN = re.compile(rb'\[SubjectID=([^\]]*)\]')
+OUTCOME_PATTERN = re.compile(rb'\[Outcome=([^\]]*)\]')
+
+MONTHS = {
+    b'Jan': '01', b'Feb': '02', b'Mar': '03', b'Apr': '04',
+    b'May': '05', b'Jun': '06', b'Jul': '07', b'Aug': '08',
+    b'Sep': '09', b'Oct': '10', b'Nov': '11', b'Dec': '12',
+}
+
+logger = logging.getLogger(__name__)
+
+
+def load_public_key(cert_data):
+    '''
+    Load the public key of the audit signing cert (DER).
+    '''
+
+    cert = x509.load_der_x509_certificate(cert_data, default_backend())
+    return cert.public_key()
+
+
+def verify_signature(public_key, digest, line):
+    '''
+    Verify the signature in an AUDIT_LOG_SIGNING record against the
+    SHA-256 digest of the records it covers. The signature algorithm
+    matches AuditVerify (SHA-256/RSA or SHA-256/EC).
+    '''
+
+    i = line.find(b'sig: ')
+    if i < 0:
+        return False
+
+    try:
+        signature = base64.b64decode(line[i + 5:].strip())
+    except (binascii.Error, ValueError):
+        return False
+
+    algorithm = utils.Prehashed(hashes.SHA256())
+
+    try:
+        if isinstance(public_key, rsa.RSAPublicKey):
+            public_key.verify(signature, digest, padding.PKCS1v15(), algorithm)
+
+        elif isinstance(public_key, ec.EllipticCurvePublicKey):
+            public_key.verify(signature, digest, ec.ECDSA(algorithm))
+
+        else:
+            raise Exception('Unsupported signing key type: %s' % type(public_key))
+
+    except InvalidSignature:
+        return False
+
+    return True
+
+
+def verify_audit_log_file(filename, cert_data, offset=0, start_line=1):
+    '''
+    Verify the signatures in a single audit log file starting from the
+    specified offset. Each signature covers the records since the previous
+    signature (inclusive), so only the signatures that are preceded by
+    another signature in the same file are verified here. The segment
+    before the first signature continues from the previous file and is
+    verified by verify_audit_logs().
+
+    This function runs in a separate process so it only takes and returns
+    picklable values.
+    '''
+
+    public_key = load_public_key(cert_data)
+
+    result = {
+        'filename': filename,
+        'records': 0,
+        'good': 0,
+        'bad': 0,
+        'failures': [],
+        'first': None,  # (offset, line number, record) of first signature
+        'last': None,  # (offset, line number) of last signature
+        'unsigned': 0,  # number of records after the last signature
+        'size': offset,
+    }
+
+    digest = None
+    sig_start_line = None
+    linenum = start_line - 1
+    pos = offset
+
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+
+        for line in f:
+
+            linenum += 1
+            line_offset = pos
+            pos += len(line)
+            result['records'] += 1
+
+            record = line.rstrip(b'\r\n')
+
+            if SIGNATURE_EVENT in record:
+
+                if digest is None:
+                    result['first'] = (line_offset, linenum, record)
+
+                elif verify_signature(public_key, digest.finalize(), record):
+                    result['good'] += 1
+
+                else:
+                    result['bad'] += 1
+                    result['failures'].append({
+                        'file': filename,
+                        'line': linenum,
+                        'start': (filename, sig_start_line),
+                        'stop': (filename, linenum - 1),
+                    })
+
+                digest = hashes.Hash(hashes.SHA256(), default_backend())
+                sig_start_line = linenum
+                result['last'] = (line_offset, linenum)
+                result['unsigned'] = 0
+
+            else:
+                result['unsigned'] += 1
+
+            if digest is not None:
+                digest.update(record + b'\n')
+
+        result['size'] = pos
+
+    return result
+
+
+def update_digest(digest, filename, start, end):
+    '''
+    Add the records between two offsets of an audit log file into a digest.
+    '''
+
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        pos = start
+
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            digest.update(line.rstrip(b'\r\n') + b'\n')
+
+
+def find_checkpoint_file(log_dir, log_files, checkpoint):
+    '''
+    Find the log file containing the checkpoint. The current log file is
+    renamed on rotation, so the file is identified by its inode.
+    '''
+
+    for filename in log_files:
+        path = os.path.join(log_dir, filename)
+        if os.stat(path).st_ino == checkpoint['inode']:
+            return filename
+
+    return None
+
+
+def load_checkpoint(checkpoint_file, log_dir, log_files, cert_data):
+    '''
+    Load the verification checkpoint and return the index of the log
+    file, the offset, and the line number where the verification should
+    resume, or None if the checkpoint is missing or no longer valid.
+    '''
+
+    if not checkpoint_file or not os.path.exists(checkpoint_file):
+        return None
+
+    with open(checkpoint_file) as f:
+        checkpoint = json.load(f)
+
+    fingerprint = hashes.Hash(hashes.SHA256(), default_backend())
+    fingerprint.update(cert_data)
+
+    if checkpoint.get('cert') != fingerprint.finalize().hex():
+        logger.info('Audit signing cert has changed, ignoring checkpoint')
+        return None
+
+    filename = find_checkpoint_file(log_dir, log_files, checkpoint)
+    if not filename:
+        logger.info('Audit log file %s no longer exists, ignoring checkpoint',
+                    checkpoint['file'])
+        return None
+
+    path = os.path.join(log_dir, filename)
+
+    # make sure the checkpoint still points to a signature record
+    with open(path, 'rb') as f:
+        f.seek(checkpoint['offset'])
+        line = f.readline()
+
+    if SIGNATURE_EVENT not in line:
+        logger.info('Audit log file %s has changed, ignoring checkpoint', filename)
+        return None
+
+    logger.info('Resuming from %s:%s', filename, checkpoint['line'])
+
+    return log_files.index(filename), checkpoint['offset'], checkpoint['line']
+
+
+def store_checkpoint(checkpoint_file, log_dir, filename, offset, line, cert_data):
+    '''
+    Store the location of the last verified signature.
+    '''
+
+    fingerprint = hashes.Hash(hashes.SHA256(), default_backend())
+    fingerprint.update(cert_data)
+
+    checkpoint = {
+        'cert': fingerprint.finalize().hex(),
+        'file': filename,
+        'inode': os.stat(os.path.join(log_dir, filename)).st_ino,
+        'offset': offset,
+        'line': line,
+    }
+
+    tmp_file = checkpoint_file + '.tmp'
+
+    with open(tmp_file, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_file, checkpoint_file)
+
+
+def verify_audit_logs(log_dir, log_files, cert_data,
+                      checkpoint_file=None, workers=None):
+    '''
+    Verify signed audit log files with the audit signing cert (DER).
+
+    Each file is verified in a separate process. The records that span
+    two files are verified once all files have been processed. If a
+    checkpoint file is specified, the verification resumes from the last
+    verified signature and the checkpoint is updated at the end if all
+    signatures are valid.
+
+    Returns a dict with the number of valid and invalid signatures,
+    the failures, the number of records, and the elapsed time.
+    '''
+
+    start_time = time.time()
+
+    start_index = 0
+    offset = 0
+    start_line = 1
+
+    checkpoint = load_checkpoint(checkpoint_file, log_dir, log_files, cert_data)
+    if checkpoint:
+        start_index, offset, start_line = checkpoint
+
+    tasks = []
+    for i in range(start_index, len(log_files)):
+        path = os.path.join(log_dir, log_files[i])
+        if i == start_index:
+            tasks.append((path, offset, start_line))
+        else:
+            tasks.append((path, 0, 1))
+
+    if len(tasks) > 1 and workers != 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(verify_audit_log_file, path, cert_data, o, l)
+                for path, o, l in tasks
+            ]
+            results = [future.result() for future in futures]
+
+    else:
+        results = [
+            verify_audit_log_file(path, cert_data, o, l)
+            for path, o, l in tasks
+        ]
+
+    public_key = load_public_key(cert_data)
+
+    report = {
+        'good': 0,
+        'bad': 0,
+        'failures': [],
+        'records': 0,
+        'unsigned': None,
+    }
+
+    # records since the last signature as (filename, start, end),
+    # or None before the first signature of the log series
+    pending = None
+    sig_start = None
+    last_sig = None
+    unsigned = 0
+
+    for (path, start, _), result in zip(tasks, results):
+
+        report['records'] += result['records']
+
+        if not result['first']:
+            # no signature in this file
+            if pending is not None:
+                pending.append((path, start, result['size']))
+            unsigned += result['unsigned']
+            continue
+
+        first_offset, first_line, record = result['first']
+
+        if pending is None:
+            logger.info('Ignoring first signature of log series at %s:%s',
+                        path, first_line)
+
+        else:
+            # verify the records that continue from the previous file
+            digest = hashes.Hash(hashes.SHA256(), default_backend())
+            for filename, s, e in pending + [(path, start, first_offset)]:
+                update_digest(digest, filename, s, e)
+
+            if verify_signature(public_key, digest.finalize(), record):
+                report['good'] += 1
+            else:
+                report['bad'] += 1
+                report['failures'].append({
+                    'file': path,
+                    'line': first_line,
+                    'start': sig_start,
+                    'stop': (path, first_line - 1),
+                })
+
+        report['good'] += result['good']
+        report['bad'] += result['bad']
+        report['failures'].extend(result['failures'])
+
+        last_offset, last_line = result['last']
+        pending = [(path, last_offset, result['size'])]
+        sig_start = (path, last_line)
+        last_sig = (path, last_offset, last_line)
+        unsigned = result['unsigned']
+
+    if last_sig and unsigned:
+        report['unsigned'] = (last_sig[0], last_sig[2])
+
+    # don't move the checkpoint past invalid signatures
+    if checkpoint_file and last_sig and not report['bad']:
+        filename = os.path.basename(last_sig[0])
+        store_checkpoint(
+            checkpoint_file, log_dir, filename, last_sig[1], last_sig[2], cert_data)
+
+    report['elapsed'] = time.time() - start_time
+
+    return report
+
+
+def parse_audit_record(record):
+    '''
+    Parse the timestamp, event name, subject ID, and outcome of an audit
+    log record. The timestamp is returned in ISO 8601 format (without
+    the time zone) so that it can be compared as a string. Returns None
+    if the record is not an audit event.
+    '''
+
+    match = EVENT_PATTERN.search(record)
+    if not match:
+        return None
+
+    event = match.group(1).decode('utf-8', 'replace')
+
+    timestamp = None
+    match = TIMESTAMP_PATTERN.search(record)
+    if match:
+        day, month, year, t = match.groups()
+        timestamp = '%s-%s-%sT%s' % (
+            year.decode(), MONTHS.get(month, '00'), day.decode(), t.decode())
+
+    subject = None
+    match = SUBJECT_PATTERN.search(record)
+    if match:
+        subject = match.group(1).decode('utf-8', 'replace')
+
+    outcome = None
+    match = OUTCOME_PATTERN.search(record)
+    if match:
+        outcome = match.group(1).decode('utf-8', 'replace')
+
+    return timestamp, event, subject, outcome
+
+
+def index_audit_log_file(path, index=None):
+    '''
+    Create or update the index of an audit log file. The index contains
+    the offset, line number, timestamp, event name, subject ID, and outcome
+    of each audit event in the file.
+
+    Audit log files are only appended to, so if the file is still the
+    same (i.e. same inode and not truncated) only the records added since
+    the index was created are scanned. Returns the index and whether it
+    has been modified.
+    '''
+
+    st = os.stat(path)
+
+    if index and (index.get('version') != INDEX_VERSION or
+                  index['inode'] != st.st_ino or
+                  index['size'] > st.st_size):
+        logger.info('Rebuilding index of %s', path)
+        index = None
+
+    if index and index['size'] == st.st_size:
+        return index, False
+
+    if not index:
+        index = {
+            'version': INDEX_VERSION,
+            'inode': st.st_ino,
+            'size': 0,
+            'lines': 0,
+            'start': None,
+            'end': None,
+            'entries': [],
+        }
+
+    entries = index['entries']
+    linenum = index['lines']
+    pos = index['size']
+
+    with open(path, 'rb') as f:
+        f.seek(pos)
+
+        for line in f:
+
+            if not line.endswith(b'\n'):
+                # incomplete record, index it next time
+                break
+
+            offset = pos
+            pos += len(line)
+            linenum += 1
+
+            fields = parse_audit_record(line)
+            if not fields:
+                continue
+
+            timestamp = fields[0]
+            entries.append([offset, linenum] + list(fields))
+
+            if timestamp:
+                if not index['start'] or timestamp < index['start']:
+                    index['start'] = timestamp
+                if not index['end'] or timestamp > index['end']:
+                    index['end'] = timestamp
+
+    index['size'] = pos
+    index['lines'] = linenum
+
+    return index, True
+
+
+def load_audit_log_index(path, index_file):
+    '''
+    Load the index of an audit log file from the index file, update it
+    if the log file has changed, and store it back.
+    '''
+
+    index = None
+
+    if index_file:
+        try:
+            with open(index_file) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    index, modified = index_audit_log_file(path, index)
+
+    if index_file and modified:
+        try:
+            os.makedirs(os.path.dirname(index_file), exist_ok=True)
+
+            tmp_file = '%s.%d' % (index_file, os.getpid())
+            with open(tmp_file, 'w') as f:
+                json.dump(index, f, separators=(',', ':'))
+            os.replace(tmp_file, index_file)
+
+        except OSError as e:
+            logger.warning('Unable to store audit log index %s: %s', index_file, e)
+
+    return index
+
+
+def find_audit_records(log_dir, log_files, index_dir=None,
+                       event=None, subject=None, outcome=None,
+                       start=None, end=None):
+    '''
+    Find audit log records matching the specified event name, subject ID,
+    outcome, and time range (ISO 8601 timestamps, inclusive). A timestamp
+    without time (e.g. 2020-01-01) matches the whole day at the end of the
+    range.
+
+    Each log file is indexed into <index_dir>/<filename>.json so that
+    subsequent searches only read the matching records. This is a
+    generator that yields (filename, line number, record) in log order.
+    '''
+
+    if end and 'T' not in end:
+        end = end + 'T23:59:59'
+
+    for filename in log_files:
+
+        path = os.path.join(log_dir, filename)
+        index_file = os.path.join(index_dir, filename + '.json') if index_dir else None
+
+        index = load_audit_log_index(path, index_file)
+
+        # skip files outside the time range
+        if start and index['end'] and index['end'] < start:
+            continue
+        if end and index['start'] and index['start'] > end:
+            continue
+
+        entries = [
+            entry for entry in index['entries']
+            if (not event or entry[3] == event) and
+            (not subject or entry[4] == subject) and
+            (not outcome or entry[5] and entry[5].lower() == outcome.lower()) and
+            (not start or entry[2] and entry[2] >= start) and
+            (not end or entry[2] and entry[2] <= end)
+        ]
+
+        if not entries:
+            continue
+
+        logger.info('Reading %s matching records from %s', len(entries), filename)
+
+        with open(path, 'rb') as f:
+            for entry in entries:
+                f.seek(entry[0])
+                record = f.readline().rstrip(b'\r\n')
+                yield filename, entry[1], record.decode('utf-8', 'replace')
@@ -27,35 +27,43 @@ import sys
 
 import pki.cli
 import pki.server
-import pki.server.cli.acme
-import pki.server.cli.audit
-import pki.server.cli.banner
-import pki.server.cli.ca
-import pki.server.cli.cert
-import pki.server.cli.config
-import pki.server.cli.db
-import pki.server.cli.http
-import pki.server.cli.instance
-import pki.server.cli.jss
-import pki.server.cli.kra
-import pki.server.cli.listener
-import pki.server.cli.migrate
-import pki.server.cli.nss
-import pki.server.cli.nuxwdog
-import pki.server.cli.ocsp
-import pki.server.cli.password
-import pki.server.cli.sd
-import pki.server.cli.selftest
-import pki.server.cli.subsystem
-import pki.server.cli.tks
-import pki.server.cli.tps
-import pki.server.cli.upgrade
-import pki.server.cli.webapp
 import pki.server.instance
 import pki.util
 
 logger = logging.getLogger(__name__)
 
+# CLI modules that are imported on first use:
+# (name, description, Python module, class)
+MODULES = [
+    ('http', 'HTTP management commands', 'pki.server.cli.http', 'HTTPCLI'),
+    ('listener', 'Listener management commands', 'pki.server.cli.listener', 'ListenerCLI'),
+
+    ('password', 'Password management commands', 'pki.server.cli.password', 'PasswordCLI'),
+    ('nss', 'NSS management commands', 'pki.server.cli.nss', 'NSSCLI'),
+    ('jss', 'JSS management commands', 'pki.server.cli.jss', 'JSSCLI'),
+
+    ('webapp', 'Webapp management commands', 'pki.server.cli.webapp', 'WebappCLI'),
+
+    ('sd', 'Security domain management commands', 'pki.server.cli.sd', 'SDCLI'),
+    ('ca', 'CA management commands', 'pki.server.cli.ca', 'CACLI'),
+    ('kra', 'KRA management commands', 'pki.server.cli.kra', 'KRACLI'),
+    ('ocsp', 'OCSP management commands', 'pki.server.cli.ocsp', 'OCSPCLI'),
+    ('tks', 'TKS management commands', 'pki.server.cli.tks', 'TKSCLI'),
+    ('tps', 'TPS management commands', 'pki.server.cli.tps', 'TPSCLI'),
+    ('acme', 'ACME management commands', 'pki.server.cli.acme', 'ACMECLI'),
+
+    ('banner', 'Banner management commands', 'pki.server.cli.banner', 'BannerCLI'),
+    ('db', 'Database management commands', 'pki.server.cli.db', 'DBCLI'),
+    ('instance', 'Instance management commands', 'pki.server.cli.instance', 'InstanceCLI'),
+    ('subsystem', 'Subsystem management commands', 'pki.server.cli.subsystem', 'SubsystemCLI'),
+    ('migrate', 'Migrate system', 'pki.server.cli.migrate', 'MigrateCLI'),
+    ('nuxwdog', 'Nuxwdog related commands', 'pki.server.cli.nuxwdog', 'NuxwdogCLI'),
+    ('cert', 'System certificate management commands', 'pki.server.cli.cert', 'CertCLI'),
+    ('selftest', 'Selftest management commands', 'pki.server.cli.selftest', 'SelfTestCLI'),
+
+    ('upgrade', 'Upgrade PKI server', 'pki.server.cli.upgrade', 'UpgradeCLI'),
+]
+
 
 class PKIServerCLI(pki.cli.CLI):
 
@@ -71,33 +79,8 @@ class PKIServerCLI(pki.cli.CLI):
         self.add_module(pki.server.cli.RestartCLI())
         self.add_module(pki.server.cli.RunCLI())
 
-        self.add_module(pki.server.cli.http.HTTPCLI())
-        self.add_module(pki.server.cli.listener.ListenerCLI())
-
-        self.add_module(pki.server.cli.password.PasswordCLI())
-        self.add_module(pki.server.cli.nss.NSSCLI())
-        self.add_module(pki.server.cli.jss.JSSCLI())
-
-        self.add_module(pki.server.cli.webapp.WebappCLI())
-
-        self.add_module(pki.server.cli.sd.SDCLI())
-        self.add_module(pki.server.cli.ca.CACLI())
-        self.add_module(pki.server.cli.kra.KRACLI())
-        self.add_module(pki.server.cli.ocsp.OCSPCLI())
-        self.add_module(pki.server.cli.tks.TKSCLI())
-        self.add_module(pki.server.cli.tps.TPSCLI())
-        self.add_module(pki.server.cli.acme.ACMECLI())
-
-        self.add_module(pki.server.cli.banner.BannerCLI())
-        self.add_module(pki.server.cli.db.DBCLI())
-        self.add_module(pki.server.cli.instance.InstanceCLI())
-        self.add_module(pki.server.cli.subsystem.SubsystemCLI())
-        self.add_module(pki.server.cli.migrate.MigrateCLI())
-        self.add_module(pki.server.cli.nuxwdog.NuxwdogCLI())
-        self.add_module(pki.server.cli.cert.CertCLI())
-        self.add_module(pki.server.cli.selftest.SelfTestCLI())
-
-        self.add_module(pki.server.cli.upgrade.UpgradeCLI())
+        for name, description, module_name, class_name in MODULES:
+            self.add_module(pki.cli.LazyModule(name, description, module_name, class_name))
 
     def get_full_module_name(self, module_name):
         return module_name
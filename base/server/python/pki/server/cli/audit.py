@@ -21,6 +21,7 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import base64
 import getopt
 import logging
 import os
@@ -30,6 +31,7 @@ import sys
 import tempfile
 
 import pki.cli
+import pki.server.audit
 import pki.server.instance
 
 logger = logging.getLogger(__name__)
@@ -50,6 +52,7 @@ class AuditCLI(pki.cli.CLI):
         self.add_module(AuditEventUpdateCLI(self))
         self.add_module(AuditFileFindCLI(self))
         self.add_module(AuditFileVerifyCLI(self))
+        self.add_module(AuditLogFindCLI(self))
 
     @staticmethod
     def print_audit_config(subsystem):
@@ -842,6 +845,12 @@ class AuditFileVerifyCLI(pki.cli.CLI):
         print('Usage: pki-server %s-audit-file-verify [OPTIONS]' % self.parent.parent.name)
         print()
         print('  -i, --instance <instance ID>       Instance ID (default: pki-tomcat).')
+        print('      --incremental                  Only verify records added since the last')
+        print('                                     verified signature.')
+        print('      --checkpoint <path>            Checkpoint file for incremental verification')
+        print('                                     (default: <subsystem>/audit-verify.json).')
+        print('      --workers <number>             Number of processes used to verify log files')
+        print('                                     (default: number of CPUs).')
         print('  -v, --verbose                      Run in verbose mode.')
         print('      --debug                        Run in debug mode.')
         print('      --help                         Show help message.')
@@ -851,7 +860,7 @@ class AuditFileVerifyCLI(pki.cli.CLI):
 
         try:
             opts, _ = getopt.gnu_getopt(argv, 'i:v', [
-                'instance=',
+                'instance=', 'incremental', 'checkpoint=', 'workers=',
                 'verbose', 'debug', 'help'])
 
         except getopt.GetoptError as e:
@@ -860,11 +869,31 @@ class AuditFileVerifyCLI(pki.cli.CLI):
             sys.exit(1)
 
         instance_name = 'pki-tomcat'
+        incremental = False
+        checkpoint_file = None
+        workers = None
 
         for o, a in opts:
             if o in ('-i', '--instance'):
                 instance_name = a
 
+            elif o == '--incremental':
+                incremental = True
+
+            elif o == '--checkpoint':
+                checkpoint_file = a
+
+            elif o == '--workers':
+                try:
+                    workers = int(a)
+                except ValueError:
+                    workers = 0
+
+                if workers < 1:
+                    logger.error('Invalid number of workers: %s', a)
+                    self.print_help()
+                    sys.exit(1)
+
             elif o == '--debug':
                 logging.getLogger().setLevel(logging.DEBUG)
 
@@ -898,6 +927,19 @@ class AuditFileVerifyCLI(pki.cli.CLI):
         log_files = subsystem.get_audit_log_files()
         signing_cert = subsystem.get_subsystem_cert('audit_signing')
 
+        if incremental or checkpoint_file or workers:
+
+            if incremental and not checkpoint_file:
+                checkpoint_file = os.path.join(subsystem.base_dir, 'audit-verify.json')
+
+            self.verify(
+                log_dir,
+                log_files,
+                signing_cert,
+                checkpoint_file=checkpoint_file,
+                workers=workers)
+            return
+
         tmpdir = tempfile.mkdtemp()
 
         try:
@@ -924,3 +966,163 @@ class AuditFileVerifyCLI(pki.cli.CLI):
 
         finally:
             shutil.rmtree(tmpdir)
+
+    def verify(self, log_dir, log_files, signing_cert, checkpoint_file=None, workers=None):
+        '''
+        Verify audit log files in-process using a process pool.
+        '''
+
+        cert_data = base64.b64decode(signing_cert['data'])
+
+        report = pki.server.audit.verify_audit_logs(
+            log_dir,
+            log_files,
+            cert_data,
+            checkpoint_file=checkpoint_file,
+            workers=workers)
+
+        last_file = None
+
+        for failure in report['failures']:
+
+            if failure['file'] != last_file:
+                print('======\nFile: %s\n======' % failure['file'])
+                last_file = failure['file']
+
+            print('Line %s: VERIFICATION FAILED: signature of %s:%s to %s:%s' % (
+                failure['line'],
+                failure['start'][0], failure['start'][1],
+                failure['stop'][0], failure['stop'][1]))
+
+        if report['unsigned']:
+            print('ERROR: log entries after %s:%s are UNSIGNED' % report['unsigned'])
+            report['bad'] += 1
+
+        elapsed = report['elapsed']
+        rate = report['records'] / elapsed if elapsed else 0
+
+        print()
+        print('Verification process complete.')
+        print('Valid signatures: %s' % report['good'])
+        print('Invalid signatures: %s' % report['bad'])
+        print('Records verified: %s' % report['records'])
+        print('Throughput: %d records/s' % rate)
+
+        if report['bad']:
+            sys.exit(2)
+
+
+class AuditLogFindCLI(pki.cli.CLI):
+
+    def __init__(self, parent):
+        super().__init__('log-find', 'Find audit log records')
+
+        self.parent = parent
+
+    def print_help(self):
+        print('Usage: pki-server %s-audit-log-find [OPTIONS]' % self.parent.parent.name)
+        print()
+        print('  -i, --instance <instance ID>       Instance ID (default: pki-tomcat).')
+        print('      --event <name>                 Event name.')
+        print('      --subject <ID>                 Subject ID.')
+        print('      --outcome <outcome>            Outcome: Success, Failure.')
+        print('      --start <timestamp>            Start time (YYYY-MM-DD[THH:MM:SS]).')
+        print('      --end <timestamp>              End time (YYYY-MM-DD[THH:MM:SS]).')
+        print('      --index-dir <path>             Directory for audit log indexes')
+        print('                                     (default: ~/.cache/pki/audit-index).')
+        print('  -v, --verbose                      Run in verbose mode.')
+        print('      --debug                        Run in debug mode.')
+        print('      --help                         Show help message.')
+        print()
+
+    def execute(self, argv):
+
+        try:
+            opts, _ = getopt.gnu_getopt(argv, 'i:v', [
+                'instance=', 'event=', 'subject=', 'outcome=',
+                'start=', 'end=', 'index-dir=',
+                'verbose', 'debug', 'help'])
+
+        except getopt.GetoptError as e:
+            logger.error(e)
+            self.print_help()
+            sys.exit(1)
+
+        instance_name = 'pki-tomcat'
+        event = None
+        subject = None
+        outcome = None
+        start = None
+        end = None
+        index_dir = None
+
+        for o, a in opts:
+            if o in ('-i', '--instance'):
+                instance_name = a
+
+            elif o == '--event':
+                event = a
+
+            elif o == '--subject':
+                subject = a
+
+            elif o == '--outcome':
+                outcome = a
+
+            elif o == '--start':
+                start = a
+
+            elif o == '--end':
+                end = a
+
+            elif o == '--index-dir':
+                index_dir = a
+
+            elif o == '--debug':
+                logging.getLogger().setLevel(logging.DEBUG)
+
+            elif o in ('-v', '--verbose'):
+                logging.getLogger().setLevel(logging.INFO)
+
+            elif o == '--help':
+                self.print_help()
+                sys.exit()
+
+            else:
+                logger.error('Unknown option: %s', o)
+                self.print_help()
+                sys.exit(1)
+
+        instance = pki.server.instance.PKIServerFactory.create(instance_name)
+        if not instance.exists():
+            logger.error('Invalid instance %s.', instance_name)
+            sys.exit(1)
+
+        instance.load()
+
+        subsystem_name = self.parent.parent.name
+        subsystem = instance.get_subsystem(subsystem_name)
+        if not subsystem:
+            logger.error('No %s subsystem in instance %s.',
+                         subsystem_name.upper(), instance_name)
+            sys.exit(1)
+
+        if not index_dir:
+            index_dir = os.path.join(
+                pki.server.CACHE_DIR, 'audit-index', instance.name, subsystem.name)
+
+        log_dir = subsystem.get_audit_log_dir()
+        log_files = subsystem.get_audit_log_files()
+
+        records = pki.server.audit.find_audit_records(
+            log_dir,
+            log_files,
+            index_dir=index_dir,
+            event=event,
+            subject=subject,
+            outcome=outcome,
+            start=start,
+            end=end)
+
+        for filename, linenum, record in records:
+            print('%s:%s: %s' % (filename, linenum, record))
@@ -22,6 +22,7 @@ from __future__ import absolute_import
 from __future__ import print_function
 import getopt
 import io
+import json
 import logging
 import os
 import shutil
@@ -336,6 +337,10 @@ class CACertRequestFindCLI(pki.cli.CLI):
         print('  -i, --instance <instance ID>       Instance ID (default: pki-tomcat).')
         print('      --cert                         Issued certificate.')
         print('      --cert-file                    File containing issued certificate.')
+        print('      --page-size <size>             Number of requests retrieved per page '
+              '(default: %d).' % pki.server.LDAP_PAGE_SIZE)
+        print('      --output-format <format>       Output format: text (default), jsonl.')
+        print('      --output-file <file_name>      Save requests in file (jsonl format only).')
         print('  -v, --verbose                      Run in verbose mode.')
         print('      --debug                        Run in debug mode.')
         print('      --help                         Show help message.')
@@ -345,7 +350,8 @@ class CACertRequestFindCLI(pki.cli.CLI):
 
         try:
             opts, _ = getopt.gnu_getopt(argv, 'i:v', [
-                'instance=', 'cert=', 'cert-file=',
+                'instance=', 'cert=', 'cert-file=', 'page-size=',
+                'output-format=', 'output-file=',
                 'verbose', 'debug', 'help'])
 
         except getopt.GetoptError as e:
@@ -355,6 +361,9 @@ class CACertRequestFindCLI(pki.cli.CLI):
 
         instance_name = 'pki-tomcat'
         cert = None
+        page_size = None
+        output_format = 'text'
+        output_file = None
 
         for o, a in opts:
             if o in ('-i', '--instance'):
@@ -367,6 +376,15 @@ class CACertRequestFindCLI(pki.cli.CLI):
                 with io.open(a, 'rb') as f:
                     cert = f.read()
 
+            elif o == '--page-size':
+                page_size = int(a)
+
+            elif o == '--output-format':
+                output_format = a
+
+            elif o == '--output-file':
+                output_file = a
+
             elif o in ('-v', '--verbose'):
                 logging.getLogger().setLevel(logging.INFO)
 
@@ -382,6 +400,16 @@ class CACertRequestFindCLI(pki.cli.CLI):
                 self.print_help()
                 sys.exit(1)
 
+        if output_format not in ['text', 'jsonl']:
+            logger.error('Invalid output format: %s', output_format)
+            self.print_help()
+            sys.exit(1)
+
+        if output_file and output_format != 'jsonl':
+            logger.error('--output-file requires --output-format jsonl')
+            self.print_help()
+            sys.exit(1)
+
         instance = pki.server.instance.PKIServerFactory.create(instance_name)
         if not instance.exists():
             logger.error('Invalid instance: %s', instance_name)
@@ -394,7 +422,18 @@ class CACertRequestFindCLI(pki.cli.CLI):
             logger.error('No CA subsystem in instance %s', instance_name)
             sys.exit(1)
 
-        results = subsystem.find_cert_requests(cert=cert)
+        results = subsystem.iter_cert_requests(cert=cert, page_size=page_size)
+
+        if output_format == 'jsonl':
+            # stream one JSON object per line
+            if output_file:
+                with io.open(output_file, 'w', encoding='utf-8') as f:
+                    self.export_requests(results, f)
+            else:
+                self.export_requests(results, sys.stdout)
+            return
+
+        results = list(results)
 
         self.print_message('%s entries matched' % len(results))
 
@@ -407,6 +446,17 @@ class CACertRequestFindCLI(pki.cli.CLI):
 
             CACertRequestCLI.print_request(request)
 
+    @staticmethod
+    def export_requests(results, out):
+
+        count = 0
+        for request in results:
+            out.write(json.dumps(request))
+            out.write('\n')
+            count += 1
+
+        logger.info('Exported %d requests', count)
+
 
 class CACertRequestShowCLI(pki.cli.CLI):
 
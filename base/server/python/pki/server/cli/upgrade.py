@@ -42,8 +42,11 @@ class UpgradeCLI(pki.cli.CLI):
         print('  --status                       Show upgrade status only. Do not perform upgrade.')
         print('  --revert                       Revert the last version.')
         print('  --validate                     Validate upgrade status.')
+        print('  --batch                        Store each subsystem config once at the end.')
         print()
         print('  -i, --instance <instance>      Upgrade a specific instance only.')
+        print('      --workers <number>         Number of instances upgraded concurrently '
+              '(default: 1).')
         print()
         print('  -X                             Show advanced options.')
         print('  -v, --verbose                  Run in verbose mode.')
@@ -63,7 +66,7 @@ class UpgradeCLI(pki.cli.CLI):
         try:
             opts, args = getopt.gnu_getopt(argv, 'hi:s:t:vX', [
                 'instance=',
-                'status', 'revert', 'validate',
+                'status', 'revert', 'validate', 'batch', 'workers=',
                 'remove-tracker', 'reset-tracker', 'set-tracker=',
                 'verbose', 'debug', 'help'])
 
@@ -77,6 +80,8 @@ class UpgradeCLI(pki.cli.CLI):
         status = False
         revert = False
         validate = False
+        batch = False
+        workers = 1
 
         remove_tracker = False
         reset_tracker = False
@@ -96,6 +101,12 @@ class UpgradeCLI(pki.cli.CLI):
             elif o == '--validate':
                 validate = True
 
+            elif o == '--batch':
+                batch = True
+
+            elif o == '--workers':
+                workers = int(a)
+
             elif o == '--remove-tracker':
                 remove_tracker = True
 
@@ -140,6 +151,11 @@ class UpgradeCLI(pki.cli.CLI):
         else:
             instances = pki.server.instance.PKIInstance.instances()
 
+            if not (status or revert or validate or remove_tracker or reset_tracker or
+                    tracker_version is not None):
+                self.upgrade_instances(instances, batch=batch, workers=workers)
+                return
+
         for instance in instances:
             self.upgrade(
                 instance,
@@ -148,12 +164,15 @@ class UpgradeCLI(pki.cli.CLI):
                 validate,
                 remove_tracker,
                 reset_tracker,
-                tracker_version)
+                tracker_version,
+                batch=batch)
 
     def upgrade(self, instance, status, revert, validate,
-                remove_tracker, reset_tracker, tracker_version):
+                remove_tracker, reset_tracker, tracker_version, batch=False):
 
-        upgrader = pki.server.upgrade.PKIServerUpgrader(instance=instance)
+        upgrader = pki.server.upgrade.PKIServerUpgrader(
+            instance=instance,
+            batch=batch)
 
         if status:
             upgrader.status()
@@ -176,3 +195,78 @@ class UpgradeCLI(pki.cli.CLI):
         else:
             logger.info('Upgrading PKI server %s', instance)
             upgrader.upgrade()
+            self.print_timings(upgrader)
+
+    def upgrade_instances(self, instances, batch=False, workers=1):
+
+        results = {}
+        pending = []
+
+        # plan the upgrade path of each instance before upgrading
+        for instance in instances:
+
+            upgrader = pki.server.upgrade.PKIServerUpgrader(instance=instance)
+            current_version, target_version, count = upgrader.plan()
+
+            if current_version == target_version:
+                logger.info('%s is up to date', instance)
+                results[instance.name] = {
+                    'instance': instance.name,
+                    'from_version': str(current_version),
+                    'to_version': str(current_version),
+                    'scriptlets': 0,
+                    'status': 'UP-TO-DATE',
+                    'elapsed': 0,
+                }
+                continue
+
+            logger.info(
+                'Upgrading %s from %s to %s with %d scriptlet(s)',
+                instance, current_version, target_version, count)
+
+            pending.append(instance.name)
+
+        for result in pki.server.upgrade.upgrade_instances(
+                pending, batch=batch, workers=workers):
+            results[result['instance']] = result
+
+        self.print_results([results[instance.name] for instance in instances])
+
+        if any(result['status'] == 'FAILED' for result in results.values()):
+            sys.exit(1)
+
+    @staticmethod
+    def print_results(results):
+
+        print('%-20s %-10s %-10s %10s %10s  %s' % (
+            'Instance', 'From', 'To', 'Scriptlets', 'Time', 'Status'))
+
+        for result in results:
+            print('%-20s %-10s %-10s %10d %9.3fs  %s' % (
+                result['instance'],
+                result['from_version'] or '-',
+                result['to_version'] or '-',
+                result['scriptlets'],
+                result['elapsed'],
+                result['status']))
+
+        for result in results:
+            if result.get('error'):
+                print()
+                print('%s: %s' % (result['instance'], result['error']))
+
+    @staticmethod
+    def print_timings(upgrader):
+
+        if not upgrader.timings:
+            return
+
+        print('Upgrade scripts:')
+
+        total = 0
+        for scriptlet, elapsed in upgrader.timings:
+            print('  %s-%s: %s (%.3f s)' % (
+                scriptlet.version, scriptlet.index, scriptlet.message, elapsed))
+            total += elapsed
+
+        print('Total time: %.3f s' % total)
@@ -20,8 +20,11 @@
 
 from __future__ import absolute_import
 import binascii
+import concurrent.futures
 import logging
+import os
 import re
+import time
 
 import pki.encoder
 import pki.nssdb
@@ -90,6 +93,7 @@ class PkiScriptlet(pkiscriptlet.AbstractBasePkiScriptlet):
         cert_id = deployer.get_cert_id(subsystem, tag)
 
         logger.info('Generating %s CSR in %s', cert_id, csr_path)
+        start_time = time.time()
 
         subject_dn = deployer.mdict['pki_%s_subject_dn' % cert_id]
 
@@ -141,6 +145,8 @@ class PkiScriptlet(pkiscriptlet.AbstractBasePkiScriptlet):
 
         subsystem.config['%s.%s.certreq' % (subsystem.name, tag)] = b64_csr
 
+        logger.info('Generated %s CSR in %.2f s', cert_id, time.time() - start_time)
+
     def generate_ca_signing_csr(self, deployer, subsystem):
 
         csr_path = deployer.mdict.get('pki_ca_signing_csr_path')
@@ -452,23 +458,91 @@ class PkiScriptlet(pkiscriptlet.AbstractBasePkiScriptlet):
         finally:
             nssdb.close()
 
+    def get_keygen_workers(self, deployer, subsystem, count):
+        """
+        Return the number of CSRs that can be generated concurrently.
+        """
+
+        workers = deployer.mdict.get('pki_keygen_workers')
+
+        if workers:
+            workers = int(workers)
+
+        elif config.str2bool(deployer.mdict['pki_hsm_enable']):
+            # not all HSMs support concurrent key generation sessions
+            workers = 1
+
+        else:
+            workers = os.cpu_count() or 1
+
+        workers = min(workers, count)
+
+        if workers <= 1:
+            return 1
+
+        # only the SQL database supports access from multiple processes
+        nssdb = pki.nssdb.NSSDatabase(directory=subsystem.instance.nssdb_dir)
+
+        try:
+            dbtype = nssdb.get_dbtype()
+        finally:
+            nssdb.close()
+
+        if dbtype != 'sql':
+            logger.info('Generating CSRs sequentially in %s database', dbtype)
+            return 1
+
+        return workers
+
     def generate_system_cert_requests(self, deployer, subsystem):
 
+        generators = []
+
         if subsystem.name == 'ca':
-            self.generate_ca_signing_csr(deployer, subsystem)
+            generators.append(self.generate_ca_signing_csr)
 
         if subsystem.name in ['kra', 'ocsp', 'tks', 'tps']:
-            self.generate_sslserver_csr(deployer, subsystem)
-            self.generate_subsystem_csr(deployer, subsystem)
-            self.generate_audit_signing_csr(deployer, subsystem)
-            self.generate_admin_csr(deployer, subsystem)
+            generators.append(self.generate_sslserver_csr)
+            generators.append(self.generate_subsystem_csr)
+            generators.append(self.generate_audit_signing_csr)
+            generators.append(self.generate_admin_csr)
 
         if subsystem.name == 'kra':
-            self.generate_kra_storage_csr(deployer, subsystem)
-            self.generate_kra_transport_csr(deployer, subsystem)
+            generators.append(self.generate_kra_storage_csr)
+            generators.append(self.generate_kra_transport_csr)
 
         if subsystem.name == 'ocsp':
-            self.generate_ocsp_signing_csr(deployer, subsystem)
+            generators.append(self.generate_ocsp_signing_csr)
+
+        workers = self.get_keygen_workers(deployer, subsystem, len(generators))
+
+        if workers == 1:
+            for generator in generators:
+                generator(deployer, subsystem)
+            return
+
+        logger.info('Generating CSRs with %d workers', workers)
+        start_time = time.time()
+
+        # load the configs used by the generators before they are
+        # accessed from multiple threads
+        subsystem.load_pending('config', subsystem.load_config)
+        subsystem.load_pending('registry', subsystem.load_registry)
+        subsystem.instance.load_pending('passwords', subsystem.instance.load_passwords)
+
+        # each CSR is generated by a separate certutil or PKCS10Client
+        # process with its own NSSDatabase and token session
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(generator, deployer, subsystem)
+                for generator in generators
+            ]
+
+        # raise the first failure after all keys have been generated
+        for future in futures:
+            future.result()
+
+        logger.info('Generated %d CSRs in %.2f s', len(generators), time.time() - start_time)
 
     def spawn(self, deployer):
 
@@ -21,6 +21,7 @@
 
 from __future__ import absolute_import
 
+import atexit
 import datetime
 import functools
 import json
@@ -31,9 +32,13 @@ import re
 import requests
 import shutil
 import socket
+import struct
 import subprocess
+import sys
 import tempfile
+import threading
 import time
+import urllib.parse
 
 import ldap
 import ldap.filter
@@ -46,9 +51,169 @@ import pki.system
 
 SELFTEST_CRITICAL = 'critical'
 
+# PKIServerCLI workers indexed by (instance, subsystem, as_current_user,
+# JVM command)
+WORKERS = {}
+
+# database connection pools indexed by instance
+DATABASE_POOLS = {}
+
 logger = logging.getLogger(__name__)
 
 
+class PKIServerWorker(object):
+    '''
+    Long-lived JVM which executes PKIServerCLI commands sent over a pipe
+    (see org.dogtagpki.server.cli.PKIServerWorker). The JVM exits by
+    itself after being idle for the specified number of seconds.
+    '''
+
+    def __init__(self, cmd, idle_timeout):
+
+        self.cmd = cmd + [
+            'org.dogtagpki.server.cli.PKIServerWorker',
+            '--idle-timeout', str(idle_timeout)
+        ]
+
+        self.idle_timeout = idle_timeout
+        self.process = None
+        self.last_used = None
+
+    def is_alive(self):
+
+        if not self.process or self.process.poll() is not None:
+            return False
+
+        # don't send a command to a worker that might be exiting
+        return time.time() - self.last_used < self.idle_timeout / 2
+
+    def start(self):
+
+        logger.debug('Command: %s', ' '.join(self.cmd))
+
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE)
+
+        self.last_used = time.time()
+
+    def read(self, size):
+
+        data = self.process.stdout.read(size)
+
+        if len(data) < size:
+            raise EOFError('Unexpected end of worker output')
+
+        return data
+
+    def read_bytes(self):
+        size = struct.unpack('>i', self.read(4))[0]
+        return self.read(size)
+
+    def execute(self, args, input=None):  # pylint: disable=W0622
+        '''
+        Execute PKIServerCLI command and return the exit code,
+        stdout, and stderr.
+        '''
+
+        if not self.is_alive():
+            self.close()
+            self.start()
+
+        if input is None:
+            input = b''
+
+        elif isinstance(input, str):
+            input = input.encode('utf-8')
+
+        request = [struct.pack('>i', len(args))]
+
+        for arg in args:
+            data = arg.encode('utf-8')
+            request.append(struct.pack('>i', len(data)))
+            request.append(data)
+
+        request.append(struct.pack('>i', len(input)))
+        request.append(input)
+
+        try:
+            self.process.stdin.write(b''.join(request))
+            self.process.stdin.flush()
+
+            returncode = struct.unpack('>i', self.read(4))[0]
+            stdout = self.read_bytes()
+            stderr = self.read_bytes()
+
+        except (OSError, EOFError) as e:
+            self.close()
+            raise Exception('PKI server worker terminated unexpectedly: %s' % e)
+
+        self.last_used = time.time()
+
+        return returncode, stdout, stderr
+
+    def close(self):
+
+        if not self.process:
+            return
+
+        # the worker will exit when its input is closed
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+        self.process.stdout.close()
+        self.process = None
+
+
+def close_workers():
+
+    for worker in WORKERS.values():
+        worker.close()
+
+    WORKERS.clear()
+
+
+atexit.register(close_workers)
+
+
+def close_database_pools():
+
+    for pool in DATABASE_POOLS.values():
+        pool.close()
+
+    DATABASE_POOLS.clear()
+
+
+atexit.register(close_database_pools)
+
+
+def write_output(stream, data):
+    '''
+    Write command output into stdout or stderr.
+    '''
+
+    if not data:
+        return
+
+    stream.flush()
+
+    if hasattr(stream, 'buffer'):
+        stream.buffer.write(data)
+    else:
+        stream.write(data.decode('utf-8'))
+
+    stream.flush()
+
+
 @functools.total_ordering
 class PKISubsystem(object):
 
@@ -66,11 +231,28 @@ class PKISubsystem(object):
         self.cs_conf = os.path.join(self.conf_dir, 'CS.cfg')
         self.registry_conf = os.path.join(self.conf_dir, 'registry.cfg')
 
-        self.config = {}
-        self.registry = {}
+        self._config = {}
+        self._registry = {}
+
+        # configs that will be loaded on first access
+        self.pending = set()
+        self.lock = threading.RLock()
+
+        # original and current content of CS.cfg and registry.cfg
+        # indexed by path while save() is deferred (see defer_save())
+        self.deferred = None
+
+        # idle timeout (in seconds) of the long-lived JVM used to run
+        # PKIServerCLI commands, or 0 to start a new JVM for each command
+        self.worker_timeout = int(os.getenv('PKI_SERVER_WORKER_TIMEOUT', '0'))
+
+        # idle timeout (in seconds) of pooled database connections,
+        # by default (0) a new connection is opened for each
+        # open_database() call
+        self.database_idle_timeout = int(os.getenv('PKI_SERVER_DATABASE_IDLE_TIMEOUT', '0'))
 
-        self.type = None  # e.g. CA, KRA
-        self.prefix = None  # e.g. ca, kra
+        self._type = None  # e.g. CA, KRA
+        self._prefix = None  # e.g. ca, kra
 
         self.default_doc_base = os.path.join(
             pki.SHARE_DIR,
@@ -118,22 +300,81 @@ class PKISubsystem(object):
     def __hash__(self):
         return hash((self.name, self.instance, self.type))
 
+    @property
+    def config(self):
+        if 'config' in self.pending:
+            self.load_pending('config', self.load_config)
+        return self._config
+
+    @property
+    def registry(self):
+        if 'registry' in self.pending:
+            self.load_pending('registry', self.load_registry)
+        return self._registry
+
+    @property
+    def type(self):
+        if 'config' in self.pending:
+            self.load_pending('config', self.load_config)
+        return self._type
+
+    @property
+    def prefix(self):
+        if 'config' in self.pending:
+            self.load_pending('config', self.load_config)
+        return self._prefix
+
     def load(self):
+        '''
+        Load the subsystem. CS.cfg and registry.cfg are loaded
+        on first access.
+        '''
 
-        self.config.clear()
+        with self.lock:
+            self.pending.update(['config', 'registry'])
+
+    def load_pending(self, name, loader):
+        '''
+        Load a pending config unless another thread has loaded it
+        while waiting for the lock.
+        '''
+
+        with self.lock:
+            if name in self.pending:
+                loader()
+
+    def load_config(self):
+
+        config = {}
+        subsystem_type = None
 
         if os.path.exists(self.cs_conf):
             logger.info('Loading subsystem config: %s', self.cs_conf)
-            pki.util.load_properties(self.cs_conf, self.config)
+            self.instance.load_properties(self.cs_conf, config)
+            subsystem_type = config['cs.type']
+
+        with self.lock:
+            self._config.clear()
+            self._config.update(config)
+
+            if subsystem_type:
+                self._type = subsystem_type
+                self._prefix = subsystem_type.lower()
 
-            self.type = self.config['cs.type']
-            self.prefix = self.type.lower()
+            self.pending.discard('config')
 
-        self.registry.clear()
+    def load_registry(self):
+
+        registry = {}
 
         if os.path.exists(self.registry_conf):
             logger.info('Loading subsystem registry: %s', self.registry_conf)
-            pki.util.load_properties(self.registry_conf, self.registry)
+            self.instance.load_properties(self.registry_conf, registry)
+
+        with self.lock:
+            self._registry.clear()
+            self._registry.update(registry)
+            self.pending.discard('registry')
 
     def find_system_certs(self):
 
@@ -349,12 +590,65 @@ class PKISubsystem(object):
 
     def save(self):
 
+        if self.deferred is not None:
+            self.save_deferred()
+            return
+
         logger.info('Storing subsystem config: %s', self.cs_conf)
         self.instance.store_properties(self.cs_conf, self.config)
 
         logger.info('Storing registry config: %s', self.registry_conf)
         self.instance.store_properties(self.registry_conf, self.registry)
 
+    def defer_save(self):
+        '''
+        Keep the configs stored by save() in memory until commit()
+        is called. The content that would have been stored in each
+        file is available in the deferred attribute.
+        '''
+
+        self.deferred = {}
+
+        for filename in [self.cs_conf, self.registry_conf]:
+            try:
+                with open(filename) as f:
+                    content = f.read()
+            except FileNotFoundError:
+                content = None
+
+            self.deferred[filename] = [content, content]
+
+    def save_deferred(self):
+
+        for filename, properties in [(self.cs_conf, self.config),
+                                     (self.registry_conf, self.registry)]:
+
+            logger.info('Storing config in memory: %s', filename)
+
+            entry = self.deferred[filename]
+            entry[1] = pki.util.format_properties(properties, entry[1], filename)
+
+    def commit(self):
+        '''
+        Store the configs saved since defer_save() and stop deferring.
+        '''
+
+        deferred = self.deferred
+        self.deferred = None
+
+        if not deferred:
+            return
+
+        for filename, (original, content) in deferred.items():
+
+            if content == original:
+                logger.debug('No changes in %s', filename)
+                continue
+
+            logger.info('Storing config: %s', filename)
+            pki.util.write_file(filename, content, original is not None)
+            pki.util.chown(filename, self.instance.uid, self.instance.gid)
+
     def is_valid(self):
         return os.path.exists(self.conf_dir)
 
@@ -475,14 +769,25 @@ class PKISubsystem(object):
         self.enable(wait=wait, max_wait=max_wait, timeout=timeout)
 
     def open_database(self, name='internaldb', bind_dn=None,
-                      bind_password=None):
+                      bind_password=None, ldapi_socket=None):
+        '''
+        Open a connection to the database. The connection is taken from
+        the instance's connection pool if pooling is enabled, and
+        returned to the pool when it is closed.
+
+        If the path to an LDAPI socket is specified, the connection
+        uses LDAPI with SASL EXTERNAL autobind unless a bind DN and
+        password are provided.
+        '''
 
-        # TODO: add LDAPI support
         hostname = self.config['%s.ldapconn.host' % name]
         port = self.config['%s.ldapconn.port' % name]
         secure = self.config['%s.ldapconn.secureConn' % name]
 
-        if secure == 'true':
+        if ldapi_socket:
+            url = 'ldapi://%s' % urllib.parse.quote(ldapi_socket, safe='')
+
+        elif secure == 'true':
             url = 'ldaps://%s:%s' % (hostname, port)
 
         elif secure == 'false':
@@ -504,6 +809,10 @@ class PKISubsystem(object):
                 bind_dn=bind_dn,
                 bind_password=bind_password
             )
+        elif ldapi_socket:
+            # autobind
+            pass
+
         elif auth_type == 'BasicAuth':
             connection.set_credentials(
                 bind_dn=self.config['%s.ldapauth.bindDN' % name],
@@ -524,9 +833,17 @@ class PKISubsystem(object):
                 'Invalid parameter value in %s.ldapauth.authtype: %s' %
                 (name, auth_type))
 
-        connection.open()
+        if not self.database_idle_timeout:
+            connection.open()
+            return connection
+
+        pool = DATABASE_POOLS.get(self.instance.name)
+        if not pool:
+            pool = pki.server.PKIDatabaseConnectionPool(
+                idle_timeout=self.database_idle_timeout)
+            DATABASE_POOLS[self.instance.name] = pool
 
-        return connection
+        return pool.get_connection(connection)
 
     def customize_file(self, input_file, output_file):
         params = {
@@ -659,35 +976,12 @@ class PKISubsystem(object):
         '''
 
         # get the list of audit events from audit-events.properties
+        # in cmsbundle.jar
+        cmsbundle_jar = \
+            '/usr/share/pki/%s/webapps/%s/WEB-INF/lib/pki-cmsbundle.jar' \
+            % (self.name, self.name)
 
-        tmpdir = tempfile.mkdtemp()
-
-        try:
-            # export audit-events.properties from cmsbundle.jar
-            cmsbundle_jar = \
-                '/usr/share/pki/%s/webapps/%s/WEB-INF/lib/pki-cmsbundle.jar' \
-                % (self.name, self.name)
-
-            cmd = [
-                'jar',
-                'xf',
-                cmsbundle_jar,
-                'audit-events.properties'
-            ]
-
-            logger.debug('Command: %s', ' '.join(cmd))
-
-            subprocess.check_output(
-                cmd,
-                cwd=tmpdir,
-                stderr=subprocess.STDOUT)
-
-            # load audit-events.properties
-            filename = os.path.join(tmpdir, 'audit-events.properties')
-            events = pki.server.PKIServer.load_audit_events(filename)
-
-        finally:
-            shutil.rmtree(tmpdir)
+        events = pki.server.PKIServer.load_audit_events_from_jar(cmsbundle_jar)
 
         # get audit events for this subsystem
         results = {}
@@ -1622,11 +1916,7 @@ class PKISubsystem(object):
             as_current_user=as_current_user,
             capture_output=True)
 
-    def run(self,
-            args,
-            input=None,  # pylint: disable=W0622
-            as_current_user=False,
-            capture_output=False):
+    def get_java_command(self, as_current_user=False):
 
         java_path = os.getenv('PKI_JAVA_PATH')
         java_home = self.instance.config['JAVA_HOME']
@@ -1676,6 +1966,24 @@ class PKISubsystem(object):
             non_empty_opts = [opt for opt in opts if opt]
             cmd.extend(non_empty_opts)
 
+        return cmd
+
+    def run(self,
+            args,
+            input=None,  # pylint: disable=W0622
+            as_current_user=False,
+            capture_output=False):
+
+        cmd = self.get_java_command(as_current_user=as_current_user)
+
+        if self.worker_timeout:
+            return self.run_in_worker(
+                cmd,
+                args,
+                input=input,
+                as_current_user=as_current_user,
+                capture_output=capture_output)
+
         cmd.extend(['org.dogtagpki.server.cli.PKIServerCLI'])
 
         cmd.extend(args)
@@ -1698,6 +2006,50 @@ class PKISubsystem(object):
         except KeyboardInterrupt:
             logger.debug('Server stopped')
 
+    def run_in_worker(
+            self,
+            cmd,
+            args,
+            input=None,  # pylint: disable=W0622
+            as_current_user=False,
+            capture_output=False):
+        '''
+        Run PKIServerCLI command in a long-lived JVM shared by all commands
+        for this subsystem. The result is the same as running the command
+        in a new JVM, except the command cannot read from the terminal.
+        '''
+
+        # commands with different JVM options need separate workers
+        key = (self.instance.name, self.name, as_current_user, tuple(cmd))
+
+        worker = WORKERS.get(key)
+        if not worker:
+            worker = PKIServerWorker(cmd, self.worker_timeout)
+            WORKERS[key] = worker
+
+        cmd = cmd + ['org.dogtagpki.server.cli.PKIServerCLI'] + args
+
+        logger.debug('Command: %s', ' '.join(args))
+
+        try:
+            returncode, stdout, stderr = worker.execute(args, input=input)
+
+        except KeyboardInterrupt:
+            worker.close()
+            logger.debug('Server stopped')
+            return None
+
+        write_output(sys.stderr, stderr)
+
+        if not capture_output:
+            write_output(sys.stdout, stdout)
+            stdout = None
+
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, cmd, output=stdout)
+
+        return subprocess.CompletedProcess(cmd, returncode, stdout=stdout)
+
 
 class CASubsystem(PKISubsystem):
 
@@ -1759,7 +2111,22 @@ class CASubsystem(PKISubsystem):
 
         self.run(cmd, as_current_user=as_current_user)
 
-    def find_cert_requests(self, cert=None):
+    # attributes used by create_request_object()
+    REQUEST_ATTRIBUTES = [
+        'cn',
+        'requestType',
+        'requestState',
+        'extdata-cert--005frequest'
+    ]
+
+    def iter_cert_requests(self, cert=None, page_size=None):
+        '''
+        Yield the certificate requests in the database one page at a time
+        without loading all requests into memory.
+
+        :param cert: issued certificate in the LDAP format
+        :param page_size: number of requests retrieved per page
+        '''
 
         base_dn = self.config['internaldb.basedn']
 
@@ -1770,35 +2137,49 @@ class CASubsystem(PKISubsystem):
         else:
             search_filter = '(objectClass=*)'
 
-        con = self.open_database()
+        if page_size is None:
+            page_size = pki.server.LDAP_PAGE_SIZE
 
-        entries = con.ldap.search_s(
-            'ou=ca,ou=requests,%s' % base_dn,
-            ldap.SCOPE_ONELEVEL,
-            search_filter,
-            None)
+        con = self.open_database()
 
-        con.close()
+        try:
+            for entry in con.search(
+                    'ou=ca,ou=requests,%s' % base_dn,
+                    scope=ldap.SCOPE_ONELEVEL,
+                    search_filter=search_filter,
+                    attrs=self.REQUEST_ATTRIBUTES,
+                    page_size=page_size):
+                yield self.create_request_object(entry)
 
-        cert_requests = []
-        for entry in entries:
-            cert_requests.append(self.create_request_object(entry))
+        finally:
+            con.close()
 
-        return cert_requests
+    def find_cert_requests(self, cert=None):
+        return list(self.iter_cert_requests(cert=cert))
 
-    def get_cert_requests(self, request_id):
+    def get_cert_requests(self, request_id, con=None):
+        '''
+        Get a certificate request. An open database connection can be
+        provided to look up multiple requests without reconnecting.
+        '''
 
         base_dn = self.config['internaldb.basedn']
 
-        con = self.open_database()
+        close = False
+        if not con:
+            con = self.open_database()
+            close = True
 
-        entries = con.ldap.search_s(
-            'cn=%s,ou=ca,ou=requests,%s' % (request_id, base_dn),
-            ldap.SCOPE_BASE,
-            '(objectClass=*)',
-            None)
+        try:
+            entries = con.ldap.search_s(
+                'cn=%s,ou=ca,ou=requests,%s' % (request_id, base_dn),
+                ldap.SCOPE_BASE,
+                '(objectClass=*)',
+                self.REQUEST_ATTRIBUTES)
 
-        con.close()
+        finally:
+            if close:
+                con.close()
 
         entry = entries[0]
         return self.create_request_object(entry)
@@ -19,12 +19,16 @@
 #
 
 from __future__ import absolute_import
+import concurrent.futures
 import logging
+import os
+import time
 
 import pki
 import pki.upgrade
 import pki.util
 import pki.server
+import pki.server.instance
 
 UPGRADE_DIR = pki.SHARE_DIR + '/server/upgrade'
 
@@ -39,6 +43,11 @@ class PKIServerUpgradeScriptlet(pki.upgrade.PKIUpgradeScriptlet):
         super().__init__()
         self.instance = None
 
+        # whether the scriptlet only changes CS.cfg and registry.cfg
+        # through subsystem.config, subsystem.registry, and save(), so
+        # it can run with the changes kept in memory in a batch upgrade
+        self.batch_safe = False
+
     def get_backup_dir(self):
         return self.instance.log_dir + '/backup/' + str(self.version) + '/' + str(self.index)
 
@@ -53,13 +62,24 @@ class PKIServerUpgradeScriptlet(pki.upgrade.PKIUpgradeScriptlet):
 
 class PKIServerUpgrader(pki.upgrade.PKIUpgrader):
 
-    def __init__(self, instance, upgrade_dir=UPGRADE_DIR):
+    def __init__(self, instance, upgrade_dir=UPGRADE_DIR, batch=False):
+        '''
+        :param batch: load the subsystem configs once, keep the changes
+           in memory while the batch-safe scriptlets are running, and
+           store each config once at the end
+        :type batch: bool
+        '''
 
         super().__init__(upgrade_dir)
 
         self.instance = instance
         self.tracker = None
 
+        self.batch = batch
+
+        # last backup of each deferred config indexed by path
+        self.backups = {}
+
     def get_tracker(self):
 
         if self.tracker:
@@ -93,16 +113,251 @@ class PKIServerUpgrader(pki.upgrade.PKIUpgrader):
         scriptlet.instance = self.instance
         super().init_scriptlet(scriptlet)
 
+    def plan(self):
+        '''
+        Return the current version, the target version, and the number
+        of scriptlets that will be executed by upgrade().
+        '''
+
+        current_version = self.get_current_version()
+        target_version = self.get_target_version()
+
+        count = 0
+        if current_version != target_version:
+            for version in self.versions():
+                count += len(self.get_manifest_entries(version))
+
+        return current_version, target_version, count
+
+    def get_deferred_config(self, path):
+        '''
+        Return the deferred [original, current] content of a subsystem
+        config, or None if the file is not deferred.
+        '''
+
+        for subsystem in self.instance.get_subsystems():
+            if subsystem.deferred and path in subsystem.deferred:
+                return subsystem.deferred[path]
+
+        return None
+
+    def backup(self, scriptlet, path):
+
+        entry = self.get_deferred_config(path) if self.batch else None
+
+        if entry is None:
+            super().backup(scriptlet, path)
+            return
+
+        backup_dir = scriptlet.get_backup_dir()
+        self.makedirs(backup_dir, exist_ok=True)
+
+        # back up the content that would be in the file at this point
+        content = entry[1]
+
+        if content is None:
+            logger.info('Recording %s', path)
+            self.record(scriptlet, path)
+            return
+
+        dest = backup_dir + '/oldfiles' + path
+
+        if os.path.exists(dest):
+            return
+
+        destparent = os.path.dirname(dest)
+        if not os.path.exists(destparent):
+            self.copydirs(os.path.dirname(path), destparent, force=True)
+
+        logger.info('Saving %s', path)
+
+        # share the previous backup if the content has not changed
+        last_backup = self.backups.get(path)
+
+        try:
+            if last_backup and last_backup[0] == content:
+                os.link(last_backup[1], dest)
+                self.backups[path] = (content, dest)
+                return
+
+        except OSError as e:
+            logger.debug('Unable to link %s: %s', last_backup[1], e)
+
+        self.touch(dest)
+        with open(dest, 'w') as f:
+            f.write(content)
+
+        self.backups[path] = (content, dest)
+
+    def upgrade(self):
+
+        if not self.batch:
+            super().upgrade()
+            return
+
+        subsystems = self.instance.get_subsystems()
+
+        for subsystem in subsystems:
+            subsystem.load()
+            subsystem.defer_save()
+
+        try:
+            super().upgrade()
+
+        finally:
+            # store the configs saved by the executed scriptlets so the
+            # files match the tracker even if a scriptlet failed
+            for subsystem in subsystems:
+                subsystem.commit()
+
+            self.backups.clear()
+
+    def reload_deferred_configs(self, scriptlet):
+        '''
+        Reload the deferred configs that have been modified on disk by
+        the scriptlet. Fail if a config also has changes in memory since
+        the scriptlet would have modified an outdated file.
+        '''
+
+        for subsystem in self.instance.get_subsystems():
+
+            modified = []
+
+            for path, (original, content) in subsystem.deferred.items():
+                try:
+                    with open(path) as f:
+                        current = f.read()
+                except FileNotFoundError:
+                    current = None
+
+                if current == original:
+                    continue
+
+                if content != original:
+                    raise Exception(
+                        'Upgrade script %s-%s modified %s outside of save()' %
+                        (scriptlet.version, scriptlet.index, path))
+
+                modified.append(path)
+
+            if not modified:
+                continue
+
+            for path in modified:
+                logger.info('Reloading %s', path)
+                pki.server.PROPERTIES.pop(path, None)
+
+            subsystem.load()
+            subsystem.defer_save()
+
     def run_scriptlet(self, scriptlet):
 
+        if self.batch and not scriptlet.batch_safe:
+
+            # the scriptlet might access the config files directly,
+            # so store the changes and run it like in a regular upgrade
+            subsystems = self.instance.get_subsystems()
+
+            for subsystem in subsystems:
+                subsystem.commit()
+
+            try:
+                self.upgrade_subsystems(scriptlet, reload=True)
+
+            finally:
+                for subsystem in subsystems:
+                    pki.server.PROPERTIES.pop(subsystem.cs_conf, None)
+                    pki.server.PROPERTIES.pop(subsystem.registry_conf, None)
+                    subsystem.load()
+                    subsystem.defer_save()
+
+            return
+
+        self.upgrade_subsystems(scriptlet, reload=not self.batch)
+
+        if self.batch:
+            self.reload_deferred_configs(scriptlet)
+
+    def upgrade_subsystems(self, scriptlet, reload=True):
+
         for subsystem in self.instance.get_subsystems():
 
             logger.info('Upgrading %s subsystem', subsystem)
 
-            # reload changes
-            subsystem.load()
+            if reload:
+                # reload changes
+                subsystem.load()
 
             scriptlet.upgrade_subsystem(self.instance, subsystem)
 
         logger.info('Upgrading %s instance', self.instance)
         scriptlet.upgrade_instance(self.instance)
+
+
+def upgrade_instance(instance_name, batch=False, upgrade_dir=UPGRADE_DIR):
+    '''
+    Upgrade an instance and return a summary of the result. This
+    function can be executed in a separate process.
+    '''
+
+    start_time = time.time()
+
+    result = {
+        'instance': instance_name,
+        'from_version': None,
+        'to_version': None,
+        'scriptlets': 0,
+        'status': 'OK',
+        'error': None,
+    }
+
+    upgrader = None
+
+    try:
+        instance = pki.server.instance.PKIServerFactory.create(instance_name)
+        instance.load()
+
+        upgrader = PKIServerUpgrader(instance, upgrade_dir=upgrade_dir, batch=batch)
+        result['from_version'] = str(upgrader.get_current_version())
+
+        logger.info('Upgrading PKI server %s', instance)
+        upgrader.upgrade()
+
+    except Exception as e:  # pylint: disable=broad-except
+        logger.error('Unable to upgrade %s: %s', instance_name, e)
+        result['status'] = 'FAILED'
+        result['error'] = str(e)
+
+    if upgrader:
+        result['to_version'] = str(upgrader.get_current_version())
+        result['scriptlets'] = len(upgrader.timings)
+
+    result['elapsed'] = time.time() - start_time
+
+    return result
+
+
+def upgrade_instances(instance_names, batch=False, workers=1,
+                      upgrade_dir=UPGRADE_DIR):
+    '''
+    Upgrade independent instances in a pool of at most the specified
+    number of processes, and yield the results in the order of the
+    instance names.
+    '''
+
+    workers = min(workers, len(instance_names))
+
+    if workers <= 1:
+        for instance_name in instance_names:
+            yield upgrade_instance(
+                instance_name, batch=batch, upgrade_dir=upgrade_dir)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(upgrade_instance, instance_name, batch, upgrade_dir)
+            for instance_name in instance_names
+        ]
+
+        for future in futures:
+            yield future.result()
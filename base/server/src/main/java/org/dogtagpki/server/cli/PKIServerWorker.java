@@ -0,0 +1,218 @@
+//
+// Copyright Red Hat, Inc.
+//
+// SPDX-License-Identifier: GPL-2.0-or-later
+//
+package org.dogtagpki.server.cli;
+
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.FileDescriptor;
+import java.io.FileInputStream;
+import java.io.FileOutputStream;
+import java.io.InputStream;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.util.LinkedHashMap;
+import java.util.Map;
+
+import org.dogtagpki.cli.CLIException;
+import org.slf4j.Logger;
+import org.slf4j.LoggerFactory;
+
+/**
+ * Long-lived JVM that executes PKIServerCLI commands received over
+ * stdin and sends the results back over stdout so that the Python
+ * tools do not have to start a new JVM for each command.
+ *
+ * All integers are 32-bit big-endian and all byte arrays are
+ * prefixed with their length:
+ *
+ *   request:  <argc> <arg>... <input>
+ *   response: <exit code> <stdout> <stderr>
+ *
+ * The worker exits when stdin is closed or when it has been idle
+ * longer than the timeout specified with --idle-timeout (in seconds).
+ */
+public class PKIServerWorker {
+
+    public static Logger logger = LoggerFactory.getLogger(PKIServerWorker.class);
+
+    public static String[] LOGGER_NAMES = { "org.dogtagpki", "com.netscape", "netscape" };
+
+    DataInputStream in;
+    DataOutputStream out;
+
+    long idleTimeout;
+    long lastActivity = System.currentTimeMillis();
+    boolean busy;
+
+    Map<String, java.util.logging.Level> levels = new LinkedHashMap<>();
+
+    public PKIServerWorker(InputStream in, PrintStream out, long idleTimeout) {
+        this.in = new DataInputStream(new BufferedInputStream(in));
+        this.out = new DataOutputStream(new BufferedOutputStream(out));
+        this.idleTimeout = idleTimeout;
+    }
+
+    public byte[] readBytes() throws Exception {
+        int length = in.readInt();
+        byte[] bytes = new byte[length];
+        in.readFully(bytes);
+        return bytes;
+    }
+
+    public void writeBytes(byte[] bytes) throws Exception {
+        out.writeInt(bytes.length);
+        out.write(bytes);
+    }
+
+    public synchronized void setBusy(boolean busy) {
+        this.busy = busy;
+        lastActivity = System.currentTimeMillis();
+    }
+
+    public synchronized boolean isIdle() {
+        return !busy && System.currentTimeMillis() - lastActivity > idleTimeout;
+    }
+
+    public void startWatchdog() {
+
+        if (idleTimeout <= 0) {
+            return;
+        }
+
+        Thread thread = new Thread(() -> {
+            while (true) {
+                try {
+                    Thread.sleep(1000);
+                } catch (InterruptedException e) {
+                    return;
+                }
+
+                if (isIdle()) {
+                    logger.info("Worker has been idle for " + idleTimeout + " ms");
+                    System.exit(0);
+                }
+            }
+        });
+
+        thread.setDaemon(true);
+        thread.start();
+    }
+
+    public int execute(String[] args, byte[] input, PrintStream stdout, PrintStream stderr) {
+
+        PrintStream origOut = System.out;
+        PrintStream origErr = System.err;
+        InputStream origIn = System.in;
+
+        System.setOut(stdout);
+        System.setErr(stderr);
+        System.setIn(new ByteArrayInputStream(input));
+
+        // restore the log levels from the original configuration
+        // since each command may change them with --verbose or --debug
+        for (Map.Entry<String, java.util.logging.Level> entry : levels.entrySet()) {
+            java.util.logging.Logger.getLogger(entry.getKey()).setLevel(entry.getValue());
+        }
+
+        try {
+            PKIServerCLI cli = new PKIServerCLI();
+            cli.execute(args);
+            return 0;
+
+        } catch (CLIException e) {
+            String message = e.getMessage();
+            if (message != null) {
+                System.err.println("ERROR: " + message);
+            }
+            return e.getCode() & 0xff;
+
+        } catch (Throwable t) {
+            PKIServerCLI.handleException(t);
+            return 0xff;
+
+        } finally {
+            System.out.flush();
+            System.err.flush();
+
+            System.setOut(origOut);
+            System.setErr(origErr);
+            System.setIn(origIn);
+        }
+    }
+
+    public void run() throws Exception {
+
+        for (String name : LOGGER_NAMES) {
+            levels.put(name, java.util.logging.Logger.getLogger(name).getLevel());
+        }
+
+        startWatchdog();
+
+        while (true) {
+
+            int argc;
+            try {
+                argc = in.readInt();
+            } catch (EOFException e) {
+                logger.info("Worker input closed");
+                return;
+            }
+
+            setBusy(true);
+
+            String[] args = new String[argc];
+            for (int i = 0; i < argc; i++) {
+                args[i] = new String(readBytes(), StandardCharsets.UTF_8);
+            }
+
+            byte[] input = readBytes();
+
+            ByteArrayOutputStream stdout = new ByteArrayOutputStream();
+            ByteArrayOutputStream stderr = new ByteArrayOutputStream();
+
+            int rc = execute(
+                    args,
+                    input,
+                    new PrintStream(stdout, true),
+                    new PrintStream(stderr, true));
+
+            out.writeInt(rc);
+            writeBytes(stdout.toByteArray());
+            writeBytes(stderr.toByteArray());
+            out.flush();
+
+            setBusy(false);
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+
+        long idleTimeout = 0;
+
+        for (int i = 0; i < args.length; i++) {
+            if ("--idle-timeout".equals(args[i])) {
+                idleTimeout = Long.parseLong(args[++i]) * 1000;
+            }
+        }
+
+        // keep the original stdout for the responses
+        PrintStream out = new PrintStream(new FileOutputStream(FileDescriptor.out));
+        InputStream in = new FileInputStream(FileDescriptor.in);
+
+        // don't let stray output corrupt the responses
+        System.setOut(System.err);
+
+        PKIServerWorker worker = new PKIServerWorker(in, out, idleTimeout);
+        worker.run();
+
+        System.exit(0);
+    }
+}
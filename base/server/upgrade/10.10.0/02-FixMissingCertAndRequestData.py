@@ -18,6 +18,7 @@ class FixMissingCertAndRequestData(pki.server.upgrade.PKIServerUpgradeScriptlet)
     def __init__(self):
         super(FixMissingCertAndRequestData, self).__init__()
         self.message = 'Fix missing SSL server and subsystem cert/request data'
+        self.batch_safe = True
 
     def upgrade_instance(self, instance):
 
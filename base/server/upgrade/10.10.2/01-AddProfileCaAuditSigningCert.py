@@ -19,6 +19,7 @@ class AddProfileCaAuditSigningCert(pki.server.upgrade.PKIServerUpgradeScriptlet)
     def __init__(self):
         super(AddProfileCaAuditSigningCert, self).__init__()
         self.message = 'Add caAuditSigningCert profile'
+        self.batch_safe = True
 
     def upgrade_subsystem(self, instance, subsystem):
 
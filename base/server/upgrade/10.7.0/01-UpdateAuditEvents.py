@@ -66,6 +66,7 @@ class UpdateAuditEvents(
     def __init__(self):
         super(UpdateAuditEvents, self).__init__()
         self.message = 'Update audit events'
+        self.batch_safe = True
 
     def upgrade_subsystem(self, instance, subsystem):
 
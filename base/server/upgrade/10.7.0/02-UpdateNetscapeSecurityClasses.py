@@ -42,6 +42,7 @@ class UpdateNetscapeSecurityClasses(
     def __init__(self):
         super(UpdateNetscapeSecurityClasses, self).__init__()
         self.message = 'Update netscape.security class references'
+        self.batch_safe = True
 
     def upgrade_subsystem(self, instance, subsystem):
         self.backup(subsystem.cs_conf)
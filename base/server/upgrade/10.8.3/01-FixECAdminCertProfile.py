@@ -19,6 +19,7 @@ class FixECAdminCertProfile(pki.server.upgrade.PKIServerUpgradeScriptlet):
     def __init__(self):
         super(FixECAdminCertProfile, self).__init__()
         self.message = 'Fix EC admin certificate profile'
+        self.batch_safe = True
 
     def upgrade_subsystem(self, instance, subsystem):
 
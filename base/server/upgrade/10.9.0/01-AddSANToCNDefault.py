@@ -18,6 +18,7 @@ class AddSANToCNDefault(pki.server.upgrade.PKIServerUpgradeScriptlet):
     def __init__(self):
         super(AddSANToCNDefault, self).__init__()
         self.message = 'Add SANToCNDefault policy'
+        self.batch_safe = True
 
     def upgrade_subsystem(self, instance, subsystem):
 
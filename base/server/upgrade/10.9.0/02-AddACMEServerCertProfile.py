@@ -19,6 +19,7 @@ class AddACMEServerCertProfile(pki.server.upgrade.PKIServerUpgradeScriptlet):
     def __init__(self):
         super(AddACMEServerCertProfile, self).__init__()
         self.message = 'Add acmeServerCert profile'
+        self.batch_safe = True
 
     def upgrade_subsystem(self, instance, subsystem):
 
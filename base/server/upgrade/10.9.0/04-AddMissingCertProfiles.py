@@ -19,6 +19,7 @@ class AddMissingCertProfiles(pki.server.upgrade.PKIServerUpgradeScriptlet):
     def __init__(self):
         super(AddMissingCertProfiles, self).__init__()
         self.message = 'Add missing certificate profiles'
+        self.batch_safe = True
 
     def upgrade_subsystem(self, instance, subsystem):
 
@@ -0,0 +1,83 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+'''
+Startup benchmark for pki-server. Each command is executed in a new
+Python process with -X importtime to measure the wall-clock time, the
+total import time, and the number of imported modules.
+
+Usage: python3 bench_cli_startup.py [--repeat <number>] [--top <number>] [<command>...]
+'''
+
+from __future__ import print_function
+
+import argparse
+import subprocess
+import sys
+import time
+
+DEFAULT_COMMANDS = [
+    '--help',
+    'ca-audit-file-find --help',
+]
+
+
+def run(args):
+
+    cmd = [sys.executable, '-X', 'importtime', '-m', 'pki.server.pkiserver'] + args
+
+    start = time.time()
+    result = subprocess.run(
+        cmd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=False)
+    elapsed = time.time() - start
+
+    # import time: self [us] | cumulative | imported package
+    imports = []
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+
+        parts = line[len('import time:'):].split('|')
+        self_time = int(parts[0])
+        cumulative = int(parts[1])
+        name = parts[2].rstrip()
+        imports.append((self_time, cumulative, name))
+
+    return elapsed, imports
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('commands', nargs='*', default=DEFAULT_COMMANDS)
+    args = parser.parse_args()
+
+    for command in args.commands:
+
+        runs = [run(command.split()) for _ in range(args.repeat)]
+        elapsed, imports = min(runs, key=lambda r: r[0])
+
+        # top-level imports are not indented
+        total = sum(c for _, c, name in imports if not name.startswith('  '))
+
+        print('pki-server %s' % command)
+        print('  %-30s %10.1f ms' % ('wall-clock time', elapsed * 1000))
+        print('  %-30s %10.1f ms' % ('import time', total / 1000))
+        print('  %-30s %10d' % ('imported modules', len(imports)))
+
+        print('  slowest imports (self time):')
+        for self_time, _, name in sorted(imports, reverse=True)[:args.top]:
+            print('    %-40s %8.1f ms' % (name.strip(), self_time / 1000))
+
+        print()
+
+
+if __name__ == '__main__':
+    main()
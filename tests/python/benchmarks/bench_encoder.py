@@ -0,0 +1,132 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+'''
+Micro-benchmark for pki.encoder.CustomTypeEncoder with synthetic
+enrollment and search requests. The previous implementation is included
+for comparison.
+
+Usage: python3 bench_encoder.py [--requests <number>] [--inputs <number>]
+           [--repeat <number>]
+'''
+
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import timeit
+
+from six import iteritems, itervalues
+
+import pki.cert
+import pki.encoder
+import pki.profile
+
+
+class LegacyCustomTypeEncoder(json.JSONEncoder):
+    # pylint: disable=E0202
+
+    def default(self, o):
+        for k, v in iteritems(pki.encoder.TYPES):
+            if isinstance(o, v):
+                return {k: self.get_attributes(o)}
+        for t in itervalues(pki.encoder.NOTYPES):
+            if isinstance(o, t):
+                return self.attr_name_conversion(self.get_attributes(o), type(o))
+        return json.JSONEncoder.default(self, o)
+
+    @staticmethod
+    def get_attributes(o):
+        attrs = {}
+        for cls in reversed(type(o).__mro__):
+            for name in getattr(cls, '__slots__', ()):
+                if name != '__dict__' and hasattr(o, name):
+                    attrs[name] = getattr(o, name)
+        attrs.update(getattr(o, '__dict__', {}))
+        return attrs
+
+    @staticmethod
+    def attr_name_conversion(attr_dict, object_class):
+        if not hasattr(object_class, 'json_attribute_names'):
+            return attr_dict
+        reverse_dict = {v: k for k, v in
+                        iteritems(object_class.json_attribute_names)}
+        new_dict = dict()
+        for k, v in iteritems(attr_dict):
+            if k in reverse_dict:
+                new_dict[reverse_dict[k]] = v
+            else:
+                new_dict[k] = v
+        return new_dict
+
+
+def create_enrollment_request(index, inputs):
+
+    request = pki.cert.CertEnrollmentRequest(profile_id='caUserCert')
+
+    for i in range(inputs):
+        profile_input = pki.profile.ProfileInput(
+            profile_input_id='i%d' % i,
+            class_id='subjectNameInputImpl',
+            name='Subject Name')
+
+        for name in ['sn_uid', 'sn_e', 'sn_cn', 'sn_ou', 'sn_o', 'sn_c']:
+            descriptor = pki.profile.Descriptor(
+                syntax='string', description=name)
+            profile_input.add_attribute(pki.profile.ProfileAttribute(
+                name=name, value='user%d' % index, descriptor=descriptor))
+
+        request.add_input(profile_input)
+
+    return request
+
+
+def create_search_request(index):
+    return pki.cert.CertSearchRequest(
+        common_name='user%d' % index, status='VALID', issued_by='caadmin')
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--inputs', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    enrollment_requests = [create_enrollment_request(i, args.inputs)
+                           for i in range(args.requests)]
+    search_requests = [create_search_request(i) for i in range(args.requests)]
+
+    for name, requests in [('enrollment', enrollment_requests),
+                           ('search', search_requests)]:
+
+        expected = [json.dumps(r, cls=LegacyCustomTypeEncoder, sort_keys=True)
+                    for r in requests]
+        actual = [json.dumps(r, cls=pki.encoder.CustomTypeEncoder, sort_keys=True)
+                  for r in requests]
+        assert actual == expected, 'Encoded %s requests do not match' % name
+
+        results = [
+            ('legacy', lambda: [json.dumps(r, cls=LegacyCustomTypeEncoder)
+                                for r in requests]),
+            ('dispatch', lambda: [json.dumps(r, cls=pki.encoder.CustomTypeEncoder)
+                                  for r in requests]),
+            ('stream', lambda: pki.encoder.dump(requests, io.StringIO())),
+        ]
+
+        print('%d %s requests' % (args.requests, name))
+
+        for label, func in results:
+            elapsed = min(timeit.repeat(func, number=1, repeat=args.repeat))
+            print('  %-10s %8.1f ms %8.1f us/request' % (
+                label, elapsed * 1000, elapsed * 1e6 / args.requests))
+
+        print()
+
+
+if __name__ == '__main__':
+    main()
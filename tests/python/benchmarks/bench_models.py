@@ -0,0 +1,136 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+'''
+Micro-benchmark for decoding synthetic certificate search responses into
+CertDataInfo objects. The previous implementation is included for
+comparison. The parse time uses orjson if it is installed.
+
+Usage: python3 bench_models.py [--entries <number>] [--repeat <number>]
+'''
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import timeit
+import tracemalloc
+
+from six import iteritems
+
+import pki
+import pki.cert
+import pki.encoder
+
+
+class LegacyCertDataInfo(object):
+
+    json_attribute_names = pki.cert.CertDataInfo.json_attribute_names
+
+    def __init__(self):
+        self.serial_number = None
+        self.subject_dn = None
+        self.status = None
+        self.type = None
+        self.version = None
+        self.key_algorithm_oid = None
+        self.key_length = None
+        self.not_valid_before = None
+        self.not_valid_after = None
+        self.issued_on = None
+        self.issued_by = None
+        self.link = None
+
+    @classmethod
+    def from_json(cls, attr_list):
+        cert_data_info = cls()
+        for k, v in iteritems(attr_list):
+            if k not in ['Link']:
+                if k in LegacyCertDataInfo.json_attribute_names:
+                    setattr(cert_data_info,
+                            LegacyCertDataInfo.json_attribute_names[k], v)
+                else:
+                    setattr(cert_data_info, k, v)
+
+        if 'Link' in attr_list:
+            cert_data_info.link = pki.Link.from_json(attr_list['Link'])
+
+        return cert_data_info
+
+
+def create_response(entries):
+
+    return json.dumps({
+        'total': entries,
+        'entries': [{
+            'id': hex(i + 1),
+            'SubjectDN': 'UID=user%d,O=EXAMPLE' % i,
+            'IssuerDN': 'CN=CA Signing Certificate,O=EXAMPLE',
+            'Status': 'VALID' if i % 10 else 'REVOKED',
+            'Type': 'X.509',
+            'Version': 2,
+            'KeyAlgorithmOID': '1.2.840.113549.1.1.1',
+            'KeyLength': 2048,
+            'NotValidBefore': 1600000000000 + i,
+            'NotValidAfter': 1700000000000 + i,
+            'IssuedOn': 1600000000000 + i,
+            'IssuedBy': 'caadmin',
+        } for i in range(entries)],
+        'Link': []
+    }).encode()
+
+
+def measure_memory(cls, content):
+
+    gc.collect()
+    tracemalloc.start()
+
+    # keep only the decoded objects like a streaming search would
+    objects = [cls.from_json(entry) for entry in json.loads(content)['entries']]
+    gc.collect()
+
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return size / len(objects)
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    content = create_response(args.entries)
+    entries = json.loads(content)['entries']
+
+    print('Entries: %d (%d bytes)' % (args.entries, len(content)))
+    print('orjson: %s' % ('yes' if pki.encoder.orjson else 'no'))
+    print()
+
+    results = [
+        ('parse (json)', lambda: json.loads(content)),
+        ('parse (pki.encoder)', lambda: pki.encoder.loads(content)),
+        ('decode (legacy)', lambda: [LegacyCertDataInfo.from_json(e) for e in entries]),
+        ('decode (slots)', lambda: [pki.cert.CertDataInfo.from_json(e) for e in entries]),
+    ]
+
+    for name, func in results:
+        elapsed = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('%-22s %8.1f ms %8.2f us/entry' % (
+            name, elapsed * 1000, elapsed * 1e6 / args.entries))
+
+    print()
+
+    for name, cls in [('legacy', LegacyCertDataInfo), ('slots', pki.cert.CertDataInfo)]:
+        size = measure_memory(cls, content)
+        print('memory (%s) %14.0f bytes/entry, %6.0f MB per 1M entries' % (
+            name, size, size))
+
+
+if __name__ == '__main__':
+    main()
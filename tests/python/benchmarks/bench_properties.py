@@ -0,0 +1,149 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+'''
+Micro-benchmark for pki.util.load_properties() and store_properties()
+with large synthetic CS.cfg files. The previous implementations are
+included for comparison. Note that store_properties() syncs the file
+to disk whereas the previous implementation did not.
+
+Usage: python3 bench_properties.py [--keys <number>] [--repeat <number>]
+'''
+
+from __future__ import print_function
+
+import argparse
+import io
+import operator
+import os
+import shutil
+import tempfile
+import timeit
+
+import pki.util
+
+
+def legacy_load_properties(filename, properties):
+
+    with open(filename) as f:
+
+        lines = f.read().splitlines()
+        name = None
+        multi_line = False
+
+        for index, line in enumerate(lines):
+
+            if multi_line:
+                value = properties[name]
+                value = value + line
+
+            else:
+                line = line.lstrip()
+                if not line or line.startswith('#'):
+                    continue
+
+                parts = line.split('=', 1)
+                if len(parts) < 2:
+                    raise Exception('Missing delimiter in %s line %d' %
+                                    (filename, index + 1))
+
+                name = parts[0].rstrip()
+                value = parts[1].lstrip()
+
+            if value.endswith('\\'):
+                value = value[:-1]
+                multi_line = True
+
+            else:
+                value = value.rstrip()
+                multi_line = False
+
+            properties[name] = value
+
+
+def legacy_store_properties(filename, properties):
+
+    sorted_props = sorted(properties.items(), key=operator.itemgetter(0))
+
+    with io.open(filename, 'w') as f:
+        for name, value in sorted_props:
+            f.write(u'{0}={1}\n'.format(name, value))
+
+
+def create_config(filename, keys):
+
+    with open(filename, 'w') as f:
+        f.write('# synthetic CS.cfg\n')
+        for i in range(keys):
+            f.write('ca.component%d.subsystem%d.param%d=value %d\n' % (
+                i % 97, i % 13, i, i))
+
+
+def measure(label, func, repeat):
+
+    t = min(timeit.repeat(func, number=1, repeat=repeat))
+    print('%-40s %10.2f ms' % (label, t * 1000))
+    return t
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--keys', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+
+    try:
+        filename = os.path.join(tmpdir, 'CS.cfg')
+        create_config(filename, args.keys)
+
+        print('Properties: %d' % args.keys)
+        print()
+
+        old = measure(
+            'load (legacy)',
+            lambda: legacy_load_properties(filename, {}),
+            args.repeat)
+        new = measure(
+            'load',
+            lambda: pki.util.load_properties(filename, {}),
+            args.repeat)
+        print('%-40s %10.2fx' % ('speedup', old / new))
+        print()
+
+        config = {}
+        pki.util.load_properties(filename, config)
+
+        def modify():
+            config['ca.component0.subsystem0.param0'] = str(timeit.default_timer())
+
+        old = measure(
+            'save (legacy)',
+            lambda: legacy_store_properties(filename, config),
+            args.repeat)
+
+        # restore the original layout
+        create_config(filename, args.keys)
+
+        new = measure(
+            'save unchanged',
+            lambda: pki.util.store_properties(filename, config),
+            args.repeat)
+        print('%-40s %10.2fx' % ('speedup', old / new))
+
+        new = measure(
+            'save one change',
+            lambda: (modify(), pki.util.store_properties(filename, config)),
+            args.repeat)
+        print('%-40s %10.2fx' % ('speedup', old / new))
+
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
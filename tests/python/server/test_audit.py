@@ -0,0 +1,180 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import base64
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+import pki.server.audit
+
+
+class AuditVerifyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        self.key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048, backend=default_backend())
+
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u'Audit Signing')])
+        now = datetime.datetime.utcnow()
+
+        cert = x509.CertificateBuilder() \
+            .subject_name(name) \
+            .issuer_name(name) \
+            .public_key(self.key.public_key()) \
+            .serial_number(1) \
+            .not_valid_before(now) \
+            .not_valid_after(now + datetime.timedelta(days=1)) \
+            .sign(self.key, hashes.SHA256(), default_backend())
+
+        self.cert_data = cert.public_bytes(serialization.Encoding.DER)
+        self.records = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def sign(self):
+        data = b''.join(record + b'\n' for record in self.records)
+        signature = self.key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+        record = b'[AuditEvent=AUDIT_LOG_SIGNING] sig: ' + base64.b64encode(signature)
+        self.records = [record]
+        return record
+
+    def write(self, filename, lines):
+        with open(os.path.join(self.tmpdir, filename), 'ab') as f:
+            for line in lines:
+                f.write(line + b'\n')
+
+    def log(self, n):
+        lines = []
+        for i in range(n):
+            record = b'[AuditEvent=ACCESS_SESSION_ESTABLISH] record %d' % i
+            self.records.append(record)
+            lines.append(record)
+        return lines
+
+    def test_verify_audit_logs(self):
+
+        self.write('audit.log.1', [self.sign()] + self.log(3) + [self.sign()] + self.log(2))
+        self.write('audit.log.2', self.log(2) + [self.sign()] + self.log(1))
+
+        log_files = ['audit.log.1', 'audit.log.2']
+        checkpoint_file = os.path.join(self.tmpdir, 'checkpoint.json')
+
+        report = pki.server.audit.verify_audit_logs(
+            self.tmpdir, log_files, self.cert_data,
+            checkpoint_file=checkpoint_file, workers=2)
+
+        self.assertEqual(report['good'], 2)
+        self.assertEqual(report['bad'], 0)
+        self.assertEqual(report['records'], 11)
+        self.assertEqual(
+            report['unsigned'],
+            (os.path.join(self.tmpdir, 'audit.log.2'), 3))
+
+        # resume from the last signature
+        self.write('audit.log.2', self.log(4) + [self.sign()])
+
+        report = pki.server.audit.verify_audit_logs(
+            self.tmpdir, log_files, self.cert_data,
+            checkpoint_file=checkpoint_file)
+
+        self.assertEqual(report['good'], 1)
+        self.assertEqual(report['bad'], 0)
+        self.assertEqual(report['records'], 7)
+        self.assertIsNone(report['unsigned'])
+
+    def test_verify_tampered_audit_log(self):
+
+        self.write('audit.log', [self.sign()] + self.log(3) + [self.sign()])
+
+        path = os.path.join(self.tmpdir, 'audit.log')
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        with open(path, 'wb') as f:
+            f.write(data.replace(b'record 1', b'record X'))
+
+        report = pki.server.audit.verify_audit_logs(
+            self.tmpdir, ['audit.log'], self.cert_data)
+
+        self.assertEqual(report['good'], 0)
+        self.assertEqual(report['bad'], 1)
+        self.assertEqual(report['failures'][0]['line'], 5)
+
+
+class AuditFindTests(unittest.TestCase):
+
+    RECORDS = [
+        b'0.main - [03/Jan/2018:23:46:08 EST] [14] [6] [AuditEvent=AUTH]'
+        b'[SubjectID=caadmin][Outcome=Success][AuthMgr=certUserDBAuthMgr] auth',
+        b'0.main - [03/Jan/2018:23:46:11 EST] [14] [6] [AuditEvent=CERT_REQUEST_PROCESSED]'
+        b'[SubjectID=caadmin][Outcome=Failure][ReqID=8] certificate request processed',
+        b'0.main - [04/Jan/2018:08:00:00 EST] [14] [6] [AuditEvent=AUTH]'
+        b'[SubjectID=agent][Outcome=Failure][AuthMgr=certUserDBAuthMgr] auth',
+    ]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.log_dir = os.path.join(self.tmpdir, 'logs')
+        self.index_dir = os.path.join(self.tmpdir, 'index')
+        os.mkdir(self.log_dir)
+
+        with open(os.path.join(self.log_dir, 'audit.log.1'), 'wb') as f:
+            f.write(b'\n'.join(self.RECORDS[:2]) + b'\n')
+
+        with open(os.path.join(self.log_dir, 'audit.log'), 'wb') as f:
+            f.write(self.RECORDS[2] + b'\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def find(self, **kwargs):
+        return list(pki.server.audit.find_audit_records(
+            self.log_dir, ['audit.log.1', 'audit.log'], self.index_dir, **kwargs))
+
+    def test_find_audit_records(self):
+
+        records = self.find(event='AUTH')
+        self.assertEqual(
+            [(f, n) for f, n, _ in records],
+            [('audit.log.1', 1), ('audit.log', 1)])
+
+        self.assertTrue(os.path.exists(os.path.join(self.index_dir, 'audit.log.1.json')))
+
+        records = self.find(outcome='failure', subject='caadmin')
+        self.assertEqual(records, [('audit.log.1', 2, self.RECORDS[1].decode())])
+
+        records = self.find(start='2018-01-04')
+        self.assertEqual([(f, n) for f, n, _ in records], [('audit.log', 1)])
+
+        records = self.find(end='2018-01-03')
+        self.assertEqual(len(records), 2)
+
+        # new records are added to the existing index
+        with open(os.path.join(self.log_dir, 'audit.log'), 'ab') as f:
+            f.write(self.RECORDS[0] + b'\n')
+
+        records = self.find(event='AUTH', subject='caadmin')
+        self.assertEqual(
+            [(f, n) for f, n, _ in records],
+            [('audit.log.1', 1), ('audit.log', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
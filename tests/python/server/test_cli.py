@@ -0,0 +1,54 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import contextlib
+import io
+import sys
+import unittest
+
+import pki.cli
+import pki.server.cli
+
+
+class PKIServerCLITests(unittest.TestCase):
+
+    def test_lazy_modules(self):
+        cli = pki.server.cli.PKIServerCLI()
+
+        # the help message does not require the modules
+        for name, _, _, _ in pki.server.cli.MODULES:
+            self.assertIsInstance(cli.modules[name], pki.cli.LazyModule)
+
+        module = cli.find_module('ca-audit-file-find')
+        self.assertEqual(module.get_full_name(), 'ca-audit-file-find')
+        self.assertIn('pki.server.cli.ca', sys.modules)
+        self.assertNotIsInstance(cli.modules['ca'], pki.cli.LazyModule)
+
+    def test_module_registry(self):
+        cli = pki.server.cli.PKIServerCLI()
+
+        # the registry must match the actual modules
+        for name, description, _, _ in pki.server.cli.MODULES:
+            module = cli.get_module(name)
+            self.assertEqual(module.name, name)
+            self.assertEqual(module.description, description)
+            self.assertIs(module.parent, cli)
+
+    def test_audit_verify_workers(self):
+        cli = pki.server.cli.PKIServerCLI()
+        module = cli.find_module('ca-audit-file-verify')
+
+        # invalid numbers of workers are rejected before verification
+        for workers in ['0', '-1', 'many']:
+            with self.assertRaises(SystemExit) as cm, \
+                    contextlib.redirect_stdout(io.StringIO()):
+                module.execute(['--workers', workers])
+
+            self.assertEqual(cm.exception.code, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import unittest
+from unittest import mock
+
+import pki.nssdb
+from pki.server.deployment.scriptlets import keygen
+
+
+class KeygenTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.scriptlet = keygen.PkiScriptlet()
+
+        self.deployer = mock.Mock()
+        self.deployer.mdict = {
+            'pki_keygen_workers': '',
+            'pki_hsm_enable': 'False'
+        }
+
+        self.subsystem = mock.Mock()
+        self.subsystem.instance.nssdb_dir = '/var/lib/pki/pki-tomcat/conf/alias'
+
+        patcher = mock.patch.object(
+            pki.nssdb.NSSDatabase, 'get_dbtype', return_value='sql')
+        self.get_dbtype = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch('os.cpu_count', return_value=8)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_keygen_workers(self, count):
+        return self.scriptlet.get_keygen_workers(self.deployer, self.subsystem, count)
+
+    def test_default_workers(self):
+
+        # one worker per CSR up to the number of CPUs
+        self.assertEqual(self.get_keygen_workers(4), 4)
+        self.assertEqual(self.get_keygen_workers(10), 8)
+        self.assertEqual(self.get_keygen_workers(1), 1)
+
+    def test_configured_workers(self):
+
+        self.deployer.mdict['pki_keygen_workers'] = '2'
+        self.assertEqual(self.get_keygen_workers(4), 2)
+
+        # the configured number also applies to HSMs
+        self.deployer.mdict['pki_hsm_enable'] = 'True'
+        self.assertEqual(self.get_keygen_workers(4), 2)
+
+    def test_hsm(self):
+
+        self.deployer.mdict['pki_hsm_enable'] = 'True'
+        self.assertEqual(self.get_keygen_workers(4), 1)
+
+    def test_dbm_database(self):
+
+        self.get_dbtype.return_value = 'dbm'
+        self.assertEqual(self.get_keygen_workers(4), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
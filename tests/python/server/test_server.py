@@ -19,8 +19,20 @@
 # All rights reserved.
 #
 
+import concurrent.futures
+import os
+import shutil
+import tempfile
+import time
 import unittest
+from unittest import mock
+import zipfile
 
+import ldap
+import ldap.controls
+
+import pki.server
+import pki.util
 from pki.server.instance import PKIInstance
 from pki.server.subsystem import PKISubsystem
 
@@ -64,6 +76,184 @@ class PKIServerTests(unittest.TestCase):
         d.pop(casub)
         self.assertNotIn(casub, d)
 
+    def test_load_audit_events_from_jar(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache_dir = pki.server.CACHE_DIR
+            pki.server.CACHE_DIR = os.path.join(tmpdir, 'cache')
+
+            jar_file = os.path.join(tmpdir, 'pki-cmsbundle.jar')
+            with zipfile.ZipFile(jar_file, 'w') as jar:
+                jar.writestr('audit-events.properties', '\n'.join([
+                    '# Event: CERT_REQUEST_PROCESSED',
+                    '# Applicable subsystems: CA, KRA',
+                    '# Enabled by default: Yes',
+                    '#',
+                    '# Event: OCSP_SIGNING_INFO',
+                    '# Applicable subsystems: OCSP',
+                    '# Enabled by default: No',
+                ]))
+
+            events = pki.server.PKIServer.load_audit_events_from_jar(jar_file)
+            self.assertEqual(sorted(events), ['CERT_REQUEST_PROCESSED', 'OCSP_SIGNING_INFO'])
+            self.assertEqual(events['CERT_REQUEST_PROCESSED']['subsystems'], ['CA', 'KRA'])
+            self.assertTrue(events['CERT_REQUEST_PROCESSED']['enabled_by_default'])
+            self.assertFalse(events['OCSP_SIGNING_INFO']['enabled_by_default'])
+
+            # load from the on-disk cache
+            pki.server.AUDIT_EVENTS.clear()
+            cache_files = os.listdir(os.path.join(pki.server.CACHE_DIR, 'audit-events'))
+            self.assertEqual(len(cache_files), 1)
+            self.assertEqual(pki.server.PKIServer.load_audit_events_from_jar(jar_file), events)
+
+        finally:
+            pki.server.CACHE_DIR = cache_dir
+            pki.server.AUDIT_EVENTS.clear()
+            shutil.rmtree(tmpdir)
+
+    def test_lazy_subsystem_load(self):
+        tmpdir = tempfile.mkdtemp()
+        base_dir = pki.server.PKIServer.BASE_DIR
+        try:
+            pki.server.PKIServer.BASE_DIR = tmpdir
+
+            conf_dir = os.path.join(tmpdir, 'pki-tomcat', 'ca', 'conf')
+            os.makedirs(conf_dir)
+            cs_conf = os.path.join(conf_dir, 'CS.cfg')
+            pki.util.store_properties(cs_conf, {'cs.type': 'CA', 'ca.name': 'a'})
+
+            instance = PKIInstance('pki-tomcat')
+            instance.load()
+            self.assertIn('subsystems', instance.pending)
+
+            ca = instance.get_subsystem('ca')
+            self.assertNotIn('subsystems', instance.pending)
+            self.assertIn('config', ca.pending)
+
+            self.assertEqual(ca.type, 'CA')
+            self.assertEqual(ca.config['ca.name'], 'a')
+            self.assertIn(cs_conf, pki.server.PROPERTIES)
+
+            # modified file is loaded again
+            pki.util.store_properties(cs_conf, {'cs.type': 'CA', 'ca.name': 'b'})
+            ca.load()
+            self.assertEqual(ca.config['ca.name'], 'b')
+
+            # concurrent first access waits for the config to be loaded
+            load_properties = instance.load_properties
+
+            def slow_load_properties(filename, properties):
+                time.sleep(0.1)
+                load_properties(filename, properties)
+
+            ca.load()
+
+            with mock.patch.object(
+                    instance, 'load_properties',
+                    side_effect=slow_load_properties) as mock_load_properties, \
+                    concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                names = list(executor.map(lambda _: ca.config['ca.name'], range(4)))
+
+            self.assertEqual(names, ['b'] * 4)
+            mock_load_properties.assert_called_once()
+
+        finally:
+            pki.server.PKIServer.BASE_DIR = base_dir
+            pki.server.PROPERTIES.clear()
+            shutil.rmtree(tmpdir)
+
+    def test_database_search(self):
+
+        entries = [('cn=%d,ou=requests' % n, {'cn': [b'%d' % n]}) for n in range(5)]
+        cookies = []
+
+        def search_ext(base_dn, scope, search_filter, attrs, serverctrls):
+            control = serverctrls[0]
+            cookies.append(control.cookie)
+            # use the page offset as message ID
+            return int(control.cookie or 0)
+
+        def result3(msgid):
+            end = msgid + 2
+            control = ldap.controls.SimplePagedResultsControl(
+                criticality=False, size=0,
+                cookie=str(end) if end < len(entries) else '')
+            # include a search reference
+            page = entries[msgid:end] + [(None, ['ldap://replica'])]
+            return ldap.RES_SEARCH_RESULT, page, msgid, [control]
+
+        con = pki.server.PKIDatabaseConnection()
+        con.ldap = mock.Mock()
+        con.ldap.search_ext.side_effect = search_ext
+        con.ldap.result3.side_effect = result3
+
+        results = list(con.search('ou=requests', attrs=['cn'], page_size=2))
+
+        self.assertEqual(results, entries)
+        self.assertEqual(cookies, ['', '2', '4'])
+
+        # paging disabled
+        con.ldap.search_s.return_value = entries
+        self.assertEqual(list(con.search('ou=requests', page_size=0)), entries)
+
+    @mock.patch('ldap.set_option')
+    @mock.patch('ldap.initialize')
+    def test_database_pool(self, initialize, set_option):
+
+        initialize.side_effect = lambda url: mock.Mock()
+
+        def create_connection(bind_dn='cn=Directory Manager'):
+            con = pki.server.PKIDatabaseConnection('ldaps://ds.example.com:636')
+            con.set_security_database('/var/lib/pki/pki-tomcat/alias')
+            con.set_credentials(bind_dn=bind_dn, bind_password='Secret.123')
+            return con
+
+        pool = pki.server.PKIDatabaseConnectionPool(idle_timeout=60, check_interval=5)
+        self.addCleanup(pool.close)
+
+        con = pool.get_connection(create_connection())
+        con.close()
+
+        # TLS options are set on the connection only
+        set_option.assert_not_called()
+        con.ldap.set_option.assert_any_call(
+            ldap.OPT_X_TLS_CACERTDIR, '/var/lib/pki/pki-tomcat/alias')
+        con.ldap.simple_bind_s.assert_called_once_with('cn=Directory Manager', 'Secret.123')
+
+        # equivalent connections are reused
+        self.assertIs(pool.get_connection(create_connection()), con)
+
+        other = pool.get_connection(create_connection(bind_dn='cn=admin'))
+        self.assertIsNot(other, con)
+        self.assertEqual(initialize.call_count, 2)
+
+        con.close()
+        other.close()
+
+        # closing a connection twice does not return it to the pool twice
+        con.close()
+        self.assertEqual(len(pool.connections[con.get_key()]), 1)
+        self.assertIs(pool.get_connection(create_connection()), con)
+        self.assertFalse(pool.connections[con.get_key()])
+        con.close()
+
+        # broken connections are replaced after the health check
+        ldap_con = con.ldap
+        ldap_con.search_s.side_effect = ldap.SERVER_DOWN()
+        con.last_used -= 10
+
+        new_con = pool.get_connection(create_connection())
+        self.assertIsNot(new_con, con)
+        self.assertIsNone(con.ldap)
+        ldap_con.unbind_s.assert_called_once_with()
+        new_con.close()
+
+        # idle connections are closed after the timeout
+        other.last_used -= 120
+        pool.get_connection(create_connection()).close()
+        self.assertIsNone(other.ldap)
+        self.assertEqual(list(pool.connections), [new_con.get_key()])
+
 
 if __name__ == '__main__':
     unittest.main()
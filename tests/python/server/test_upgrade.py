@@ -0,0 +1,287 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import grp
+import os
+import pwd
+import shutil
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+import pki.server
+import pki.server.upgrade
+import pki.upgrade
+import pki.util
+from pki.server.instance import PKIInstance
+
+SCRIPTLETS = {
+    '10.0.0/01-AddAuditEvents.py': '''
+        class AddAuditEvents(pki.server.upgrade.PKIServerUpgradeScriptlet):
+
+            def __init__(self):
+                super().__init__()
+                self.batch_safe = True
+
+            def upgrade_subsystem(self, instance, subsystem):
+                self.backup(subsystem.cs_conf)
+                subsystem.config['log.events'] = 'AUTH'
+                subsystem.save()
+        ''',
+    '10.0.0/02-CheckConfig.py': '''
+        class CheckConfig(pki.server.upgrade.PKIServerUpgradeScriptlet):
+
+            def __init__(self):
+                super().__init__()
+                self.batch_safe = True
+
+            def upgrade_subsystem(self, instance, subsystem):
+                self.backup(subsystem.cs_conf)
+                subsystem.save()
+        ''',
+    '10.1.0/01-UpdateAuditEvents.py': '''
+        class UpdateAuditEvents(pki.server.upgrade.PKIServerUpgradeScriptlet):
+
+            def __init__(self):
+                super().__init__()
+                self.batch_safe = True
+
+            def upgrade_subsystem(self, instance, subsystem):
+                self.backup(subsystem.cs_conf)
+                subsystem.config['log.events'] += ',AUTHZ'
+                subsystem.config.pop('ca.obsolete')
+                subsystem.save()
+        ''',
+}
+
+# scriptlets that modify CS.cfg on disk and in memory
+DIRECT_SCRIPTLETS = {
+    '10.1.0/02-FixConfigFile.py': '''
+        import pki
+
+        class FixConfigFile(pki.server.upgrade.PKIServerUpgradeScriptlet):
+
+            def upgrade_subsystem(self, instance, subsystem):
+                self.backup(subsystem.cs_conf)
+                properties = pki.PropertyFile(subsystem.cs_conf)
+                properties.read()
+                properties.set('ca.fixed', 'true')
+                properties.write()
+        ''',
+    '10.1.0/03-AddConfig.py': '''
+        class AddConfig(pki.server.upgrade.PKIServerUpgradeScriptlet):
+
+            def __init__(self):
+                super().__init__()
+                self.batch_safe = True
+
+            def upgrade_subsystem(self, instance, subsystem):
+                self.backup(subsystem.cs_conf)
+                subsystem.config['ca.added'] = 'true'
+                subsystem.save()
+        ''',
+}
+
+
+class PKIServerUpgraderTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        for name in ['BASE_DIR', 'CONFIG_DIR', 'LOG_DIR', 'REGISTRY_DIR']:
+            patcher = mock.patch.object(
+                pki.server.PKIServer, name, os.path.join(self.tmpdir, name.lower()))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch('pki.upgrade.CACHE_DIR', os.path.join(self.tmpdir, 'cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.addCleanup(pki.server.PROPERTIES.clear)
+        self.addCleanup(pki.upgrade.MANIFESTS.clear)
+
+        self.upgrade_dir = os.path.join(self.tmpdir, 'upgrade')
+
+        self.add_scriptlets(SCRIPTLETS)
+
+        patcher = mock.patch('pki.specification_version', return_value='10.2.0')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_scriptlets(self, scriptlets):
+
+        for path, code in scriptlets.items():
+            filename = os.path.join(self.upgrade_dir, path)
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(filename, 'w') as f:
+                f.write('import pki.server.upgrade\n')
+                f.write(textwrap.dedent(code))
+
+    def create_instance(self, name):
+
+        user = pwd.getpwuid(os.getuid()).pw_name
+        group = grp.getgrgid(os.getgid()).gr_name
+        instance = PKIInstance(name, user=user, group=group)
+
+        os.makedirs(os.path.join(instance.base_dir, 'ca', 'conf'))
+        os.makedirs(instance.conf_dir)
+        os.makedirs(instance.log_dir)
+        os.makedirs(instance.registry_dir)
+
+        with open(instance.registry_file, 'w') as f:
+            f.write('PKI_USER=%s\nPKI_GROUP=%s\n' % (user, group))
+
+        with open(instance.tomcat_conf, 'w') as f:
+            f.write('PKI_VERSION=10.0.0\n')
+
+        pki.util.store_properties(
+            os.path.join(instance.base_dir, 'ca', 'conf', 'CS.cfg'),
+            {'cs.type': 'CA', 'ca.obsolete': 'true'})
+
+        instance.load()
+        return instance
+
+    def read_config(self, instance):
+        with open(instance.get_subsystem('ca').cs_conf) as f:
+            return f.read()
+
+    def test_batch_upgrade(self):
+
+        instance = self.create_instance('sequential')
+        pki.server.upgrade.PKIServerUpgrader(
+            instance, upgrade_dir=self.upgrade_dir).upgrade()
+
+        batch_instance = self.create_instance('batch')
+        upgrader = pki.server.upgrade.PKIServerUpgrader(
+            batch_instance, upgrade_dir=self.upgrade_dir, batch=True)
+
+        with mock.patch('pki.util.write_file', wraps=pki.util.write_file) as write_file:
+            upgrader.upgrade()
+
+        cs_conf = batch_instance.get_subsystem('ca').cs_conf
+        self.assertEqual(
+            [c[0][0] for c in write_file.call_args_list].count(cs_conf), 1)
+
+        self.assertEqual(self.read_config(batch_instance), self.read_config(instance))
+        self.assertEqual(
+            [(str(s.version), s.index) for s, _ in upgrader.timings],
+            [('10.0.0', 1), ('10.0.0', 2), ('10.1.0', 1)])
+        self.assertTrue(upgrader.is_complete())
+
+        # backups contain the config before each scriptlet like in a
+        # sequential upgrade, and unchanged backups are shared
+        backups = {}
+
+        for name in ['sequential', 'batch']:
+            backup_dir = os.path.join(pki.server.PKIServer.LOG_DIR, name, 'backup')
+            backups[name] = [
+                os.path.join(backup_dir, path, 'oldfiles') +
+                os.path.join(pki.server.PKIServer.BASE_DIR, name, 'ca', 'conf', 'CS.cfg')
+                for path in ['10.0.0/1', '10.0.0/2', '10.1.0/1']]
+
+        for sequential_backup, batch_backup in zip(backups['sequential'], backups['batch']):
+            with open(sequential_backup) as f1, open(batch_backup) as f2:
+                self.assertEqual(f2.read(), f1.read())
+
+        self.assertNotEqual(
+            os.stat(backups['batch'][0]).st_ino,
+            os.stat(backups['batch'][1]).st_ino)
+        self.assertEqual(
+            os.stat(backups['batch'][1]).st_ino,
+            os.stat(backups['batch'][2]).st_ino)
+
+    def test_batch_upgrade_direct_changes(self):
+
+        self.add_scriptlets(DIRECT_SCRIPTLETS)
+
+        instance = self.create_instance('sequential')
+        pki.server.upgrade.PKIServerUpgrader(
+            instance, upgrade_dir=self.upgrade_dir).upgrade()
+
+        batch_instance = self.create_instance('batch')
+        pki.server.upgrade.PKIServerUpgrader(
+            batch_instance, upgrade_dir=self.upgrade_dir, batch=True).upgrade()
+
+        # changes made on disk are kept by the later scriptlets
+        config = self.read_config(batch_instance)
+        self.assertIn('ca.fixed=true', config)
+        self.assertIn('ca.added=true', config)
+        self.assertIn('log.events=AUTH,AUTHZ', config)
+        self.assertEqual(config, self.read_config(instance))
+
+        # the backup contains the file modified by the scriptlet
+        backups = {}
+
+        for name in ['sequential', 'batch']:
+            backups[name] = os.path.join(
+                pki.server.PKIServer.LOG_DIR, name, 'backup', '10.1.0', '3', 'oldfiles') + \
+                os.path.join(pki.server.PKIServer.BASE_DIR, name, 'ca', 'conf', 'CS.cfg')
+
+        with open(backups['sequential']) as f1, open(backups['batch']) as f2:
+            content = f2.read()
+            self.assertEqual(content, f1.read())
+            self.assertIn('ca.fixed=true', content)
+
+    def test_batch_upgrade_conflict(self):
+
+        # a batch-safe scriptlet must not modify the file on disk
+        # while there are changes in memory
+        self.add_scriptlets({
+            '10.1.0/02-FixConfigFile.py': '''
+                import pki
+
+                class FixConfigFile(pki.server.upgrade.PKIServerUpgradeScriptlet):
+
+                    def __init__(self):
+                        super().__init__()
+                        self.batch_safe = True
+
+                    def upgrade_subsystem(self, instance, subsystem):
+                        properties = pki.PropertyFile(subsystem.cs_conf)
+                        properties.read()
+                        properties.set('ca.fixed', 'true')
+                        properties.write()
+                ''',
+        })
+
+        instance = self.create_instance('batch')
+        upgrader = pki.server.upgrade.PKIServerUpgrader(
+            instance, upgrade_dir=self.upgrade_dir, batch=True)
+
+        with self.assertRaisesRegex(Exception, 'modified .* outside of save'):
+            upgrader.upgrade()
+
+        # the changes of the completed scriptlets are stored
+        self.assertIn('log.events=AUTH,AUTHZ', self.read_config(instance))
+        self.assertEqual(str(upgrader.get_current_version()), '10.1.0')
+
+    def test_upgrade_instances(self):
+
+        self.create_instance('tenant1')
+        instance = self.create_instance('tenant2')
+
+        # make the last scriptlet fail
+        subsystem = instance.get_subsystem('ca')
+        del subsystem.config['ca.obsolete']
+        subsystem.save()
+
+        results = list(pki.server.upgrade.upgrade_instances(
+            ['tenant1', 'tenant2'], upgrade_dir=self.upgrade_dir))
+
+        self.assertEqual(
+            [(r['instance'], r['from_version'], r['to_version'], r['scriptlets'], r['status'])
+             for r in results],
+            [('tenant1', '10.0.0', '10.2.0', 3, 'OK'),
+             ('tenant2', '10.0.0', '10.1.0', 2, 'FAILED')])
+        self.assertIn('ca.obsolete', results[1]['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pki.server.subsystem
+from pki.server.instance import PKIInstance
+from pki.server.subsystem import PKIServerWorker
+from pki.server.subsystem import PKISubsystem
+
+# worker that uses the same framing as org.dogtagpki.server.cli.PKIServerWorker
+FAKE_WORKER = '''
+import os
+import struct
+import sys
+
+stdin = sys.stdin.buffer
+stdout = sys.stdout.buffer
+
+
+def read(size):
+    data = stdin.read(size)
+    if len(data) < size:
+        sys.exit(0)
+    return data
+
+
+def read_int():
+    return struct.unpack('>i', read(4))[0]
+
+
+def read_bytes():
+    return read(read_int())
+
+
+def write_bytes(data):
+    stdout.write(struct.pack('>i', len(data)))
+    stdout.write(data)
+
+
+while True:
+    args = [read_bytes().decode('utf-8') for _ in range(read_int())]
+    data = read_bytes()
+
+    if args[0] == 'exit':
+        sys.exit(1)
+
+    elif args[0] == 'pid':
+        rc, out, err = 0, str(os.getpid()).encode('utf-8'), b''
+
+    elif args[0] == 'echo':
+        rc, out, err = 0, data, b''
+
+    elif args[0] == 'args':
+        rc, out, err = 0, '\\n'.join(args[1:]).encode('utf-8'), b''
+
+    else:
+        rc, out, err = 3, b'output', b'error'
+
+    stdout.write(struct.pack('>i', rc))
+    write_bytes(out)
+    write_bytes(err)
+    stdout.flush()
+'''
+
+
+class PKIServerWorkerTests(unittest.TestCase):
+
+    def setUp(self):
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+
+        script = os.path.join(tmpdir, 'worker.py')
+        with open(script, 'w') as f:
+            f.write(FAKE_WORKER)
+
+        self.cmd = [sys.executable, script]
+
+    def create_worker(self, idle_timeout=60):
+        worker = PKIServerWorker(self.cmd, idle_timeout)
+        self.addCleanup(worker.close)
+        return worker
+
+    def test_execute(self):
+
+        worker = self.create_worker()
+
+        self.assertEqual(
+            worker.execute(['args', 'ca-user-find', '--name', 'Ünïcode', '']),
+            (0, 'ca-user-find\n--name\nÜnïcode\n'.encode('utf-8'), b''))
+
+        self.assertEqual(worker.execute(['echo'], input='data'), (0, b'data', b''))
+        self.assertEqual(worker.execute(['echo'], input=b'\x00\xff'), (0, b'\x00\xff', b''))
+        self.assertEqual(worker.execute(['echo']), (0, b'', b''))
+        self.assertEqual(worker.execute(['fail']), (3, b'output', b'error'))
+
+        # the commands are executed by the same process
+        pid = worker.execute(['pid'])[1]
+        self.assertEqual(worker.execute(['pid'])[1], pid)
+        self.assertEqual(int(pid), worker.process.pid)
+
+    def test_worker_exit(self):
+
+        worker = self.create_worker()
+        pid = worker.execute(['pid'])[1]
+
+        with self.assertRaisesRegex(Exception, 'terminated unexpectedly'):
+            worker.execute(['exit'])
+
+        self.assertIsNone(worker.process)
+
+        # a new worker is started for the next command
+        self.assertNotEqual(worker.execute(['pid'])[1], pid)
+
+    def test_idle_timeout(self):
+
+        worker = self.create_worker(idle_timeout=60)
+        pid = worker.execute(['pid'])[1]
+
+        worker.last_used -= 20
+        self.assertEqual(worker.execute(['pid'])[1], pid)
+
+        # a worker that might be exiting is replaced
+        worker.last_used -= 40
+        self.assertNotEqual(worker.execute(['pid'])[1], pid)
+
+    @mock.patch.dict(pki.server.subsystem.WORKERS, clear=True)
+    def test_run_in_worker(self):
+
+        self.addCleanup(pki.server.subsystem.close_workers)
+
+        subsystem = PKISubsystem(PKIInstance('pki-tomcat'), 'ca')
+        subsystem.worker_timeout = 60
+
+        result = subsystem.run_in_worker(
+            self.cmd, ['echo'], input='data', capture_output=True)
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, b'data')
+        self.assertEqual(result.args[-2:], ['org.dogtagpki.server.cli.PKIServerCLI', 'echo'])
+
+        # non-zero exit code raises an exception and writes stderr
+        stderr = io.StringIO()
+
+        with mock.patch('sys.stderr', stderr), \
+                self.assertRaises(subprocess.CalledProcessError) as cm:
+            subsystem.run_in_worker(self.cmd, ['fail'], capture_output=True)
+
+        self.assertEqual(cm.exception.returncode, 3)
+        self.assertEqual(cm.exception.output, b'output')
+        self.assertEqual(stderr.getvalue(), 'error')
+
+        # commands with different JVM options use separate workers
+        pid = subsystem.run_in_worker(self.cmd, ['pid'], capture_output=True).stdout
+        other_pid = subsystem.run_in_worker(
+            self.cmd + ['-Dfoo=bar'], ['pid'], capture_output=True).stdout
+
+        self.assertNotEqual(other_pid, pid)
+        self.assertEqual(len(pki.server.subsystem.WORKERS), 2)
+
+        # interrupted command stops the worker
+        worker = pki.server.subsystem.WORKERS[
+            ('pki-tomcat', 'ca', False, tuple(self.cmd))]
+
+        with mock.patch.object(worker, 'read', side_effect=KeyboardInterrupt):
+            self.assertIsNone(subsystem.run_in_worker(self.cmd, ['pid']))
+
+        self.assertIsNone(worker.process)
+
+        self.assertNotEqual(
+            subsystem.run_in_worker(self.cmd, ['pid'], capture_output=True).stdout, pid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import os
+import shutil
+import tempfile
+from unittest import mock
+import unittest
+
+import pki.cache
+
+
+class CacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_lru_eviction(self):
+
+        cache = pki.cache.Cache(max_size=2)
+
+        cache.put('a', {'id': 'a'})
+        cache.put('b', {'id': 'b'})
+        cache.get('a')
+        cache.put('c', {'id': 'c'})
+
+        self.assertEqual(cache.get('a'), ({'id': 'a'}, False))
+        self.assertIsNone(cache.get('b'))
+
+        stats = cache.get_stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_ttl(self):
+
+        filename = os.path.join(self.tmpdir, 'cache.db')
+        cache = pki.cache.Cache(filename=filename, ttl=3600, status_ttl=60)
+
+        with mock.patch('time.time', return_value=1000):
+            cache.put('cert:0x1', {'Status': 'VALID'})
+            cache.put('request:1', {'requestStatus': 'complete'}, final=True)
+
+        cache.close()
+
+        # entries are reloaded from the database
+        cache = pki.cache.Cache(filename=filename, ttl=3600, status_ttl=60)
+
+        with mock.patch('time.time', return_value=1030):
+            self.assertEqual(cache.get('cert:0x1'), ({'Status': 'VALID'}, False))
+
+        with mock.patch('time.time', return_value=1100):
+            self.assertEqual(cache.get('cert:0x1'), ({'Status': 'VALID'}, True))
+            self.assertEqual(cache.get('request:1'), ({'requestStatus': 'complete'}, False))
+            cache.validate('cert:0x1')
+
+        with mock.patch('time.time', return_value=1120):
+            self.assertEqual(cache.get('cert:0x1'), ({'Status': 'VALID'}, False))
+
+        with mock.patch('time.time', return_value=5000):
+            self.assertIsNone(cache.get('cert:0x1'))
+
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,330 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+import unittest
+
+import pki.cache
+import pki.cert
+
+
+class Response(object):
+
+    def __init__(self):
+        self.data = None
+
+    @property
+    def content(self):
+        return json.dumps(self.data).encode()
+
+    def json(self):
+        return self.data
+
+
+class CertClientTests(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = mock.MagicMock()
+        self.connection.subsystem = 'ca'
+        self.connection.serverURI = 'https://pki.example.com:8443/ca'
+        self.cert_client = pki.cert.CertClient(self.connection)
+
+    def test_iter_certs(self):
+
+        serial_numbers = ['0x%x' % n for n in range(1, 8)]
+
+        def post(path, payload, headers, params):
+            start = params['start']
+            size = params['size']
+            response = Response()
+            response.data = {
+                'total': len(serial_numbers),
+                'entries': [{'id': serial_number, 'Status': 'VALID'}
+                            for serial_number in serial_numbers[start:start + size]],
+                'Link': []
+            }
+            return response
+
+        self.connection.post.side_effect = post
+
+        for prefetch in [False, True]:
+            self.connection.post.reset_mock()
+
+            certs = self.cert_client.iter_certs(size=3, prefetch=prefetch, status='VALID')
+
+            self.assertEqual([cert.serial_number for cert in certs], serial_numbers)
+            self.assertEqual(
+                [c[0][3]['start'] for c in self.connection.post.call_args_list],
+                [0, 3, 6])
+
+    def test_iter_requests(self):
+
+        def get(path, headers, params):
+            start = params['start'] or 1
+            end = min(start + params['pageSize'], 6)
+            response = Response()
+            response.data = {
+                'total': 5,
+                'entries': [{'requestURL': 'https://pki.example.com/ca/rest/certrequests/%d' % n}
+                            for n in range(start, end)],
+                'Link': []
+            }
+            return response
+
+        self.connection.get.side_effect = get
+
+        requests = self.cert_client.iter_requests(size=2)
+
+        self.assertEqual([r.request_id for r in requests], ['1', '2', '3', '4', '5'])
+        self.assertEqual(
+            [c[0][2]['start'] for c in self.connection.get.call_args_list],
+            [None, 3, 5])
+
+    def test_iter_requests_hex(self):
+
+        def get(path, headers, params):
+            start = pki.cert.parse_request_id(params['start'])
+            end = min(start + params['pageSize'], 0x15)
+            response = Response()
+            response.data = {
+                'total': 5,
+                'entries': [{'requestURL': 'https://pki.example.com/ca/rest/certrequests/0x%x' % n}
+                            for n in range(start, end)],
+                'Link': []
+            }
+            return response
+
+        self.connection.get.side_effect = get
+
+        requests = self.cert_client.iter_requests(from_request_id='0x10', size=2)
+
+        self.assertEqual(
+            [r.request_id for r in requests],
+            ['0x10', '0x11', '0x12', '0x13', '0x14'])
+        self.assertEqual(
+            [c[0][2]['start'] for c in self.connection.get.call_args_list],
+            ['0x10', 0x12, 0x14])
+
+    def test_enroll_certs(self):
+
+        base_url = 'https://pki.example.com/ca/rest'
+
+        def get(path, headers=None, params=None):
+            response = Response()
+            if path.endswith('/profiles/caUserCert'):
+                response.data = {
+                    'ProfileID': 'caUserCert',
+                    'Input': [{
+                        'id': 'i1',
+                        'Attribute': [{'name': 'cert_request', 'Value': None}],
+                        'ConfigAttribute': []
+                    }]
+                }
+            elif '/agent/certrequests/' in path:
+                response.data = {
+                    'requestId': path.rsplit('/', 1)[1],
+                    'ProfilePolicySet': []
+                }
+            elif '/certrequests/' in path:
+                request_id = path.rsplit('/', 1)[1]
+                response.data = {
+                    'requestURL': '%s/certrequests/%s' % (base_url, request_id),
+                    'requestStatus': 'complete',
+                    'certId': '0x' + request_id
+                }
+            else:
+                response.data = {'id': path.rsplit('/', 1)[1]}
+            return response
+
+        def post(path, payload, headers=None, params=None):
+            response = Response()
+            if path.endswith('/certrequests'):
+                request_id = payload.split('csr-')[1].split('"')[0]
+                response.data = {
+                    'entries': [{
+                        'requestURL': '%s/certrequests/%s' % (base_url, request_id),
+                        'requestStatus': 'rejected' if request_id == '3' else 'pending'
+                    }],
+                    'Link': []
+                }
+            elif path.endswith('/5/approve'):
+                raise ValueError(path)
+            return response
+
+        self.connection.get.side_effect = get
+        self.connection.post.side_effect = post
+
+        enrollments = (('caUserCert', {'cert_request': 'csr-%d' % n}) for n in range(1, 9))
+        histograms = {}
+
+        results = list(self.cert_client.enroll_certs(
+            enrollments, workers=3, return_exceptions=True, histograms=histograms))
+
+        self.assertEqual(len(results), 8)
+
+        certs = sorted(r.cert.serial_number for r in results if r.cert)
+        self.assertEqual(certs, ['0x1', '0x2', '0x4', '0x6', '0x7', '0x8'])
+
+        rejected = [r for r in results if r.request and not r.cert]
+        self.assertEqual([r.request.request_id for r in rejected], ['3'])
+
+        errors = [r for r in results if r.error]
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0].error, ValueError)
+
+        # failed enrollments can be matched with their input
+        self.assertEqual(errors[0].profile_id, 'caUserCert')
+        self.assertEqual(errors[0].inputs, {'cert_request': 'csr-5'})
+        self.assertEqual(errors[0].index, 4)
+
+        self.assertEqual(sorted(r.index for r in results), list(range(8)))
+
+        self.assertEqual(histograms['submit'].count, 8)
+        self.assertEqual(histograms['approve'].count, 7)
+        self.assertEqual(histograms['get_cert'].count, 6)
+        self.assertEqual(histograms['total'].count, 7)
+
+        # the enrollment template is only retrieved once
+        template_calls = [c for c in self.connection.get.call_args_list
+                          if c[0][0].endswith('/profiles/caUserCert')]
+        self.assertEqual(len(template_calls), 1)
+
+    def test_revoke_certs(self):
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        journal = os.path.join(tmpdir, 'journal')
+
+        def get(path, headers=None, params=None):
+            response = Response()
+            response.data = {'id': path.rsplit('/', 1)[1], 'Nonce': 1}
+            return response
+
+        def post(path, payload, headers=None, params=None):
+            serial_number = path.split('/')[-2]
+            if serial_number == '0x3':
+                raise ValueError(serial_number)
+            response = Response()
+            response.data = {
+                'requestURL': 'https://pki.example.com/ca/rest/certrequests/1',
+                'operationResult': 'success'
+            }
+            return response
+
+        self.connection.get.side_effect = get
+        self.connection.post.side_effect = post
+
+        serial_numbers = ['1', '0x2', 'bogus', '3', '0X04', 5]
+        summary = {}
+
+        results = dict(self.cert_client.revoke_certs(
+            serial_numbers, revocation_reason='Key_Compromise', workers=2,
+            journal=journal, summary=summary))
+
+        self.assertEqual(sorted(results), ['0x1', '0x2', '0x3', '0x4', '0x5', 'bogus'])
+        self.assertIsInstance(results['0x3'], ValueError)
+        self.assertIsInstance(results['bogus'], ValueError)
+        self.assertEqual(summary['completed'], 4)
+        self.assertEqual(summary['failed'], 2)
+
+        with open(journal) as f:
+            self.assertEqual(sorted(f.read().split()), ['0x1', '0x2', '0x4', '0x5'])
+
+        # only the failed certificate is retried
+        self.connection.post.reset_mock()
+
+        results = dict(self.cert_client.revoke_certs(
+            serial_numbers, journal=journal, summary=summary))
+
+        self.assertEqual(sorted(results), ['0x3', 'bogus'])
+        self.assertEqual(summary['skipped'], 4)
+        self.assertEqual(self.connection.post.call_count, 1)
+
+        # certificates submitted before an input error are completed
+        # and recorded in the journal
+        os.remove(journal)
+
+        def read_serial_numbers():
+            yield '0x1'
+            yield '0x2'
+            raise OSError('Read error')
+
+        results = []
+
+        with self.assertRaises(OSError):
+            for result in self.cert_client.revoke_certs(
+                    read_serial_numbers(), workers=2, journal=journal, summary=summary):
+                results.append(result[0])
+
+        self.assertEqual(sorted(results), ['0x1', '0x2'])
+        self.assertEqual(summary['completed'], 2)
+
+        with open(journal) as f:
+            self.assertEqual(sorted(f.read().split()), ['0x1', '0x2'])
+
+    def test_get_cert_cache(self):
+
+        cache = pki.cache.Cache(status_ttl=60)
+        cert_client = pki.cert.CertClient(self.connection, cache=cache)
+
+        def get(path, headers=None, params=None):
+            response = Response()
+            response.data = {'id': '0x1', 'Status': 'VALID', 'Encoded': '...'}
+            return response
+
+        def post(path, payload, headers=None, params=None):
+            response = Response()
+            response.data = {
+                'total': 1,
+                'entries': [{'id': '0x1', 'Status': 'VALID'}]
+            }
+            return response
+
+        self.connection.get.side_effect = get
+        self.connection.post.side_effect = post
+
+        with mock.patch('time.time', return_value=1000):
+            cert_client.get_cert(1)
+            cert_client.get_cert('0x1')
+
+        self.assertEqual(self.connection.get.call_count, 1)
+
+        # stale status is validated with a search instead of a full retrieval
+        with mock.patch('time.time', return_value=1100):
+            cert = cert_client.get_cert('1')
+
+        self.assertEqual(cert.status, 'VALID')
+        self.assertEqual(self.connection.get.call_count, 1)
+        self.assertEqual(self.connection.post.call_count, 1)
+
+        # revocation invalidates the entry
+        cert_client.revoke_cert('0x1', nonce=1)
+        cert_client.get_cert('0x1')
+        self.assertEqual(self.connection.get.call_count, 2)
+
+        stats = cache.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['stale'], 1)
+        self.assertEqual(stats['revalidations'], 1)
+        self.assertEqual(stats['invalidations'], 1)
+        self.assertEqual(stats['misses'], 2)
+
+        # clients of other servers do not share the entries
+        connection = mock.MagicMock()
+        connection.serverURI = 'https://other.example.com:8443'
+        connection.get.side_effect = get
+        other_client = pki.cert.CertClient(connection, cache=cache)
+
+        other_client.get_cert('0x1')
+        self.assertEqual(connection.get.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
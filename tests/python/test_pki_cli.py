@@ -0,0 +1,50 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import unittest
+from unittest import mock
+
+import pki.cli.ca
+import pki.cli.main
+
+
+@mock.patch.dict('os.environ', {'PKI_CLI_OPTIONS': ''})
+class PKICLITests(unittest.TestCase):
+
+    def test_python_batch_command(self):
+
+        cli = pki.cli.main.PKICLI()
+
+        with mock.patch.object(pki.cli.ca.CACertRevokeCLI, 'execute') as execute:
+            cli.execute([
+                'pki', '-U', 'https://ca.example.com:8443', '-n', 'caadmin',
+                '-d', '/tmp/nssdb', 'ca-cert-revoke', '--input-file', 'serials.txt'])
+
+        execute.assert_called_once_with(['--input-file', 'serials.txt'])
+
+        # global options are available to the Python module
+        self.assertEqual(cli.url, 'https://ca.example.com:8443')
+        self.assertEqual(cli.nickname, 'caadmin')
+        self.assertEqual(cli.database, '/tmp/nssdb')
+
+    def test_java_command(self):
+
+        cli = pki.cli.main.PKICLI()
+
+        with mock.patch.object(cli, 'execute_java') as execute_java:
+            cli.execute([
+                'pki', '-h', 'ca.example.com', '-u', 'caadmin', '-w', 'Secret.123',
+                '--ignore-banner', 'ca-cert-revoke', '0x1'])
+
+        # options with values are not mistaken for the command
+        execute_java.assert_called_once_with([
+            '-u', 'caadmin', '-w', 'Secret.123', 'ca-cert-revoke', '0x1'])
+        self.assertEqual(cli.hostname, 'ca.example.com')
+        self.assertTrue(cli.ignore_banner)
+
+
+if __name__ == '__main__':
+    unittest.main()
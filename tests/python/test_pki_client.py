@@ -0,0 +1,103 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import asyncio
+import threading
+import time
+import unittest
+
+import pki.client
+
+
+class PKIConnectionTests(unittest.TestCase):
+
+    def tearDown(self):
+        pki.client.close_connection_pools()
+        pki.client.SSL_CONTEXTS.clear()
+
+    def test_shared_connection_pool(self):
+
+        conn1 = pki.client.PKIConnection('https', 'pki.example.com', '8443')
+        conn2 = pki.client.PKIConnection('https', 'pki.example.com', '8443')
+        conn3 = pki.client.PKIConnection('https', 'other.example.com', '8443')
+
+        adapter = conn1.session.get_adapter('https://pki.example.com:8443')
+        self.assertIs(conn2.session.get_adapter('https://pki.example.com:8443'), adapter)
+        self.assertIsNot(conn3.session.get_adapter('https://other.example.com:8443'), adapter)
+
+        # connections with a client cert use a separate pool and context
+        conn2.set_authentication_cert('/tmp/client.pem')
+        adapter2 = conn2.session.get_adapter('https://pki.example.com:8443')
+        self.assertIsNot(adapter2, adapter)
+        self.assertEqual(len(pki.client.SSL_CONTEXTS), 2)
+
+        # connections with the same client cert share the pool
+        conn1.set_authentication_cert('/tmp/client.pem')
+        self.assertIs(conn1.session.get_adapter('https://pki.example.com:8443'), adapter2)
+
+
+class AsyncPKIConnectionTests(unittest.TestCase):
+
+    def tearDown(self):
+        pki.client.close_connection_pools()
+
+    def test_bounded_concurrency(self):
+
+        connection = pki.client.PKIConnection(
+            'https', 'pki.example.com', '8443', pool_size=2)
+
+        # a private pool keeps a connection for each worker
+        async_connection = pki.client.AsyncPKIConnection(connection, max_concurrency=3)
+        self.assertEqual(async_connection.connection.pool_size, 3)
+        self.assertIs(
+            async_connection.connection.session.get_adapter('https://pki.example.com:8443'),
+            async_connection.adapter)
+
+        # the caller's connection is not modified
+        self.assertEqual(connection.pool_size, 2)
+        self.assertIsNot(
+            connection.session.get_adapter('https://pki.example.com:8443'),
+            async_connection.adapter)
+
+        lock = threading.Lock()
+        state = {'active': 0, 'max': 0}
+        consumed = []
+
+        def request(n):
+            with lock:
+                state['active'] += 1
+                state['max'] = max(state['max'], state['active'])
+            time.sleep(0.01)
+            with lock:
+                state['active'] -= 1
+            if n == 5:
+                raise ValueError(n)
+            return n * n
+
+        def items():
+            for n in range(10):
+                consumed.append(n)
+                yield n
+
+        async def run():
+            results = {}
+            async for n, result in async_connection.map(
+                    request, items(), return_exceptions=True):
+                # the iterable is only read ahead by two items per worker
+                self.assertLessEqual(len(consumed), len(results) + 2 * 3 + 1)
+                results[n] = result
+            return results
+
+        results = asyncio.run(run())
+        async_connection.close()
+
+        self.assertEqual(state['max'], 3)
+        self.assertIsInstance(results.pop(5), ValueError)
+        self.assertEqual(results, {n: n * n for n in range(10) if n != 5})
+
+
+if __name__ == '__main__':
+    unittest.main()
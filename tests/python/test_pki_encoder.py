@@ -0,0 +1,203 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import io
+import json
+import unittest
+
+import pki.cert
+import pki.encoder
+import pki.key
+
+
+class Item(object):
+
+    json_attribute_names = {'ItemID': 'item_id'}
+
+    def __init__(self, item_id=None, name=None):
+        self.item_id = item_id
+        self.name = name
+
+
+class SlottedItem(Item):
+
+    __slots__ = ('item_id', 'name')
+
+
+class EncoderTests(unittest.TestCase):
+
+    def tearDown(self):
+        pki.encoder.NOTYPES.pop('Item', None)
+
+    def encode(self, o):
+        return json.loads(json.dumps(o, cls=pki.encoder.CustomTypeEncoder))
+
+    def test_dispatch_cache(self):
+
+        with self.assertRaises(TypeError):
+            self.encode(Item('1'))
+
+        # registering a class discards the cached dispatch
+        pki.encoder.NOTYPES['Item'] = Item
+
+        self.assertEqual(self.encode(Item('1', 'a')), {'ItemID': '1', 'name': 'a'})
+        self.assertEqual(self.encode(SlottedItem('2')), {'ItemID': '2', 'name': None})
+
+        self.assertEqual(pki.encoder.get_slots(SlottedItem), ('item_id', 'name'))
+        self.assertIs(
+            pki.encoder.get_reverse_attribute_names(Item),
+            pki.encoder.get_reverse_attribute_names(Item))
+
+        # removing a class discards the cached dispatch
+        pki.encoder.NOTYPES.pop('Item')
+
+        with self.assertRaises(TypeError):
+            self.encode(Item('1'))
+
+        pki.encoder.NOTYPES.setdefault('Item', Item)
+        self.assertEqual(self.encode(Item('3')), {'ItemID': '3', 'name': None})
+
+    def test_dump(self):
+
+        pki.encoder.NOTYPES['Item'] = Item
+
+        f = io.StringIO()
+        pki.encoder.dump((Item(str(n)) for n in range(3)), f)
+
+        self.assertEqual(
+            [item['ItemID'] for item in json.loads(f.getvalue())],
+            ['0', '1', '2'])
+
+        f = io.StringIO()
+        pki.encoder.dump([], f)
+        self.assertEqual(f.getvalue(), '[]')
+
+
+class ModelTests(unittest.TestCase):
+    """
+    Decode server responses with attributes unknown to the models and
+    check that they are encoded like before the models used __slots__.
+    """
+
+    def tearDown(self):
+        pki.encoder.NOTYPES.pop('CertRequestInfo', None)
+        pki.encoder.NOTYPES.pop('KeyInfo', None)
+        pki.encoder.NOTYPES.pop('KeyRequestInfo', None)
+
+    def decode(self, cls, data):
+        return cls.from_json(pki.encoder.loads(json.dumps(data)))
+
+    def encode(self, o):
+        return json.loads(json.dumps(o, cls=pki.encoder.CustomTypeEncoder))
+
+    def test_cert(self):
+
+        cert = self.decode(pki.cert.CertData, {
+            'id': '0x7',
+            'SubjectDN': 'CN=Test',
+            'Encoded': 'MIIB',
+            'Status': 'VALID',
+            'RevokedOn': 1000,
+            'FutureField': 'value'
+        })
+
+        self.assertEqual(cert.__dict__, {'FutureField': 'value'})
+
+        self.assertEqual(self.encode(cert), {
+            'id': '0x7',
+            'IssuerDN': None,
+            'SubjectDN': 'CN=Test',
+            'PrettyPrint': None,
+            'Encoded': 'MIIB',
+            'binary': None,
+            'PKCS7CertChain': None,
+            'NotBefore': None,
+            'NotAfter': None,
+            'Status': 'VALID',
+            'Nonce': None,
+            'Link': None,
+            'RevokedOn': 1000,
+            'FutureField': 'value'
+        })
+
+    def test_cert_request(self):
+
+        pki.encoder.NOTYPES['CertRequestInfo'] = pki.cert.CertRequestInfo
+
+        request = self.decode(pki.cert.CertRequestInfo, {
+            'requestType': 'enrollment',
+            'requestURL': 'https://pki.example.com:8443/ca/rest/certrequests/7',
+            'requestStatus': 'complete',
+            'certId': '0x7',
+            'realm': 'test',
+            'futureField': ['a', 'b']
+        })
+
+        self.assertEqual(request.__dict__, {'futureField': ['a', 'b']})
+
+        self.assertEqual(self.encode(request), {
+            'request_id': '7',
+            'requestType': 'enrollment',
+            'requestURL': 'https://pki.example.com:8443/ca/rest/certrequests/7',
+            'requestStatus': 'complete',
+            'operationResult': None,
+            'certId': '0x7',
+            'certRequestType': None,
+            'certURL': None,
+            'errorMessage': None,
+            'realm': 'test',
+            'futureField': ['a', 'b']
+        })
+
+    def test_key(self):
+
+        pki.encoder.NOTYPES['KeyInfo'] = pki.key.KeyInfo
+        pki.encoder.NOTYPES['KeyRequestInfo'] = pki.key.KeyRequestInfo
+
+        key = self.decode(pki.key.KeyInfo, {
+            'clientKeyID': 'key1',
+            'keyURL': 'https://pki.example.com:8443/kra/rest/agent/keys/0x1',
+            'algorithm': 'AES',
+            'status': 'active',
+            'size': 128,
+            'futureField': {'nested': True}
+        })
+
+        self.assertEqual(key.__dict__, {'futureField': {'nested': True}})
+
+        self.assertEqual(self.encode(key), {
+            'clientKeyID': 'key1',
+            'keyURL': 'https://pki.example.com:8443/kra/rest/agent/keys/0x1',
+            'algorithm': 'AES',
+            'status': 'active',
+            'ownerName': None,
+            'size': 128,
+            'publicKey': None,
+            'realm': None,
+            'futureField': {'nested': True}
+        })
+
+        request = self.decode(pki.key.KeyRequestInfo, {
+            'requestURL': 'https://pki.example.com:8443/kra/rest/agent/keyrequests/0x2',
+            'requestType': 'securityDataEnrollment',
+            'requestStatus': 'complete',
+            'futureField': None
+        })
+
+        self.assertEqual(request.__dict__, {'futureField': None})
+
+        self.assertEqual(self.encode(request), {
+            'requestURL': 'https://pki.example.com:8443/kra/rest/agent/keyrequests/0x2',
+            'requestType': 'securityDataEnrollment',
+            'keyURL': None,
+            'requestStatus': 'complete',
+            'realm': None,
+            'futureField': None
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,12 +19,23 @@
 # All rights reserved.
 #
 
+import base64
 import binascii
+import datetime
 import os
 import shutil
 import subprocess
 import tempfile
 import unittest
+from unittest import mock
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import pkcs7
+from cryptography.x509.oid import NameOID
 
 from pki import nssdb
 
@@ -164,6 +175,220 @@ class PKINSSDBTests(unittest.TestCase):
         self.assertIn(b'X509v3 Subject Alternative Name: critical', out)
         self.assertIn(b'DNS:example.org', out)
 
+    def test_cert_inventory(self):
+        self.create_db('sql')
+
+        noise_file = os.path.join(self.tmpdir, 'noise')
+        with open(noise_file, 'wb') as f:
+            f.write(os.urandom(2048))
+
+        subprocess.check_call([
+            'certutil',
+            '-S',
+            '-d', self.tmpdir,
+            '-f', self.password_file,
+            '-z', noise_file,
+            '-n', 'ca_signing',
+            '-s', 'CN=CA Signing Certificate',
+            '-x',
+            '-t', 'CTu,Cu,Cu',
+        ])
+
+        db = nssdb.NSSDatabase(self.tmpdir, password_file=self.password_file)
+
+        inventory = db.get_cert_inventory()
+        self.assertEqual(list(inventory), ['ca_signing'])
+
+        der = subprocess.check_output([
+            'certutil',
+            '-L',
+            '-d', self.tmpdir,
+            '-n', 'ca_signing',
+            '-r',
+        ])
+        self.assertEqual(inventory['ca_signing'][0]['data'], der)
+
+        self.assertEqual(db.get_trust('ca_signing'), 'CTu,Cu,Cu')
+        self.assertEqual(
+            db.get_cert('ca_signing', output_format='base64'),
+            base64.b64encode(der).decode('utf-8'))
+        self.assertIsNone(db.get_cert('unknown'))
+        self.assertIsNone(db.get_trust('unknown'))
+
+        db.modify_cert('ca_signing', 'C,C,C')
+        self.assertEqual(db.get_trust('ca_signing'), 'Cu,Cu,Cu')
+
+    def test_password_file(self):
+
+        db = nssdb.NSSDatabase(
+            self.tmpdir,
+            passwords={'internal': 'Secret.123', 'hardware-HSM': 'Secret.456'})
+
+        try:
+            password_file = db.get_password_file(None, None)
+
+            # password files are reused and readable by child processes
+            self.assertEqual(db.get_password_file(None, 'internal'), password_file)
+            self.assertEqual(subprocess.check_output(['cat', password_file]), b'Secret.123')
+            self.assertEqual(
+                subprocess.check_output(['cat', db.get_password_file(None, 'HSM')]),
+                b'Secret.456')
+
+            if nssdb.create_memory_file('test', ''):
+                self.assertEqual(os.listdir(db.tmpdir), [])
+
+        finally:
+            db.close()
+
+    def test_password_file_tmpdir(self):
+
+        tmpdir = os.path.join(self.tmpdir, 'tmp')
+        os.mkdir(tmpdir)
+
+        db = nssdb.NSSDatabase(self.tmpdir)
+
+        try:
+            with mock.patch('pki.nssdb.create_memory_file', return_value=None):
+
+                # without memory files the password is stored in tmpdir
+                password_file = db.create_password_file(tmpdir, 'Secret.123')
+                self.assertEqual(os.path.dirname(password_file), tmpdir)
+                self.assertEqual(os.stat(password_file).st_mode & 0o777, 0o600)
+
+                with open(password_file) as f:
+                    self.assertEqual(f.read(), 'Secret.123')
+
+                other_file = db.create_password_file(tmpdir, 'Secret.123')
+                self.assertNotEqual(other_file, password_file)
+                self.assertEqual(os.path.dirname(other_file), tmpdir)
+
+                # files in the private directory are reused
+                password_file = db.create_password_file(None, 'Secret.123')
+                self.assertEqual(os.path.dirname(password_file), db.tmpdir)
+                self.assertEqual(db.create_password_file(None, 'Secret.123'), password_file)
+
+        finally:
+            db.close()
+
+    def create_cert(self, subject, issuer=None):
+
+        key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        now = datetime.datetime.utcnow()
+
+        cert = x509.CertificateBuilder() \
+            .subject_name(subject) \
+            .issuer_name(issuer[1].subject if issuer else subject) \
+            .public_key(key.public_key()) \
+            .serial_number(x509.random_serial_number()) \
+            .not_valid_before(now) \
+            .not_valid_after(now + datetime.timedelta(days=1)) \
+            .sign(issuer[0] if issuer else key, hashes.SHA256(), default_backend())
+
+        return key, cert
+
+    def test_import_pkcs7(self):
+        self.create_db('sql')
+
+        def name(cn, ou=None):
+            attrs = [x509.NameAttribute(NameOID.COMMON_NAME, cn)]
+            if ou:
+                attrs.append(x509.NameAttribute(NameOID.ORGANIZATIONAL_UNIT_NAME, ou))
+            attrs.append(x509.NameAttribute(NameOID.ORGANIZATION_NAME, u'EXAMPLE'))
+            return x509.Name(attrs)
+
+        root = self.create_cert(name(u'CA Signing Certificate'))
+        sub = self.create_cert(name(u'CA Signing Certificate', u'pki-tomcat'), issuer=root)
+        server = self.create_cert(name(u'server.example.com'), issuer=sub)
+
+        pkcs7_file = os.path.join(self.tmpdir, 'chain.p7b')
+        with open(pkcs7_file, 'wb') as f:
+            f.write(pkcs7.serialize_certificates(
+                [server[1], root[1], sub[1]], serialization.Encoding.PEM))
+
+        db = nssdb.NSSDatabase(self.tmpdir, password_file=self.password_file)
+        db.import_pkcs7(pkcs7_file=pkcs7_file, nickname='sslserver', trust_attributes=',,')
+
+        inventory = db.get_cert_inventory()
+        self.assertEqual(
+            sorted(inventory),
+            [
+                'CA Signing Certificate - EXAMPLE',
+                'CA Signing Certificate - EXAMPLE #2',
+                'sslserver'
+            ])
+        self.assertEqual(
+            inventory['CA Signing Certificate - EXAMPLE #2'][0]['data'],
+            sub[1].public_bytes(serialization.Encoding.DER))
+        self.assertEqual(db.get_trust('CA Signing Certificate - EXAMPLE'), 'CT,C,C')
+
+        # unchanged certs are skipped
+        certs = [
+            (None, root[1].public_bytes(serialization.Encoding.DER), 'CT,C,C'),
+            ('sslserver', server[1].public_bytes(serialization.Encoding.DER), ',,'),
+            ('sslserver', server[1].public_bytes(serialization.Encoding.DER), 'P,,'),
+            ('new', server[1].public_bytes(serialization.Encoding.DER), ',,'),
+        ]
+
+        changes = db.add_certs(certs, dry_run=True)
+        self.assertEqual(
+            [(c['action'], c['nickname']) for c in changes],
+            [
+                ('skip', 'CA Signing Certificate - EXAMPLE'),
+                ('skip', 'sslserver'),
+                ('modify', 'sslserver'),
+                ('add', 'new')
+            ])
+
+    def test_ca_nickname(self):
+
+        subject = x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, u'CA Signing Certificate'),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, u'EXAMPLE')])
+
+        root = self.create_cert(subject)
+        renewed_root = self.create_cert(subject)
+        other_root = self.create_cert(x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, u'CA Signing Certificate'),
+            x509.NameAttribute(NameOID.ORGANIZATIONAL_UNIT_NAME, u'pki-tomcat'),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, u'EXAMPLE')]))
+
+        def der(cert):
+            return cert[1].public_bytes(serialization.Encoding.DER)
+
+        nicknames = {'CA Signing Certificate - EXAMPLE': [der(root)]}
+
+        # certs with the same subject share the nickname
+        self.assertEqual(
+            nssdb.get_ca_nickname(der(renewed_root), nicknames),
+            'CA Signing Certificate - EXAMPLE')
+
+        self.assertEqual(
+            nssdb.get_ca_nickname(der(other_root), nicknames),
+            'CA Signing Certificate - EXAMPLE #2')
+
+    def test_modify_hsm_cert(self):
+
+        _, cert = self.create_cert(x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, u'server.example.com')]))
+        data = cert.public_bytes(serialization.Encoding.DER)
+
+        db = nssdb.NSSDatabase(self.tmpdir, password_file=self.password_file)
+        self.addCleanup(db.close)
+
+        inventory = {'sslserver': [{'data': data, 'trust_flags': ',,'}]}
+
+        with mock.patch.object(
+                db, '_NSSDatabase__get_token_inventory', return_value=inventory), \
+                mock.patch('subprocess.check_call') as check_call:
+            changes = db.add_certs([('sslserver', data, 'P,,')], token='HSM')
+
+        self.assertEqual([c['action'] for c in changes], ['modify'])
+
+        cmd = check_call.call_args[0][0]
+        self.assertEqual(cmd[:2], ['certutil', '-M'])
+        self.assertEqual(cmd[cmd.index('-h') + 1], 'HSM')
+        self.assertEqual(cmd[cmd.index('-n') + 1], 'HSM:sslserver')
+
 
 if __name__ == '__main__':
     unittest.main()
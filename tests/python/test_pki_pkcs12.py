@@ -0,0 +1,97 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import datetime
+import unittest
+from unittest import mock
+
+from cryptography import x509
+from cryptography.exceptions import UnsupportedAlgorithm
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509.oid import NameOID
+
+import pki.pkcs12
+
+
+class PKCS12Tests(unittest.TestCase):
+
+    def create_cert(self, name, issuer=None):
+
+        key = ec.generate_private_key(ec.SECP256R1())
+        subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+        now = datetime.datetime.utcnow()
+
+        cert = x509.CertificateBuilder() \
+            .subject_name(subject) \
+            .issuer_name(issuer[1].subject if issuer else subject) \
+            .public_key(key.public_key()) \
+            .serial_number(x509.random_serial_number()) \
+            .not_valid_before(now) \
+            .not_valid_after(now + datetime.timedelta(days=1)) \
+            .sign(issuer[0] if issuer else key, hashes.SHA256())
+
+        return key, cert
+
+    def setUp(self):
+        self.ca = self.create_cert('CA Signing Certificate')
+        self.user = self.create_cert('User', issuer=self.ca)
+
+    def create_pkcs12(self, encryption):
+        return pkcs12.serialize_key_and_certificates(
+            b'user', self.user[0], self.user[1],
+            [pkcs12.PKCS12Certificate(self.ca[1], b'ca_signing')],
+            encryption)
+
+    def test_find_certs(self):
+
+        encryptions = [
+            serialization.BestAvailableEncryption(b'Secret.123'),
+            serialization.PrivateFormat.PKCS12.encryption_builder()
+            .kdf_rounds(2000)
+            .key_cert_algorithm(pkcs12.PBES.PBESv1SHA1And3KeyTripleDESCBC)
+            .hmac_hash(hashes.SHA1())
+            .build(b'Secret.123'),
+        ]
+
+        for encryption in encryptions:
+
+            certs = pki.pkcs12.find_certs(self.create_pkcs12(encryption), 'Secret.123')
+
+            self.assertEqual(
+                [(c['nickname'], c['has_key']) for c in certs],
+                [('user', True), ('ca_signing', False)])
+            self.assertEqual(
+                certs[1]['data'],
+                self.ca[1].public_bytes(serialization.Encoding.DER))
+            self.assertNotIn('trust_flags', certs[1])
+
+    def test_invalid_password(self):
+
+        data = self.create_pkcs12(serialization.BestAvailableEncryption(b'Secret.123'))
+
+        with self.assertRaises(ValueError):
+            pki.pkcs12.find_certs(data, 'Secret.456')
+
+    def test_unsupported_algorithm(self):
+
+        algorithm = pki.pkcs12.PKCS12_PBE_ALGORITHMS.copy()
+        algorithm.pop('1.2.840.113549.1.12.1.3')
+
+        data = self.create_pkcs12(
+            serialization.PrivateFormat.PKCS12.encryption_builder()
+            .key_cert_algorithm(pkcs12.PBES.PBESv1SHA1And3KeyTripleDESCBC)
+            .build(b'Secret.123'))
+
+        with mock.patch.object(pki.pkcs12, 'PKCS12_PBE_ALGORITHMS', algorithm):
+            with self.assertRaises(UnsupportedAlgorithm):
+                pki.pkcs12.find_certs(data, 'Secret.123')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pki.upgrade
+import pki.util
+
+SCRIPTLET = '''
+import pki.upgrade
+
+
+class %(classname)s(pki.upgrade.PKIUpgradeScriptlet):
+
+    def __init__(self):
+        super().__init__()
+        self.message = '%(message)s'
+'''
+
+
+class PKIUpgraderTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        patcher = mock.patch('pki.upgrade.CACHE_DIR', os.path.join(self.tmpdir, 'cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        pki.upgrade.MANIFESTS.clear()
+        self.addCleanup(pki.upgrade.MANIFESTS.clear)
+
+        self.upgrade_dir = os.path.join(self.tmpdir, 'upgrade')
+
+        self.add_scriptlet('10.0.0', 1, 'FixConfig', 'Fix config')
+        self.add_scriptlet('10.0.0', 2, 'AddProfile', 'Add profile')
+        self.add_scriptlet('10.1.0', 1, 'UpdateConfig', 'Update config')
+
+    def add_scriptlet(self, version, index, classname, message):
+
+        version_dir = os.path.join(self.upgrade_dir, version)
+        os.makedirs(version_dir, exist_ok=True)
+
+        filename = os.path.join(version_dir, '%02d-%s.py' % (index, classname))
+        with open(filename, 'w') as f:
+            f.write(SCRIPTLET % {'classname': classname, 'message': message})
+
+        # make sure the directory modification time changes
+        st = os.stat(version_dir)
+        os.utime(version_dir, ns=(st.st_atime_ns, st.st_mtime_ns + index * 1000000000))
+
+    def test_manifest(self):
+
+        upgrader = pki.upgrade.PKIUpgrader(self.upgrade_dir)
+
+        self.assertEqual([str(v) for v in upgrader.all_versions()], ['10.0.0', '10.1.0'])
+
+        scriptlets = upgrader.scriptlets(pki.util.Version('10.0.0'))
+        self.assertEqual([s.message for s in scriptlets], ['Fix config', 'Add profile'])
+        self.assertTrue(scriptlets[-1].last)
+
+        manifest_file = upgrader.get_manifest_file()
+        self.assertTrue(os.path.exists(manifest_file))
+
+        # the manifest is loaded from the cache without compiling scriptlets
+        pki.upgrade.MANIFESTS.clear()
+
+        with mock.patch.object(pki.upgrade.PKIUpgrader, 'create_manifest') as create_manifest:
+            entries = upgrader.get_manifest_entries('10.1.0')
+            create_manifest.assert_not_called()
+
+        self.assertEqual(
+            [(e['index'], e['classname'], e['message']) for e in entries],
+            [(1, 'UpdateConfig', 'Update config')])
+
+        scriptlets = upgrader.scriptlets(pki.util.Version('10.1.0'))
+        self.assertEqual(scriptlets[0].message, 'Update config')
+
+        # new scriptlets invalidate the manifest
+        self.add_scriptlet('10.1.0', 2, 'RemoveConfig', 'Remove config')
+
+        entries = upgrader.get_manifest_entries('10.1.0')
+        self.assertEqual([e['classname'] for e in entries], ['UpdateConfig', 'RemoveConfig'])
+
+        # scriptlets modified in place invalidate the manifest
+        version_dir = os.path.join(self.upgrade_dir, '10.1.0')
+        dir_st = os.stat(version_dir)
+
+        filename = os.path.join(version_dir, '01-UpdateConfig.py')
+        file_st = os.stat(filename)
+
+        with open(filename, 'w') as f:
+            f.write(SCRIPTLET % {'classname': 'UpdateConfig', 'message': 'Update configs'})
+
+        os.utime(filename, ns=(file_st.st_atime_ns, file_st.st_mtime_ns + 1000000000))
+        os.utime(version_dir, ns=(dir_st.st_atime_ns, dir_st.st_mtime_ns))
+
+        scriptlets = upgrader.scriptlets(pki.util.Version('10.1.0'))
+        self.assertEqual(scriptlets[0].message, 'Update configs')
+
+        # the manifest is only accessible by the owner
+        self.assertEqual(os.stat(manifest_file).st_mode & 0o777, 0o600)
+
+        # manifests writable by others are ignored
+        pki.upgrade.MANIFESTS.clear()
+        os.chmod(manifest_file, 0o666)
+
+        with mock.patch.object(
+                pki.upgrade.PKIUpgrader, 'create_manifest',
+                wraps=upgrader.create_manifest) as create_manifest:
+            upgrader.get_manifest()
+            create_manifest.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
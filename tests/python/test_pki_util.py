@@ -0,0 +1,98 @@
+#
+# Copyright Red Hat, Inc.
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pki.util
+
+
+class PropertiesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'CS.cfg')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, content):
+        with open(self.filename, 'w') as f:
+            f.write(content)
+
+    def read(self):
+        with open(self.filename) as f:
+            return f.read()
+
+    def test_load_properties(self):
+
+        self.write(
+            '# comment\n'
+            '\n'
+            '  b.name = value with spaces  \n'
+            'a.name=multi \\\n'
+            'line\\\n'
+            ' value\n'
+            'c.name=\n')
+
+        properties = {}
+        pki.util.load_properties(self.filename, properties)
+
+        self.assertEqual(properties, {
+            'b.name': 'value with spaces',
+            'a.name': 'multi line value',
+            'c.name': '',
+        })
+
+    def test_load_properties_missing_delimiter(self):
+
+        self.write('a.name=value\ninvalid\n')
+
+        with self.assertRaisesRegex(Exception, 'line 2'):
+            pki.util.load_properties(self.filename, {})
+
+    def test_store_properties(self):
+
+        # new file is sorted
+        pki.util.store_properties(self.filename, {'c': 'C', 'a': 1, 'b': None})
+        self.assertEqual(self.read(), 'a=1\nb=\nc=C\n')
+
+        # existing order is preserved, new properties are merged
+        self.write('z=Z\nc=C\na=A\n')
+        os.chmod(self.filename, 0o640)
+
+        pki.util.store_properties(self.filename, {'a': 'A2', 'b': 'B', 'z': 'Z'})
+        self.assertEqual(self.read(), 'b=B\nz=Z\na=A2\n')
+        self.assertEqual(os.stat(self.filename).st_mode & 0o777, 0o640)
+
+        # unchanged file is not rewritten
+        inode = os.stat(self.filename).st_ino
+        pki.util.store_properties(self.filename, {'b': 'B', 'z': 'Z', 'a': 'A2'})
+        self.assertEqual(os.stat(self.filename).st_ino, inode)
+
+
+class LatencyHistogramTests(unittest.TestCase):
+
+    def test_percentiles(self):
+
+        histogram = pki.util.LatencyHistogram('submit')
+        self.assertIsNone(histogram.percentile(50))
+
+        for latency in [0.0005, 0.003, 0.003, 0.003, 0.050]:
+            histogram.record(latency)
+
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.percentile(50), 0.004)
+        self.assertEqual(histogram.percentile(99), 0.050)
+        self.assertEqual(
+            histogram.to_dict()['buckets'],
+            {'<=1ms': 1, '<=4ms': 3, '<=64ms': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()